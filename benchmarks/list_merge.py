@@ -0,0 +1,61 @@
+"""Scaling of id keyed list merges against the previous ListNode.merge_ordered, which was quadratic in sources.
+Records per source are swept at 20 sources, then sources are swept at 1000 records per source.
+
+    python -m benchmarks.list_merge [lengths...]
+"""
+import sys
+import time
+from typing import List
+
+from src.context import MergeContext
+from src.nodes import INode, ListNode, merge
+
+
+class LegacyListNode(ListNode):
+    """ListNode using the merge_ordered that copied and probed every other document per element"""
+
+    def merge_ordered(self, documents: List[INode]) -> any:
+        result = []
+        ids_seen = set()
+        for i, doc in enumerate(documents):
+            for _id, node in doc.get_nodes():
+                if _id is None or _id not in ids_seen:
+                    ids_seen.add(_id)
+                    other = documents[:]
+                    other.pop(i)
+                    value = merge([node] + [doc.node_from_id_index(_id, None) for doc in other])
+                    if value is not None or doc.context.is_allow_none():
+                        result.append(value)
+            if doc.context.is_terminal():
+                break
+        if len(result) > 0 or self.context.is_allow_empty():
+            return result
+        return None
+
+
+def generate(length: int, sources: int) -> List[List[dict]]:
+    """Each source holds `length` records, overlapping its neighbour by half of its ids"""
+    return [
+        [{'$id': i, 'source': source, 'value': i * source} for i in range(source * length // 2, source * length // 2 + length)]
+        for source in range(sources)
+    ]
+
+
+def timed(node_type: type, raws: List[List[dict]]) -> float:
+    nodes = [node_type(context=MergeContext(order=order), value=raw) for order, raw in enumerate(raws)]
+    start = time.perf_counter()
+    merge(nodes)
+    return time.perf_counter() - start
+
+
+def main(lengths: List[int], sources: List[int]):
+    print(f'{"length":>8} {"sources":>8} {"current":>10} {"legacy":>10} {"speedup":>8}')
+    for length, count in [(length, 20) for length in lengths] + [(1000, count) for count in sources]:
+        raws = generate(length, count)
+        current = timed(ListNode, raws)
+        legacy = timed(LegacyListNode, raws)
+        print(f'{length:>8} {count:>8} {current:>9.3f}s {legacy:>9.3f}s {legacy / current:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 2000, 4000, 8000], [5, 20, 80, 160])
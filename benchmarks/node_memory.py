@@ -0,0 +1,57 @@
+"""Peak memory and wall time of merging a large input set, with and without a terminal control document.
+The control document selects a tenth of the records, so most list elements are never read by the merge.
+
+    python -m benchmarks.node_memory [megabytes]
+"""
+import json
+import sys
+import time
+import tracemalloc
+from typing import List
+
+from src.nodes import merge
+from src.parser import parse_context
+
+
+def generate(megabytes: int, sources: int = 10) -> List[dict]:
+    """Sources sharing `$id` keyed records, roughly `megabytes` of json in total"""
+    record = {'$id': 0, 'name': 'record', 'count': 0, 'tags': ['a', 'b'], 'detail': {'x': 1.5, 'y': None}}
+    per_source = megabytes * 1024 * 1024 // (sources * len(json.dumps(record)))
+    return [
+        {'records': [
+            {'$id': i, 'name': f'record-{source}', 'count': i, 'tags': ['a', 'b'], 'detail': {'x': i / 2, 'y': None}}
+            for i in range(per_source)
+        ]}
+        for source in range(sources)
+    ]
+
+
+def control(raws: List[dict]) -> dict:
+    records = raws[0]['records']
+    return {'$priority': 1, '$terminal': True, 'records': [{'$id': record['$id']} for record in records[::10]]}
+
+
+def measure(name: str, raws: List[dict]):
+    documents = [parse_context(raw) for raw in raws]
+    start = time.perf_counter()
+    merge(documents)
+    elapsed = time.perf_counter() - start
+
+    documents = [parse_context(raw) for raw in raws]
+    tracemalloc.start()
+    merge(documents)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f'{name:>10} {elapsed:>9.2f}s {peak / 1024 / 1024:>9.1f}MB')
+
+
+def main(megabytes: int):
+    raws = generate(megabytes)
+    print(f'{megabytes}MB over {len(raws)} sources, parsing and input excluded')
+    print(f'{"case":>10} {"time":>10} {"peak":>11}')
+    measure('full', raws)
+    measure('control', [control(raws)] + raws)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,194 @@
+"""Benchmark suite over synthetic documents, timing parse_context and merge for dict and list heavy workloads.
+Reports throughput and peak traced memory per case, optionally saving the results and comparing them against
+a previously saved baseline, exiting with status 1 when any case regressed by more than the threshold.
+
+    python -m benchmarks.suite [--quick] [--case NAME ...] [--save FILE] [--baseline FILE] [--threshold 0.2]
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+from src.nodes import merge
+from src.parser import parse_context
+
+
+@dataclass
+class Workload():
+    """Shape of the generated sources"""
+    sources: int = 8
+    width: int = 10
+    depth: int = 3
+    # 'flat' gives every source priority 0, 'uniform' draws from 0-3, 'skewed' makes a few sources outrank the rest
+    priorities: str = 'flat'
+    # Chance of any object being terminal
+    terminal: float = 0.0
+    # Records per list, lists only appear at the leaves when list_length > 0
+    list_length: int = 0
+    # Share of its ids each source has in common with the next one
+    id_overlap: float = 0.5
+    seed: int = 0
+
+
+def _priority(rng: random.Random, distribution: str) -> int:
+    if distribution == 'flat':
+        return 0
+    if distribution == 'uniform':
+        return rng.randint(0, 3)
+    if distribution == 'skewed':
+        return 3 if rng.random() < 0.1 else 0
+    raise ValueError(f'unknown priority distribution {distribution!r}')
+
+
+def _records(rng: random.Random, workload: Workload, source: int) -> List[dict]:
+    start = int(source * workload.list_length * (1 - workload.id_overlap))
+    return [{'$id': i, 'name': f'record-{source}', 'count': rng.randint(0, 1000), 'tags': ['a', 'b']}
+            for i in range(start, start + workload.list_length)]
+
+
+def _tree(rng: random.Random, workload: Workload, source: int, depth: int) -> dict:
+    # Keys are drawn from a pool half again as wide, so sources overlap on most but not all of them
+    keys = rng.sample(range(workload.width + workload.width // 2), workload.width)
+    raw = {}
+    for key in keys:
+        if depth > 1:
+            raw[f'k{key}'] = _tree(rng, workload, source, depth - 1)
+        elif workload.list_length > 0:
+            raw[f'k{key}'] = _records(rng, workload, source)
+        else:
+            raw[f'k{key}'] = rng.choice([rng.randint(0, 1000), rng.random(), f'value-{source}', None, True])
+    if workload.terminal > 0 and rng.random() < workload.terminal:
+        raw['$terminal'] = True
+    return raw
+
+
+def generate(workload: Workload) -> List[dict]:
+    """Raw documents for every source of workload, the same for the same workload"""
+    rng = random.Random(workload.seed)
+    raws = []
+    for source in range(workload.sources):
+        raw = _tree(rng, workload, source, workload.depth)
+        priority = _priority(rng, workload.priorities)
+        if priority:
+            raw['$priority'] = priority
+        raws.append(raw)
+    return raws
+
+
+@dataclass
+class Case():
+    name: str
+    workload: Workload
+    # 'parse' times parse_context of every source, 'merge' times merge of the parsed sources
+    operation: str
+
+
+cases = [
+    Case('parse_dicts', Workload(sources=8, width=12, depth=4), 'parse'),
+    Case('parse_lists', Workload(sources=8, width=4, depth=2, list_length=200), 'parse'),
+    Case('merge_dicts', Workload(sources=8, width=12, depth=4), 'merge'),
+    Case('merge_dicts_priorities', Workload(sources=8, width=12, depth=4, priorities='uniform', terminal=0.1), 'merge'),
+    Case('merge_dicts_many_sources', Workload(sources=64, width=8, depth=3, priorities='skewed'), 'merge'),
+    Case('merge_lists', Workload(sources=8, width=4, depth=2, list_length=200), 'merge'),
+    Case('merge_lists_disjoint', Workload(sources=8, width=4, depth=2, list_length=200, id_overlap=0.0), 'merge'),
+    Case('merge_lists_terminal', Workload(sources=8, width=4, depth=2, list_length=200, terminal=0.3), 'merge'),
+]
+
+
+def _timed(case: Case, raws: List[dict]) -> float:
+    if case.operation == 'parse':
+        start = time.perf_counter()
+        [parse_context(raw) for raw in raws]
+    elif case.operation == 'merge':
+        documents = [parse_context(raw) for raw in raws]
+        start = time.perf_counter()
+        merge(documents)
+    else:
+        raise ValueError(f'unknown operation {case.operation!r}')
+    return time.perf_counter() - start
+
+
+def measure(case: Case, repeat: int) -> Dict[str, float]:
+    """Median seconds over repeat runs, throughput in input megabytes and documents per second, and the peak
+    traced memory of one more run. Merge cases exclude parsing from both."""
+    raws = generate(case.workload)
+    megabytes = len(json.dumps(raws)) / 1024 / 1024
+    seconds = statistics.median(_timed(case, raws) for _ in range(repeat))
+    documents = [parse_context(raw) for raw in raws] if case.operation == 'merge' else None
+    tracemalloc.start()
+    if documents is not None:
+        merge(documents)
+    else:
+        [parse_context(raw) for raw in raws]
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'seconds': seconds,
+        'mb_per_second': megabytes / seconds,
+        'documents_per_second': len(raws) / seconds,
+        'peak_mb': peak / 1024 / 1024,
+        'input_mb': megabytes,
+    }
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> List[str]:
+    """Names of the cases whose time or peak memory grew by more than threshold over baseline"""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if result['seconds'] > previous['seconds'] * (1 + threshold) or \
+                result['peak_mb'] > previous['peak_mb'] * (1 + threshold):
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--case', action='append', help='only run the named cases')
+    parser.add_argument('--quick', action='store_true', help='a single timed run per case')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per case, the median is reported')
+    parser.add_argument('--save', help='write the results as json to this file')
+    parser.add_argument('--baseline', help='compare against results previously saved to this file')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative growth over the baseline')
+    args = parser.parse_args(argv)
+
+    selected = [case for case in cases if args.case is None or case.name in args.case]
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+
+    results = {}
+    print(f'{"case":>26} {"time":>10} {"MB/s":>8} {"docs/s":>9} {"peak":>9} {"baseline":>9}')
+    for case in selected:
+        result = measure(case, 1 if args.quick else args.repeat)
+        results[case.name] = result
+        change = ''
+        if baseline is not None and case.name in baseline:
+            change = f'{result["seconds"] / baseline[case.name]["seconds"] - 1:+.0%}'
+        print(f'{case.name:>26} {result["seconds"]:>9.3f}s {result["mb_per_second"]:>8.2f} '
+              f'{result["documents_per_second"]:>9.1f} {result["peak_mb"]:>7.2f}MB {change:>9}')
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results,
+                       'workloads': {case.name: asdict(case.workload) for case in selected}}, file, indent=2)
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'regressed by more than {args.threshold:.0%}: {", ".join(regressions)}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+import asyncio
+from typing import AsyncIterable, Awaitable, Dict, List, Optional, Tuple, Union
+
+from src.nodes import DictNode, INode, ListNode, data_to_node, merge_sorted
+from src.parser import _extract, _extractor
+
+# Marks a source that has no more documents
+_done = object()
+
+
+async def _read(position: int, source: Union[Awaitable, AsyncIterable], queue: asyncio.Queue):
+    try:
+        if hasattr(source, '__aiter__'):
+            async for raw in source:
+                await queue.put((position, raw))
+        else:
+            await queue.put((position, await source))
+        await queue.put((position, _done))
+    except asyncio.CancelledError:
+        raise
+    except Exception as error:
+        await queue.put((position, error))
+
+
+class _Resolver():
+    """Resolves the subtrees of the arrived documents that no pending document can change anymore.
+
+    No pending document has a priority above limit in any subtree, so a subtree is final once its driver has
+    a higher priority and, for objects and lists, a terminal document of higher priority ended discovery and
+    every child is final. Final subtrees are kept by path, so they are merged once while sources are pending."""
+
+    def __init__(self):
+        self.resolved: Dict[tuple, any] = {}
+        self.limit: Optional[float] = None
+
+    def settle(self, ordered: List[INode], path: Optional[tuple]) -> Tuple[bool, any]:
+        if path is not None and path in self.resolved:
+            return True, self.resolved[path]
+        everything = self.limit is None
+        driver = next((doc for doc in ordered if doc.willing_to_drive()), None)
+        if driver is None:
+            return everything, None
+        complete = everything
+        if not everything and driver.context.get_priority() > self.limit:
+            complete = not isinstance(driver, DictNode) and not isinstance(driver, ListNode)
+            for doc in ordered:
+                if doc.context.get_priority() <= self.limit:
+                    break
+                if doc.context.is_terminal():
+                    complete = True
+                    break
+        if isinstance(driver, DictNode):
+            value = {}
+            for key, nodes, allow_none in driver.key_plan(ordered):
+                final, child = self.settle(nodes, path + (('key', key),) if path is not None else None)
+                complete = complete and final
+                if complete and (child is not None or allow_none):
+                    value[key] = child
+        elif isinstance(driver, ListNode):
+            value = []
+            for nodes, allow_none in driver.id_plan(ordered):
+                _id = next((_id for _id in (node.get_id() for node in nodes) if _id is not None), None)
+                # Elements without an id, or matched by a strategy instead, have no stable path until the list is final
+                stable = _id is not None and driver.context.get_strategy() is None
+                child_path = path + (('id', _id),) if path is not None and stable else None
+                final, child = self.settle(nodes, child_path)
+                complete = complete and final
+                if complete and (child is not None or allow_none):
+                    value.append(child)
+        else:
+            value = merge_sorted(ordered) if complete else None
+        if not complete:
+            return False, None
+        if (isinstance(driver, DictNode) or isinstance(driver, ListNode)) and len(value) == 0 \
+                and not driver.context.is_allow_empty():
+            value = None
+        if path is not None:
+            self.resolved[path] = value
+        return True, value
+
+
+async def merge_async(sources: List[Union[Awaitable, AsyncIterable]], priorities: Optional[List[Optional[int]]] = None,
+                      extractor: _extractor = _extractor()) -> any:
+    """Merges the raw documents of every source as they arrive. A source is an awaitable of one document or an
+    async iterable of documents, the result is merge([parse_context(raw) for each source for raw in it]).
+
+    Documents are parsed on arrival. priorities optionally holds, per source, the highest priority anywhere in
+    its documents. Subtrees that pending sources cannot outrank are resolved while waiting, and once a terminal
+    document of higher priority than every pending source has settled the whole result the remaining sources
+    are cancelled instead of awaited. Sources without a priority can contribute anywhere and are waited for."""
+    if priorities is None:
+        priorities = [None] * len(sources)
+    if len(priorities) != len(sources):
+        raise ValueError('priorities must hold one entry per source')
+    queue = asyncio.Queue()
+    readers = [asyncio.ensure_future(_read(position, source, queue)) for position, source in enumerate(sources)]
+    pending = set(range(len(sources)))
+    arrived = []
+    ordered = []
+    resolver = _Resolver()
+    try:
+        while True:
+            resolver.limit = max((priorities[position] if priorities[position] is not None else float('inf')
+                                  for position in pending), default=None)
+            final, value = resolver.settle(ordered, ())
+            if final:
+                return value
+            position, raw = await queue.get()
+            if raw is _done:
+                pending.discard(position)
+            elif isinstance(raw, Exception):
+                raise raw
+            elif raw is not None:
+                # Ties are broken as merge breaks them over the documents of every source in turn
+                node = data_to_node(context=_extract(raw, extractor), value=raw)
+                arrived.append((node.get_sort_key(), position, len(arrived), node))
+                arrived.sort(key=lambda entry: entry[:3])
+                ordered = [entry[3] for entry in arrived]
+    finally:
+        for reader in readers:
+            reader.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
@@ -0,0 +1,65 @@
+from collections import deque
+from concurrent.futures import Executor
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional
+
+from src.nodes import INode, data_to_node, merge_sorted
+from src.parser import _extract, _extractor
+
+
+def _merge_jobs(groups: List[List[any]], extractor: _extractor) -> List[any]:
+    # Documents shared between the groups of a chunk, such as a common control document, are parsed once.
+    # Pickling keeps shared references, so this holds for chunks sent to a process pool as well.
+    parsed = {}
+    sort_key = INode.get_sort_key
+    results = []
+    for group in groups:
+        documents = []
+        for raw in group:
+            node = parsed.get(id(raw))
+            if node is None:
+                node = parsed[id(raw)] = data_to_node(context=_extract(raw, extractor), value=raw)
+            documents.append(node)
+        documents.sort(key=sort_key)
+        results.append(merge_sorted(documents))
+    return results
+
+
+def merge_batch(groups: Iterable[Iterable[any]], executor: Optional[Executor] = None, chunk_size: int = 64,
+                max_pending: int = 16, extractor: _extractor = _extractor()) -> Iterator[any]:
+    """Merges every group of raw documents, yielding merge([parse_context(raw) for raw in group]) for each
+    group in order.
+
+    Groups are taken chunk_size at a time and each chunk is parsed and merged as one job, in this process or
+    on executor when given. At most max_pending chunks are in flight, so groups are only read from the
+    iterable as results are consumed and arbitrarily long streams are merged in bounded memory. With a
+    process pool the groups and extractor must be picklable."""
+    if chunk_size < 1 or max_pending < 1:
+        raise ValueError('chunk_size and max_pending must be at least 1')
+    return _merge_batch(iter(groups), executor, chunk_size, max_pending, extractor)
+
+
+def _merge_batch(groups: Iterator[Iterable[any]], executor: Optional[Executor], chunk_size: int,
+                 max_pending: int, extractor: _extractor) -> Iterator[any]:
+    if executor is None:
+        while True:
+            chunk = [list(group) for group in islice(groups, chunk_size)]
+            if not chunk:
+                return
+            yield from _merge_jobs(chunk, extractor)
+
+    pending = deque()
+    try:
+        while True:
+            while len(pending) < max_pending:
+                chunk = [list(group) for group in islice(groups, chunk_size)]
+                if not chunk:
+                    break
+                pending.append(executor.submit(_merge_jobs, chunk, extractor))
+            if not pending:
+                return
+            yield from pending.popleft().result()
+    finally:
+        # Results that will never be consumed are not worth computing
+        for future in pending:
+            future.cancel()
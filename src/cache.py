@@ -0,0 +1,193 @@
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from src.context import DictMergeContext, ListMergeContext, MergeContext
+from src.nodes import DictNode, INode, merge_sorted
+from src.parser import parse_context
+
+# Entries are (kind, ...) tuples so parsed documents and merged subtrees share one eviction order
+_parsed = 'parsed'
+_merged = 'merged'
+
+
+def _encode(value: any) -> bytes:
+    # Pickle keeps key order and tells 1, 1.0 and True apart, and encodes numbers far faster than json
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _digest(encoded: bytes) -> bytes:
+    return hashlib.blake2b(encoded, digest_size=16).digest()
+
+
+def fingerprint(raw: any) -> Tuple[bytes, Dict[str, bytes], int]:
+    """Content hash of raw, the hash of each of its top level values when it is an object, and its encoded size
+    in bytes. Key order is part of the fingerprint as it is part of the merge result."""
+    if type(raw) is not dict:
+        encoded = _encode(raw)
+        return _digest(encoded), {}, len(encoded)
+    document = hashlib.blake2b(digest_size=16)
+    subtrees = {}
+    size = 0
+    for key, value in raw.items():
+        encoded = _encode(value)
+        subtrees[key] = _digest(encoded)
+        document.update(_encode(key))
+        document.update(subtrees[key])
+        size += len(encoded)
+    return document.digest(), subtrees, size
+
+
+def _children(context: MergeContext) -> List[Optional[MergeContext]]:
+    if type(context) is DictMergeContext:
+        return [*context.nodes.values(), context.any_key]
+    if type(context) is ListMergeContext:
+        return [*context.ids.values(), *context.index, context.default, context.any_element]
+    return []
+
+
+def _context_key(context: MergeContext) -> Tuple:
+    # Hashable value equal for context trees that merge alike, child contexts included. Built with an explicit
+    # stack so deeply annotated documents are not bounded by the recursion limit.
+    keys = {}
+
+    def key(child: Optional[MergeContext]) -> Optional[Tuple]:
+        return keys[id(child)] if child is not None else None
+
+    stack = [(context, False)]
+    while stack:
+        current, expanded = stack.pop()
+        if id(current) in keys:
+            continue
+        if not expanded:
+            stack.append((current, True))
+            stack.extend((child, False) for child in _children(current) if child is not None)
+            continue
+        own = (type(current).__name__, current.priority, current.order, current.terminal, current.allow_none,
+               current.allow_empty, current.excluded_prefix, current.id_key, current.strategy)
+        if type(current) is DictMergeContext:
+            own += (tuple((name, key(child)) for name, child in current.nodes.items()), key(current.any_key))
+        elif type(current) is ListMergeContext:
+            own += (tuple((_id, key(child)) for _id, child in current.ids.items()),
+                    tuple(key(child) for child in current.index), key(current.default), key(current.any_element))
+        keys[id(current)] = own
+    return keys[id(context)]
+
+
+class MergeCache():
+    """Caches parsed documents and the merge of each top level subtree by content hash.
+
+    Documents are fingerprinted by content, or by a caller supplied version key, and parsed once while cached.
+    The merge of every top level key is cached against the hashes, root contexts and contexts resolved for
+    the key of the documents contributing to it, so requests sharing most document versions only merge the
+    subtrees that differ. Entries are evicted least recently used first once either max_entries or max_bytes
+    is exceeded, sizes being estimated from their pickled size. Cached results are shared between calls and
+    must not be modified."""
+
+    def __init__(self, max_entries: int = 4096, max_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[Hashable, Tuple[any, int]] = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {'entries': len(self.entries), 'bytes': self.bytes,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def _get(self, key: Hashable) -> Tuple[bool, any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return True, entry[0]
+
+    def _put(self, key: Hashable, value: any, size: int):
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self.entries[key] = (value, size)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or (self.bytes > self.max_bytes and len(self.entries) > 1):
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def parse(self, raw: any, version: Optional[Hashable] = None) -> Tuple[INode, Dict[str, bytes], bytes]:
+        """parse_context of raw together with the hashes of its top level values and its document hash.
+        When version is given it identifies the content of raw instead of hashing it."""
+        if version is not None:
+            key = (_parsed, 'version', version)
+            found, parsed = self._get(key)
+            if found:
+                return parsed
+            digest, subtrees, size = fingerprint(raw)
+        else:
+            digest, subtrees, size = fingerprint(raw)
+            key = (_parsed, 'content', digest)
+            found, parsed = self._get(key)
+            if found:
+                return parsed
+        parsed = (parse_context(raw), subtrees, digest)
+        self._put(key, parsed, size)
+        return parsed
+
+    def merge(self, documents: List[any], versions: Optional[List[Optional[Hashable]]] = None) -> any:
+        """Equivalent of merge over parse_context of every raw document, reusing cached work.
+        versions optionally holds a version key per document, see parse."""
+        if versions is None:
+            versions = [None] * len(documents)
+        parsed = [self.parse(raw, version) for raw, version in zip(documents, versions) if raw is not None]
+        parsed.sort(key=lambda entry: entry[0].get_sort_key())
+        ordered = [node for node, _, _ in parsed]
+        driver = next((doc for doc in ordered if doc.willing_to_drive()), None)
+        if driver is None:
+            return None
+        if not isinstance(driver, DictNode):
+            key = (_merged, tuple((digest, self._root(node)) for node, _, digest in parsed))
+            return self._merge(key, ordered)
+
+        result = {}
+        for name, nodes, allow_none in driver.key_plan(ordered):
+            # Everything contributing to a key comes from its subtree, the root context of its document and the
+            # context the root resolves for the key, root scopes included
+            sources = []
+            for node, subtrees, _ in parsed:
+                context, known = node.context.context_from_key(name)
+                if node.has_key(name) or known:
+                    sources.append((subtrees.get(name), self._root(node), _context_key(context)))
+            key = (_merged, name, tuple(sources))
+            value = self._merge(key, nodes)
+            if value is not None or allow_none:
+                result[name] = value
+        if len(result) > 0 or driver.context.is_allow_empty():
+            return result
+        return None
+
+    def _root(self, node: INode) -> Tuple:
+        context = node.context
+        return context.priority, context.order, context.terminal, context.allow_none, context.allow_empty
+
+    def _merge(self, key: Hashable, nodes: List[INode]) -> any:
+        found, value = self._get(key)
+        if not found:
+            value = merge_sorted(nodes)
+            self._put(key, value, len(_encode(value)))
+        return value
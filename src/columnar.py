@@ -0,0 +1,174 @@
+from typing import Dict, List, Optional, Tuple
+
+from src.context import ListMergeContext, MergeContext
+from src.nodes import DictNode, INode, ListNode
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+def _plain(context: MergeContext) -> bool:
+    # Elements of a list with a plain context all share the list's context
+    if type(context) is MergeContext:
+        return True
+    return (type(context) is ListMergeContext and not context.ids and context.default is None
+            and context.any_element is None and all(child is None for child in context.index))
+
+
+def _records(doc: ListNode) -> Optional[Tuple[List[any], List[str], Dict[str, List[any]], MergeContext]]:
+    # (ids, fields, columns, element context) of a list of flat records all with the same keys in the same order
+    # and a unique id, None when doc holds anything else
+    records = doc.value
+    ids = doc.get_element_ids()
+    if len(records) == 0:
+        return [], [], {}, doc.context
+    if set(map(type, records)) != {dict}:
+        return None
+    keys = tuple(records[0])
+    if list(map(tuple, records)).count(keys) != len(records):
+        return None
+    try:
+        if None in ids or len(set(ids)) != len(ids):
+            return None
+    except TypeError:
+        return None
+    element = doc.context.context_from_id_index(ids[0], 0)[0]
+    fields = [key for key in keys if element.is_valid_key(key)]
+    columns = {}
+    for name in fields:
+        column = [record[name] for record in records]
+        types = set(map(type, column))
+        if dict in types or list in types:
+            return None
+        columns[name] = column
+    return ids, fields, columns, element
+
+
+def _merge_records(ordered: List[INode], min_rows: int) -> Optional[tuple]:
+    # Columnar equivalent of ListNode.merge_ordered over lists of flat records, returns (value,) or None when
+    # the lists do not qualify
+    if numpy is None or sum(len(doc.value) if type(doc) is ListNode else 0 for doc in ordered) < min_rows:
+        return None
+    if ordered[0].context.get_strategy() is not None:
+        return None
+    sources = []
+    for doc in ordered:
+        if type(doc) is not ListNode or not _plain(doc.context):
+            return None
+        source = _records(doc)
+        if source is None:
+            return None
+        sources.append(source)
+    count = len(sources)
+
+    # Ids are numbered in discovery order, those first seen after a terminal document are never discovered
+    index = {_id: code for code, _id in enumerate(dict.fromkeys(_id for ids, _, _, _ in sources for _id in ids))}
+    codes = [numpy.fromiter(map(index.__getitem__, ids), dtype=numpy.int64, count=len(ids)) for ids, _, _, _ in sources]
+    discovered = 0
+    for doc, code in zip(ordered, codes):
+        if len(code) > 0:
+            discovered = max(discovered, int(code.max()) + 1)
+        if doc.context.is_terminal():
+            break
+    size = len(index)
+
+    # Records stop discovering fields at the first terminal document holding them, and are driven by the first
+    # document holding them
+    stop = numpy.full(size, count)
+    first = numpy.full(size, count)
+    for position in reversed(range(count)):
+        if ordered[position].context.is_terminal():
+            stop[codes[position]] = position
+        first[codes[position]] = position
+    allow_none = numpy.array([element.is_allow_none() for _, _, _, element in sources] + [False])
+
+    fields = []
+    field_positions = [{name: position for position, name in enumerate(source[1])} for source in sources]
+    for _, names, _, _ in sources:
+        fields.extend(name for name in names if name not in fields)
+    values = []
+    included = []
+    discovering_docs = numpy.full((size, len(fields)), count)
+    for column, name in enumerate(fields):
+        # Later documents are written first so the first eligible document wins
+        value = numpy.empty(size, dtype=object)
+        for position in reversed(range(count)):
+            if name not in field_positions[position]:
+                continue
+            source = numpy.array(sources[position][2][name], dtype=object)
+            target = codes[position]
+            if not sources[position][3].is_allow_none():
+                eligible = numpy.not_equal(source, None)
+                source, target = source[eligible], target[eligible]
+            value[target] = source
+            discovering_docs[codes[position][position <= stop[codes[position]]], column] = position
+        discovery = discovering_docs[:, column]
+        values.append(value.tolist())
+        included.append(((discovery < count) & (numpy.not_equal(value, None) | allow_none[discovery])).tolist())
+
+    result = []
+    if discovered > 0:
+        # Records discovered by the same documents share their field order
+        patterns = {}
+        rows = map(tuple, discovering_docs[:discovered].tolist())
+        inverse = [patterns.setdefault(pattern, len(patterns)) for pattern in rows]
+        orders = []
+        for pattern in patterns:
+            columns = [column for column in range(len(fields)) if pattern[column] < count]
+            columns.sort(key=lambda column: (pattern[column], field_positions[pattern[column]][fields[column]]))
+            orders.append([(fields[column], values[column], included[column]) for column in columns])
+        allow_empty = [sources[position][3].is_allow_empty() for position in first[:discovered].tolist()]
+        keep_none = [ordered[position].context.is_allow_none() for position in first[:discovered].tolist()]
+        for code, pattern in enumerate(inverse):
+            record = {name: value[code] for name, value, include in orders[pattern] if include[code]}
+            if len(record) > 0 or allow_empty[code]:
+                result.append(record)
+            elif keep_none[code]:
+                result.append(None)
+    if len(result) > 0 or ordered[0].context.is_allow_empty():
+        return result,
+    return None,
+
+
+def _merge(ordered: List[INode], min_rows: int) -> any:
+    # Mirrors DictNode.merge_ordered and ListNode.merge_ordered, trying the columnar merge on every list
+    for driver in ordered:
+        if driver.willing_to_drive():
+            break
+    else:
+        return None
+    if isinstance(driver, DictNode):
+        result = {}
+        for key, nodes, allow_none in driver.key_plan(ordered):
+            value = _merge(nodes, min_rows)
+            if value is not None or allow_none:
+                result[key] = value
+    elif isinstance(driver, ListNode):
+        if driver is ordered[0]:
+            merged = _merge_records(ordered, min_rows)
+            if merged is not None:
+                return merged[0]
+        result = []
+        for nodes, allow_none in driver.id_plan(ordered):
+            value = _merge(nodes, min_rows)
+            if value is not None or allow_none:
+                result.append(value)
+    else:
+        return driver.merge_ordered(ordered)
+    if len(result) > 0 or driver.context.is_allow_empty():
+        return result
+    return None
+
+
+def merge_columnar(documents: List[INode], min_rows: int = 1000) -> any:
+    """Equivalent of merge resolving lists of flat records column by column with NumPy.
+
+    A list qualifies when every contributing node is a list with no element annotations, holding at least
+    min_rows records in total, where each source's records all have a unique id and the same keys in the same
+    order, none of them an object or list. The ids of every source are numbered once, then the winning value of
+    each field is picked for every record at once, later sources being overwritten by earlier ones, and the
+    records are rebuilt in merge order. Everything else, or everything when NumPy is not installed, is merged
+    as merge would."""
+    return _merge(sorted([doc for doc in documents if doc is not None], key=INode.get_sort_key), min_rows)
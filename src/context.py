@@ -1,8 +1,67 @@
-from dataclasses import dataclass, field
+import heapq
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
 from typing import Dict, Optional, Tuple, List
 
 
-@dataclass
+def _sortable(value: any) -> Optional[Tuple[int, any]]:
+    # Key field values compared by kind first, so values of different json types never compare directly
+    if value is None:
+        return 0, 0
+    if type(value) is bool:
+        return 1, value
+    if type(value) is int or type(value) is float:
+        return 2, value
+    if type(value) is str:
+        return 3, value
+    return None
+
+
+@dataclass(frozen=True, slots=True)
+class ListStrategy():
+    """How the elements of a list are matched across documents and ordered once merged.
+
+    union keeps one element per distinct json value, key merges the objects that have the same values for all
+    of fields, sorted does the same and orders the result by those values, expecting every document to already
+    hold its elements in that order. Elements without all of fields stand alone after the sorted ones."""
+    kind: str
+    fields: Tuple[str, ...] = ()
+    descending: bool = False
+
+    def element_id(self, raw: any) -> any:
+        """The id elements are matched by, None for an element that stands alone"""
+        if self.kind == 'union':
+            if type(raw) is dict or type(raw) is list:
+                return dict, json.dumps(raw, sort_keys=True)
+            return type(raw), raw
+        if type(raw) is not dict:
+            return None
+        values = []
+        for name in self.fields:
+            value = _sortable(raw[name]) if name in raw else None
+            if value is None:
+                return None
+            values.append(value)
+        return tuple(values)
+
+    def arrange(self, elements: List[Tuple[int, int, any]]) -> List[Tuple[int, int, any]]:
+        """Orders the (document, index, id) elements of a plan, discovered document by document"""
+        if self.kind != 'sorted':
+            return elements
+        runs = {}
+        alone = []
+        for element in elements:
+            if element[2] is None:
+                alone.append(element)
+            else:
+                runs.setdefault(element[0], []).append(element)
+        # Each document's elements are already in order, so a k-way merge orders them all in n log k
+        return list(heapq.merge(*runs.values(), key=lambda element: element[2], reverse=self.descending)) + alone
+
+
+@dataclass(frozen=True, slots=True)
 class MergeData():
     priority: Optional[int] = None
     order: Optional[int] = None
@@ -13,6 +72,7 @@ class MergeData():
 
     excluded_prefix: Optional[str] = '$'
     id_key: Optional[str] = '$id'
+    strategy: Optional[ListStrategy] = None
 
     def get_priority(self):
         return self.priority or 0
@@ -32,6 +92,10 @@ class MergeData():
     def is_terminal(self):
         return self.terminal or False
 
+    def get_strategy(self):
+        # append is the default of matching by id, only set to stop inheriting a strategy
+        return self.strategy if self.strategy is not None and self.strategy.kind != 'append' else None
+
     def is_valid_key(self, key):
         return not key.startswith(self.excluded_prefix)
 
@@ -42,18 +106,46 @@ class MergeData():
 
     # Node behavior
 
-    def update(self, other: 'MergeData'):
-        self.priority = self.priority if self.priority is not None else other.priority
-        self.order = self.order if self.order is not None else other.order
-        self.terminal = self.terminal if self.terminal is not None else other.terminal
-        self.allow_none = self.allow_none if self.allow_none is not None else other.allow_none
-        self.allow_empty = self.allow_empty if self.allow_empty is not None else other.allow_empty
-
+    def update(self, other: 'MergeData') -> 'MergeData':
+        """Returns a copy with any attribute not set on self inherited from other. Contexts are immutable
+        so they can be shared between documents, merges and threads."""
+        if ((self.priority is None and other.priority is not None)
+                or (self.order is None and other.order is not None)
+                or (self.terminal is None and other.terminal is not None)
+                or (self.allow_none is None and other.allow_none is not None)
+                or (self.allow_empty is None and other.allow_empty is not None)
+                or (self.strategy is None and other.strategy is not None)):
+            return replace(
+                self,
+                priority=self.priority if self.priority is not None else other.priority,
+                order=self.order if self.order is not None else other.order,
+                terminal=self.terminal if self.terminal is not None else other.terminal,
+                allow_none=self.allow_none if self.allow_none is not None else other.allow_none,
+                allow_empty=self.allow_empty if self.allow_empty is not None else other.allow_empty,
+                strategy=self.strategy if self.strategy is not None else other.strategy,
+            )
         return self
 
 
-@dataclass
+# Marks the cached context shared by every child that has no context of its own.
+_default_child = object()
+# Marks the cached context shared by every child matched by a wildcard context.
+_any_child = object()
+
+
+@dataclass(frozen=True, slots=True)
 class MergeContext(MergeData):
+    # Resolved child contexts, filled on first lookup. Only ever holds one entry per child context of this node.
+    _resolved: Dict[any, 'MergeContext'] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def get_keys(self) -> List[str]:
+        return []
+
+    def get_ids(self) -> List[any]:
+        return []
+
+    def get_any_key(self) -> Optional['MergeContext']:
+        return None
 
     def context_from_key(self, key: str) -> Tuple['MergeContext', bool]:
         return self, False
@@ -61,28 +153,134 @@ class MergeContext(MergeData):
     def context_from_id_index(self, _id: any, index: Optional[int]) -> Tuple['MergeContext', bool]:
         return self, False
 
+    def _resolve(self, cache_key: any, child: Optional['MergeContext']) -> 'MergeContext':
+        # Memoizes the inheritance of child from self. A missing child resolves to the interned default context.
+        resolved = self._resolved.get(cache_key)
+        if resolved is None:
+            if child is None:
+                resolved = intern(MergeContext().update(self))
+            else:
+                resolved = child.update(self)
+            resolved = self._resolved.setdefault(cache_key, resolved)
+        return resolved
 
-@dataclass
+
+# Least recently used first. Bounded so that a long running process parsing varied documents, each with its
+# own order, does not keep every context it ever resolved.
+_interned: 'OrderedDict[MergeContext, MergeContext]' = OrderedDict()
+_interned_limit = 4096
+_interned_lock = threading.Lock()
+
+
+def intern(context: MergeContext) -> MergeContext:
+    """Returns the shared instance equal to a plain MergeContext, so identical default contexts are singletons
+    while they are in use. Only the most recently interned contexts are kept."""
+    with _interned_lock:
+        shared = _interned.get(context)
+        if shared is not None:
+            _interned.move_to_end(context)
+            return shared
+        _interned[context] = context
+        while len(_interned) > _interned_limit:
+            _interned.popitem(last=False)
+        return context
+
+
+@dataclass(frozen=True, slots=True)
 class DictMergeContext(MergeContext):
     nodes: Dict[str, MergeContext] = field(default_factory=dict)
+    # Context of every key not in nodes
+    any_key: Optional[MergeContext] = None
+
+    def get_keys(self) -> List[str]:
+        return list(self.nodes)
+
+    def get_any_key(self) -> Optional[MergeContext]:
+        return self.any_key
 
     def context_from_key(self, key: str) -> Tuple['MergeContext', bool]:
         if key in self.nodes:
-            return self.nodes[key].update(self), True
-        return MergeContext().update(self), False
+            return self._resolve(key, self.nodes[key]), True
+        if self.any_key is not None:
+            return self._resolve(_any_child, self.any_key), False
+        return self._resolve(_default_child, None), False
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ListMergeContext(MergeContext):
     ids: Dict[any, MergeContext] = field(default_factory=dict)
     index: List[MergeContext] = field(default_factory=list)
     default: Optional[MergeContext] = None
+    # Context of every element without one in ids or index
+    any_element: Optional[MergeContext] = None
+
+    def get_ids(self) -> List[any]:
+        return list(self.ids)
 
     def context_from_id_index(self, _id: any, index: Optional[int]) -> Tuple['MergeContext', bool]:
         if self.default is not None and _id is None and index is None:
-            return self.default.update(self), True
-        if _id in self.nodes:
-            return self.nodes[_id].update(self), True
-        if index is not None and index < len(self.index) and self.index[index] is not None:
-            return self.index[index].update(self), True
-        return MergeContext().update(self), False
+            return self._resolve(('default',), self.default), True
+        by_index = self.index[index] if index is not None and index < len(self.index) else None
+        if _id in self.ids:
+            if by_index is not None:
+                # Annotations of the element itself take precedence over the context for its id
+                return self._resolve(('id', _id, index), overlay(self.ids[_id], by_index)), True
+            return self._resolve(('id', _id), self.ids[_id]), True
+        if by_index is not None:
+            return self._resolve(('index', index), by_index), True
+        if self.any_element is not None:
+            return self._resolve(_any_child, self.any_element), False
+        return self._resolve(_default_child, None), False
+
+
+def _attributes(context: MergeContext) -> Dict[str, any]:
+    return {'priority': context.priority, 'order': context.order, 'terminal': context.terminal,
+            'allow_none': context.allow_none, 'allow_empty': context.allow_empty,
+            'excluded_prefix': context.excluded_prefix, 'id_key': context.id_key, 'strategy': context.strategy}
+
+
+def _overlay_children(base: Dict, top: Dict, wildcard: Optional[MergeContext]) -> Dict:
+    children = dict(base)
+    for key, child in top.items():
+        children[key] = overlay(children.get(key), child)
+    if wildcard is not None:
+        # Children with a context of their own are still matched by the wildcard
+        children = {key: overlay(wildcard, child) for key, child in children.items()}
+    return children
+
+
+def overlay(base: Optional[MergeContext], top: Optional[MergeContext]) -> Optional[MergeContext]:
+    """Combines two context trees for the same data, every attribute and child context set on top taking
+    precedence over base. Used to layer embedded annotations over contexts supplied some other way."""
+    if base is None or top is None:
+        return top if base is None else base
+    attributes = _attributes(top.update(base))
+    if isinstance(top, ListMergeContext) or (isinstance(base, ListMergeContext) and not isinstance(top, DictMergeContext)):
+        base_ids = base.ids if isinstance(base, ListMergeContext) else {}
+        top_ids = top.ids if isinstance(top, ListMergeContext) else {}
+        base_index = base.index if isinstance(base, ListMergeContext) else []
+        top_index = top.index if isinstance(top, ListMergeContext) else []
+        any_element = overlay(base.any_element if isinstance(base, ListMergeContext) else None,
+                              top.any_element if isinstance(top, ListMergeContext) else None)
+        index = [overlay(base_index[position] if position < len(base_index) else None,
+                         top_index[position] if position < len(top_index) else None)
+                 for position in range(max(len(base_index), len(top_index)))]
+        if any_element is not None:
+            index = [overlay(any_element, child) if child is not None else None for child in index]
+        return ListMergeContext(
+            **attributes,
+            ids=_overlay_children(base_ids, top_ids, any_element),
+            index=index,
+            default=overlay(base.default if isinstance(base, ListMergeContext) else None,
+                            top.default if isinstance(top, ListMergeContext) else None),
+            any_element=any_element,
+        )
+    if isinstance(top, DictMergeContext) or isinstance(base, DictMergeContext):
+        any_key = overlay(base.get_any_key(), top.get_any_key())
+        return DictMergeContext(
+            **attributes,
+            nodes=_overlay_children(base.nodes if isinstance(base, DictMergeContext) else {},
+                                    top.nodes if isinstance(top, DictMergeContext) else {}, any_key),
+            any_key=any_key,
+        )
+    return MergeContext(**attributes)
@@ -0,0 +1,118 @@
+import io
+import marshal
+import zlib
+from typing import List, Protocol
+
+from src.nodes import DictNode, INode, ListNode, merge_sorted
+from src.snapshot import read_snapshot, write_snapshot
+
+# Every message is a marshal of (version, body). A shard request holds the contributors of each of its subtrees
+# as snapshots, in merge order. Its reply holds either (True, [merged subtree]) or (False, error message).
+_version = 1
+
+
+class Connection(Protocol):
+    """Message transport to a worker, multiprocessing.connection.Connection over a pipe or socket being one"""
+
+    def send_bytes(self, buf: bytes): ...
+
+    def recv_bytes(self) -> bytes: ...
+
+
+def _encode(node: INode) -> bytes:
+    buffer = io.BytesIO()
+    write_snapshot(node, buffer)
+    return buffer.getvalue()
+
+
+def _unpack(message: bytes) -> any:
+    version, body = marshal.loads(message)
+    if version != _version:
+        raise ValueError(f'unsupported shard message version {version}')
+    return body
+
+
+def _merge_shard(message: bytes) -> bytes:
+    # Every failure is replied to, a worker that stopped answering would leave the coordinator waiting forever
+    try:
+        jobs = _unpack(message)
+        merged = [merge_sorted([read_snapshot(snapshot) for snapshot in job]) for job in jobs]
+        return marshal.dumps((_version, (True, merged)))
+    except ValueError as error:
+        reply = False, str(error)
+    except Exception as error:
+        reply = False, repr(error)
+    return marshal.dumps((_version, reply))
+
+
+def serve_merge(connection: Connection):
+    """Worker side of merge_distributed, answers every shard sent over connection until it is closed"""
+    while True:
+        try:
+            message = connection.recv_bytes()
+        except EOFError:
+            return
+        connection.send_bytes(_merge_shard(message))
+
+
+def _shard(key: str, count: int) -> int:
+    # Stable across processes, unlike hash of a str
+    return zlib.crc32(key.encode('utf-8', 'surrogatepass')) % count
+
+
+def merge_distributed(documents: List[INode], connections: List[Connection]) -> any:
+    """Equivalent of merge that shards the top level of the documents across workers running serve_merge.
+
+    Keys and elements are planned here, so priority, order and terminal cut-offs decide the contributors of
+    each subtree exactly as they do in merge. Keys are then assigned to a worker by a hash of the key and list
+    elements in contiguous runs, every shard is sent before any reply is read so workers merge concurrently,
+    and the merged subtrees are stitched back in merge order. Nodes must hold their raw value, as parsed
+    nodes and snapshots do, for them to be sent."""
+    if len(connections) == 0:
+        raise ValueError('at least one worker connection is required')
+    ordered = sorted([doc for doc in documents if doc is not None], key=INode.get_sort_key)
+    for driver in ordered:
+        if driver.willing_to_drive():
+            break
+    else:
+        return None
+    count = len(connections)
+    if isinstance(driver, DictNode):
+        plan = [(key, nodes, allow_none) for key, nodes, allow_none in driver.key_plan(ordered)]
+        shards = [_shard(key, count) for key, _, _ in plan]
+    elif isinstance(driver, ListNode):
+        plan = [(None, nodes, allow_none) for nodes, allow_none in driver.id_plan(ordered)]
+        shards = [position * count // len(plan) for position in range(len(plan))]
+    else:
+        return driver.merge_ordered(ordered)
+
+    jobs = [[] for _ in connections]
+    for (_, nodes, _), shard in zip(plan, shards):
+        jobs[shard].append([_encode(node) for node in nodes])
+    for connection, shard_jobs in zip(connections, jobs):
+        if shard_jobs:
+            connection.send_bytes(marshal.dumps((_version, shard_jobs)))
+    # Every reply is read, even after a failure, so the connections stay usable for the next merge
+    merged = [None] * count
+    errors = []
+    for shard, connection in enumerate(connections):
+        if jobs[shard]:
+            ok, body = _unpack(connection.recv_bytes())
+            if ok:
+                merged[shard] = iter(body)
+            else:
+                errors.append(f'worker {shard} failed: {body}')
+    if errors:
+        raise ValueError('; '.join(errors))
+
+    result = {} if isinstance(driver, DictNode) else []
+    for (key, _, allow_none), shard in zip(plan, shards):
+        value = next(merged[shard])
+        if value is not None or allow_none:
+            if isinstance(result, dict):
+                result[key] = value
+            else:
+                result.append(value)
+    if len(result) > 0 or driver.context.is_allow_empty():
+        return result
+    return None
@@ -0,0 +1,373 @@
+import copy
+from dataclasses import replace
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from src.context import DictMergeContext, ListMergeContext, MergeContext
+from src.nodes import DictNode, INode, data_to_node, merge_sorted
+from src.parser import _extract_embedded_context, _extractor, format_pointer, parse_pointer
+
+Path = Tuple[str, ...]
+
+# Marks a key missing from one side of a comparison
+_absent = object()
+_default = MergeContext()
+
+
+def _list_index(container: List, token: str, adding: bool = False) -> int:
+    if adding and token == '-':
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token[0] == '0'):
+        raise ValueError(f'invalid list index {token!r}')
+    index = int(token)
+    if index > len(container) or (index == len(container) and not adding):
+        raise ValueError(f'list index {index} out of range')
+    return index
+
+
+def _changed_paths(old: any, new: any, path: Path, changed: List[Path]):
+    # Paths of the merge result a change from old to new can affect. Lists are merged by id as a whole and
+    # annotations affect their whole object, so changes below either mark the list or object itself.
+    if old is new:
+        return
+    if type(old) is dict and type(new) is dict:
+        children = []
+        for key in new.keys() | old.keys():
+            if not _default.is_valid_key(key):
+                if old.get(key, _absent) != new.get(key, _absent):
+                    changed.append(path)
+                    return
+            elif key not in old or key not in new:
+                children.append(path + (key,))
+            elif old[key] is not new[key]:
+                _changed_paths(old[key], new[key], path + (key,), changed)
+        changed.extend(children)
+    elif type(old) is not type(new) or old != new:
+        changed.append(path)
+
+
+def _key_order(ordered: List[INode]) -> List[str]:
+    # The keys DictNode.key_plan discovers, in its order, without building any node
+    order = {}
+    for doc in ordered:
+        for key in doc.get_keys():
+            order.setdefault(key)
+        if doc.context.is_terminal():
+            break
+    return list(order)
+
+
+def _diff(old: any, new: any, path: Path, operations: List[Dict]):
+    # Untouched subtrees of the result are shared between versions, so identity cuts the comparison short
+    if old is new:
+        return
+    if type(old) is dict and type(new) is dict:
+        for key in old:
+            if key not in new:
+                operations.append({'op': 'remove', 'path': format_pointer(path + (key,))})
+        for key, value in new.items():
+            if key not in old:
+                operations.append({'op': 'add', 'path': format_pointer(path + (key,)), 'value': value})
+            else:
+                _diff(old[key], value, path + (key,), operations)
+    elif type(old) is not type(new) or old != new:
+        operations.append({'op': 'replace', 'path': format_pointer(path), 'value': new})
+
+
+class IncrementalMerge():
+    """Keeps the merge of a set of named source documents up to date as they change.
+
+    Replacing a source with update, removing it or applying a JSON Patch to it with patch only recomputes the
+    parts of the result the change can affect: the changed subtrees, truncated at the first list or annotated
+    object, and the objects above them. Each returns the new result with the JSON Patch turning the previous
+    result into it. Sources are ordered by when they were first added unless given an explicit order.
+    Documents are copied when added, so callers may keep modifying and passing the same objects."""
+
+    def __init__(self, sources: Optional[Dict[Hashable, any]] = None, extractor: _extractor = _extractor()):
+        self.extractor = extractor
+        self.raws: Dict[Hashable, any] = {}
+        self.orders: Dict[Hashable, int] = {}
+        self.sources: Dict[int, Hashable] = {}
+        # Embedded context of each source as extracted, before its order is applied
+        self.embedded: Dict[Hashable, Optional[MergeContext]] = {}
+        self.nodes: Dict[Hashable, INode] = {}
+        self.result = None
+        for source, raw in (sources or {}).items():
+            self._load(source, raw, None)
+        self.result = merge_sorted(self._ordered())
+
+    # Source handling
+
+    def _ordered(self) -> List[INode]:
+        return sorted(self.nodes.values(), key=INode.get_sort_key)
+
+    def _load(self, source: Hashable, raw: any, order: Optional[int]):
+        if order is None:
+            order = self.orders.get(source)
+        if order is None:
+            order = max(self.orders.values(), default=-1) + 1
+        if order in self.sources and self.sources[order] != source:
+            raise ValueError(f'order {order} is already used by {self.sources[order]!r}')
+        self.sources.pop(self.orders.get(source), None)
+        self.raws[source] = copy.deepcopy(raw)
+        self.orders[source] = order
+        self.sources[order] = source
+        self._set_context(source, _extract_embedded_context(raw, self.extractor))
+
+    def _set_context(self, source: Hashable, embedded: Optional[MergeContext]):
+        self.embedded[source] = embedded
+        context = replace(embedded if embedded is not None else MergeContext(), order=self.orders[source])
+        self.nodes[source] = data_to_node(context, self.raws[source])
+
+    # Changes
+
+    def update(self, source: Hashable, raw: any, order: Optional[int] = None) -> Tuple[any, List[Dict]]:
+        """Adds source or replaces its document with raw, optionally moving it to order"""
+        if source in self.raws and (order is None or order == self.orders[source]):
+            changed = []
+            _changed_paths(self.raws[source], raw, (), changed)
+        else:
+            changed = self._root_paths(self.raws.get(source, {})) + self._root_paths(raw)
+        self._load(source, raw, order)
+        return self._recompute(changed)
+
+    def remove(self, source: Hashable) -> Tuple[any, List[Dict]]:
+        """Removes source from the merge"""
+        changed = self._root_paths(self.raws[source])
+        del self.sources[self.orders.pop(source)]
+        del self.raws[source], self.embedded[source], self.nodes[source]
+        return self._recompute(changed)
+
+    def patch(self, source: Hashable, operations: List[Dict]) -> Tuple[any, List[Dict]]:
+        """Applies a JSON Patch (RFC 6902) to the document of source.
+        Operations are applied in order and as a whole: when one fails a ValueError is raised, as is any error
+        merging the patched document, and the document and the merge are left as they were. Only the objects
+        and lists along the patched paths are copied, everything else is shared with the previous version of the
+        document."""
+        changed = []
+        # Containers copied by this patch, which it may modify in place, kept alive so their ids stay unique
+        owned = {}
+        saved = self.raws[source], self.embedded[source], self.nodes[source], self.result
+        try:
+            for operation in operations:
+                op = operation.get('op')
+                if op == 'add' or op == 'replace':
+                    value = copy.deepcopy(operation['value'])
+                    self._apply(source, op, parse_pointer(operation['path']), value, changed, owned)
+                elif op == 'remove':
+                    self._apply(source, op, parse_pointer(operation['path']), None, changed, owned)
+                elif op == 'move' or op == 'copy':
+                    origin, target = parse_pointer(operation['from']), parse_pointer(operation['path'])
+                    value = self._get(source, origin)
+                    if op == 'move':
+                        if len(target) > len(origin) and target[:len(origin)] == origin:
+                            raise ValueError(f'cannot move {operation["from"]!r} into itself')
+                        self._apply(source, 'remove', origin, None, changed, owned)
+                    else:
+                        value = copy.deepcopy(value)
+                    self._apply(source, 'add', target, value, changed, owned)
+                elif op == 'test':
+                    if self._get(source, parse_pointer(operation['path'])) != operation['value']:
+                        raise ValueError(f'test failed for {operation["path"]!r}')
+                else:
+                    raise ValueError(f'unsupported patch operation {op!r}')
+            # Annotations the merge cannot use, such as an object for an $id, only fail here
+            return self._recompute(changed)
+        except Exception:
+            self.raws[source], self.embedded[source], self.nodes[source], self.result = saved
+            raise
+
+    def _root_paths(self, raw: any) -> List[Path]:
+        # Adding or removing a whole document only touches its own keys, unless it annotates the root
+        if type(raw) is not dict or not all(_default.is_valid_key(key) for key in raw):
+            return [()]
+        return [(key,) for key in raw]
+
+    def _get(self, source: Hashable, tokens: List[str]) -> any:
+        value = self.raws[source]
+        for token in tokens:
+            value = self._get_child(value, token, tokens)
+        return value
+
+    def _apply(self, source: Hashable, op: str, tokens: List[str], value: any, changed: List[Path], owned: Dict[int, any]):
+        if not tokens:
+            if op == 'remove':
+                raise ValueError('cannot remove the whole document')
+            changed.extend(self._root_paths(self.raws[source]) + self._root_paths(value))
+            self.raws[source] = value
+            self._set_context(source, _extract_embedded_context(value, self.extractor))
+            return
+        # Containers along the path are copied before being modified, the previous document stays intact
+        containers = [self._own(self.raws[source], owned)]
+        for token in tokens[:-1]:
+            child = self._get_child(containers[-1], token, tokens)
+            container = containers[-1]
+            containers.append(self._own(child, owned))
+            if containers[-1] is not child:
+                container[_list_index(container, token) if type(container) is list else token] = containers[-1]
+        parent, token = containers[-1], tokens[-1]
+        if type(parent) is not dict and type(parent) is not list:
+            raise ValueError(f'path {format_pointer(tuple(tokens))!r} does not exist')
+        self.raws[source] = containers[0]
+        if type(parent) is dict:
+            if op != 'add' and token not in parent:
+                raise ValueError(f'path {format_pointer(tuple(tokens))!r} does not exist')
+            if op == 'remove':
+                del parent[token]
+            else:
+                parent[token] = value
+            key = token
+        else:
+            key = _list_index(parent, token, adding=op == 'add')
+            if op == 'add':
+                parent.insert(key, value)
+            elif op == 'remove':
+                del parent[key]
+            else:
+                parent[key] = value
+
+        # The result can only change below the first list on the path, or the object owning an annotation
+        path = ()
+        for container, token in zip(containers, tokens):
+            if type(container) is list:
+                break
+            if not _default.is_valid_key(token):
+                break
+            path += (token,)
+        changed.append(path)
+        self._refresh_context(source, containers, tokens, op, key)
+
+    def _own(self, container: any, owned: Dict[int, any]) -> any:
+        if (type(container) is dict or type(container) is list) and id(container) not in owned:
+            container = copy.copy(container)
+            owned[id(container)] = container
+        return container
+
+    def _get_child(self, container: any, token: str, tokens: List[str]) -> any:
+        if type(container) is dict and token in container:
+            return container[token]
+        if type(container) is list:
+            return container[_list_index(container, token)]
+        raise ValueError(f'path {format_pointer(tuple(tokens))!r} does not exist')
+
+    def _refresh_context(self, source: Hashable, containers: List[any], tokens: List[str], op: str, key: any):
+        # Rebuilds the embedded context along the changed path only, reusing the contexts of every other subtree
+        contexts = [self.embedded[source]]
+        for container, token in zip(containers[:-1], tokens[:-1]):
+            contexts.append(self._child_context(contexts[-1], container, token))
+        owner = next((position for position, (container, token) in enumerate(zip(containers, tokens))
+                      if type(container) is dict and not _default.is_valid_key(token)), None)
+        if owner is not None:
+            # An annotation changed. The contexts below its object carry the scopes compiled from the previous
+            # annotations, so the object is extracted again.
+            child = _extract_embedded_context(containers[owner], self.extractor)
+            containers = containers[:owner]
+        else:
+            parent = containers[-1]
+            child = None if op == 'remove' else _extract_embedded_context(parent[key], self.extractor)
+            if type(parent) is list:
+                children = self._children(contexts[-1], parent)
+                if op == 'add':
+                    children = {(index + 1 if index >= key else index): context for index, context in children.items()}
+                elif op == 'remove':
+                    children = {(index - 1 if index > key else index): context
+                                for index, context in children.items() if index != key}
+                if op != 'remove':
+                    if child is not None:
+                        children[key] = child
+                    else:
+                        children.pop(key, None)
+                child = self.extractor.get_list_context(parent, children)
+            else:
+                child = self._rebuild(contexts[-1], parent, key, child)
+            containers = containers[:-1]
+        for position in range(len(containers) - 1, -1, -1):
+            container = containers[position]
+            token = _list_index(container, tokens[position]) if type(container) is list else tokens[position]
+            child = self._rebuild(contexts[position], container, token, child)
+        self._set_context(source, child)
+
+    def _child_context(self, context: Optional[MergeContext], container: any, token: str) -> Optional[MergeContext]:
+        if isinstance(context, DictMergeContext):
+            return context.nodes.get(token)
+        if isinstance(context, ListMergeContext):
+            index = _list_index(container, token)
+            return context.index[index] if index < len(context.index) else None
+        return None
+
+    def _children(self, context: Optional[MergeContext], container: any) -> Dict[any, MergeContext]:
+        if isinstance(context, DictMergeContext):
+            return dict(context.nodes or {})
+        if isinstance(context, ListMergeContext):
+            return {index: child for index, child in enumerate(context.index) if child is not None}
+        return {}
+
+    def _rebuild(self, context: Optional[MergeContext], container: any, key: any,
+                 child: Optional[MergeContext]) -> Optional[MergeContext]:
+        children = self._children(context, container)
+        if child is not None:
+            children[key] = child
+        else:
+            children.pop(key, None)
+        if type(container) is dict:
+            return self.extractor.get_dict_context(container, children)
+        return self.extractor.get_list_context(container, children)
+
+    # Recomputation
+
+    def _recompute(self, changed: List[Path]) -> Tuple[any, List[Dict]]:
+        previous = self.result
+        done = set()
+        for path in sorted(set(changed), key=len):
+            # Anything below an already recomputed path is covered by it
+            if any(path[:length] in done for length in range(len(path) + 1)):
+                continue
+            done.add(self._recompute_path(path))
+        operations = []
+        _diff(previous, self.result, (), operations)
+        return self.result, operations
+
+    def _locate(self, path: Path) -> Tuple[List[List[INode]], List[bool], Path]:
+        # The sorted contributing nodes of every object along path as far as the merge reaches it
+        levels = [self._ordered()]
+        allow_nones = []
+        for position, key in enumerate(path):
+            driver = next((doc for doc in levels[-1] if doc.willing_to_drive()), None)
+            if not isinstance(driver, DictNode):
+                return levels, allow_nones, path[:position]
+            entry = driver.key_nodes(levels[-1], key)
+            if entry is None:
+                # The key is not merged at all, so only its removal from the result remains
+                return levels, allow_nones + [False], path[:position + 1]
+            levels.append(entry[0])
+            allow_nones.append(entry[1])
+        return levels, allow_nones, path
+
+    def _recompute_path(self, path: Path) -> Path:
+        levels, allow_nones, path = self._locate(path)
+        value = merge_sorted(levels[-1]) if len(levels) > len(path) else None
+        results = [self.result]
+        for key in path[:-1]:
+            results.append(results[-1].get(key) if type(results[-1]) is dict else None)
+        for position in range(len(path) - 1, -1, -1):
+            nodes, key, allow_none = levels[position], path[position], allow_nones[position]
+            old = results[position] if type(results[position]) is dict else {}
+            rebuilt = {}
+            for other in _key_order(nodes):
+                if other == key:
+                    if value is not None or allow_none:
+                        rebuilt[other] = value
+                elif other in old:
+                    rebuilt[other] = old[other]
+            driver = next(doc for doc in nodes if doc.willing_to_drive())
+            value = rebuilt if len(rebuilt) > 0 or driver.context.is_allow_empty() else None
+        self.result = value
+        return path
+
+    # Provenance
+
+    def contributors(self, path: Path) -> List[Hashable]:
+        """The sources taking part in the merge of path, highest priority first"""
+        levels, _, reached = self._locate(path)
+        if reached != path or len(levels) <= len(path):
+            return []
+        return [self.sources[node.context.get_order()] for node in levels[-1]]
@@ -0,0 +1,56 @@
+from typing import Dict, List, Tuple
+
+from src.nodes import DictNode, INode, ListNode
+from src.parser import format_pointer
+
+
+def _merge(ordered: List[INode]) -> Tuple[any, any]:
+    # Mirrors DictNode.merge_ordered and ListNode.merge_ordered, building the lineage alongside the result
+    for driver in ordered:
+        if driver.willing_to_drive():
+            break
+    else:
+        return None, None
+    if isinstance(driver, DictNode):
+        value, lineage = {}, {}
+        for key, nodes, allow_none in driver.key_plan(ordered):
+            child, child_lineage = _merge(nodes)
+            if child is not None or allow_none:
+                value[key] = child
+                lineage[key] = child_lineage
+    elif isinstance(driver, ListNode):
+        value, lineage = [], []
+        for nodes, allow_none in driver.id_plan(ordered):
+            child, child_lineage = _merge(nodes)
+            if child is not None or allow_none:
+                value.append(child)
+                lineage.append(child_lineage)
+    else:
+        return driver.merge_ordered(ordered), driver.context.get_order()
+    if len(value) > 0 or driver.context.is_allow_empty():
+        return value, lineage
+    return None, None
+
+
+def merge_lineage(documents: List[INode]) -> Tuple[any, any]:
+    """Equivalent of merge also returning the lineage of the result, resolved in the same pass.
+
+    The lineage has the shape of the result, with the order of the document that supplied it in place of
+    every value, so documents should each have a distinct order such as their position. A None kept by
+    allow_none that no document supplied has a None lineage."""
+    return _merge(sorted([doc for doc in documents if doc is not None], key=INode.get_sort_key))
+
+
+def lineage_paths(lineage: any) -> Dict[str, int]:
+    """Flattens a lineage into {json pointer of the value: order of its document} for every supplied value"""
+    paths = {}
+    stack = [((), lineage)]
+    while stack:
+        path, node = stack.pop()
+        if type(node) is dict:
+            stack.extend((path + (key,), child) for key, child in reversed(node.items()))
+        elif type(node) is list:
+            stack.extend((path + (index,), child) for index, child in reversed(list(enumerate(node))))
+        elif node is not None:
+            paths[format_pointer(path)] = node
+    return paths
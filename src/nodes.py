@@ -1,20 +1,52 @@
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional
+from typing import Dict, Generator, Iterator, List, Optional, Tuple
 from dataclasses import dataclass
 
-from src.context import MergeContext
+from src.context import ListStrategy, MergeContext
 
 
 def merge(documents: List['INode']) -> any:
-    ordered = sorted([doc for doc in documents if doc is not None],
-                     key=INode.get_sort_key)
+    return merge_sorted(sorted([doc for doc in documents if doc is not None],
+                               key=INode.get_sort_key))
+
+
+def merge_sorted(ordered: List['INode']) -> any:
+    """Same as merge but expects documents to already be filtered of None and sorted by INode.get_sort_key"""
     for doc in ordered:
         if doc.willing_to_drive():
             return doc.merge_ordered(ordered)
     return None
 
 
-@dataclass
+def merge_iterative(documents: List['INode']) -> any:
+    """Drop-in replacement for merge that resolves the document tree with an explicit work stack.
+    Nesting depth is limited only by memory instead of the interpreter recursion limit."""
+    stack = []
+    value = _start_steps(sorted([doc for doc in documents if doc is not None],
+                                key=INode.get_sort_key), stack)
+    while stack:
+        try:
+            children = stack[-1].send(value)
+        except StopIteration as done:
+            stack.pop()
+            value = done.value
+            continue
+        value = _start_steps(children, stack)
+    return value
+
+
+def _start_steps(ordered: List['INode'], stack: List[Generator]) -> any:
+    # Either pushes the merge_steps of the driving document onto the stack, in which case the generator
+    # is primed by the None returned here, or directly returns the resolved value when there is no driver.
+    # Like merge_sorted the documents are expected to already be sorted, so merge_steps yield sorted lists.
+    for doc in ordered:
+        if doc.willing_to_drive():
+            stack.append(doc.merge_steps(ordered))
+            return None
+    return None
+
+
+@dataclass(slots=True)
 class INode(ABC):
     """Interface for merge node as well as providing binding for context nodes"""
     context: MergeContext
@@ -24,6 +56,9 @@ class INode(ABC):
     def get_keys(self) -> List[str]:
         return []
 
+    def has_key(self, key: str) -> bool:
+        return key in self.get_keys()
+
     def node_from_key(self, key: str) -> Optional['INode']:
         context, is_important = self.context.context_from_key(key)
         if is_important:
@@ -32,9 +67,20 @@ class INode(ABC):
 
     # List handling functions
 
-    def get_nodes(self) -> List['INode']:
+    def get_nodes(self) -> List[Tuple[any, 'INode']]:
         return []
 
+    def get_element_ids(self) -> List[any]:
+        """The id of each element, or None for elements without one, without building any element nodes"""
+        return []
+
+    def get_strategy_ids(self, strategy: ListStrategy) -> List[any]:
+        """The id strategy matches each element by, or None for elements that stand alone"""
+        return []
+
+    def node_from_index(self, index: int) -> 'INode':
+        raise IndexError(index)
+
     def get_id(self, id_key='$key') -> any:
         return None
 
@@ -53,6 +99,13 @@ class INode(ABC):
     def merge_ordered(self, documents: List['INode']) -> any:
         pass
 
+    # Generator equivalent of merge_ordered used by merge_iterative.
+    # Each child merge is yielded as a list of nodes and its resolved value is sent back in,
+    # the final value is returned. Nodes without children can rely on this default.
+    def merge_steps(self, documents: List['INode']) -> Generator[List['INode'], any, any]:
+        return self.merge_ordered(documents)
+        yield
+
     @abstractmethod
     def willing_to_drive(self):
         pass
@@ -63,7 +116,7 @@ class INode(ABC):
         return self.context.get_sort_key()
 
 
-@dataclass
+@dataclass(slots=True)
 class ValueNode(INode):
     value: any
 
@@ -77,91 +130,249 @@ class ValueNode(INode):
         return (self.value is not None or self.context.is_allow_none())
 
 
-@dataclass
+@dataclass(slots=True)
 class DictNode(INode):
     value: Dict[str, any]
 
     def get_keys(self) -> List[str]:
         # self.context.is_valid_key(key) is potentially a leaky abstraction of
         # how we are intending to load data. This should probably be removed.
-        return [key for key in self.value if self.context.is_valid_key(key)]
+        is_valid_key = self.context.is_valid_key
+        return [key for key in self.value if is_valid_key(key)]
+
+    def has_key(self, key: str) -> bool:
+        return key in self.value and self.context.is_valid_key(key)
 
     def node_from_key(self, key) -> Optional[INode]:
         if key in self.value:
             return data_to_node(self.context.context_from_key(key)[0], self.value[key])
-        return super().node_from_key(key)
+        # Slotted dataclasses are recreated by the decorator, which breaks the zero argument super()
+        return INode.node_from_key(self, key)
 
     def get_id(self) -> any:
         return self.context.get_id(self.value)
 
     def merge_ordered(self, documents: List[INode]) -> any:
         result = {}
-        seen = set()
-        for doc in documents:
-            for key in doc.get_keys():
-                if key not in seen:
-                    seen.add(key)
-                    value = merge([doc.node_from_key(key) for doc in documents])
-                    if value is not None or doc.context.is_allow_none():
-                        result[key] = value
-            if doc.context.is_terminal():
-                break
+        for key, nodes, allow_none in self.key_plan(documents):
+            value = merge_sorted(nodes)
+            if value is not None or allow_none:
+                result[key] = value
         if len(result) > 0 or self.context.is_allow_empty():
             return result
         return None
 
+    def merge_steps(self, documents: List[INode]) -> Generator[List[INode], any, any]:
+        result = {}
+        for key, nodes, allow_none in self.key_plan(documents):
+            value = yield nodes
+            if value is not None or allow_none:
+                result[key] = value
+        if len(result) > 0 or self.context.is_allow_empty():
+            return result
+        return None
+
+    def key_plan(self, documents: List[INode]) -> Iterator[Tuple[str, List[INode], bool]]:
+        """Resolves which keys are merged and the documents contributing to each in a single pass over documents.
+        Keys are discovered in document order until a terminal document, every document still contributes to them.
+        Yields (key, sorted contributing nodes, allow_none of the discovering document) in discovery order,
+        the contributing nodes are only built as each key is reached."""
+        contributors = {}
+        plan = {}
+        resort = set()
+        resort_all = False
+        discovering = True
+        for doc in documents:
+            keys = doc.get_keys()
+            if discovering:
+                for key in keys:
+                    if key not in plan:
+                        plan[key] = doc.context.is_allow_none()
+                discovering = not doc.context.is_terminal()
+            for key in keys:
+                if discovering or key in plan:
+                    contributors.setdefault(key, []).append(doc)
+            context_keys = doc.context.get_keys()
+            if context_keys:
+                # Keys only known to the context still take part through node_from_key. Children without
+                # a context of their own inherit the priority of the already sorted document, so only keys
+                # with a context can end up out of order.
+                resort.update(context_keys)
+                keys = set(keys)
+                for key in context_keys:
+                    if key not in keys and (discovering or key in plan):
+                        contributors.setdefault(key, []).append(doc)
+            if doc.context.get_any_key() is not None:
+                # A context for every key can reorder any of them
+                resort_all = True
+        for key, allow_none in plan.items():
+            nodes = [doc.node_from_key(key) for doc in contributors[key]]
+            if resort_all or key in resort:
+                nodes.sort(key=INode.get_sort_key)
+            yield key, nodes, allow_none
+
+    def key_nodes(self, documents: List[INode], key: str) -> Optional[Tuple[List[INode], bool]]:
+        """The (sorted contributing nodes, allow_none) key_plan would yield for key without planning any other key,
+        None when key is not merged at all"""
+        allow_none = None
+        contributors = []
+        discovering = True
+        for doc in documents:
+            present = doc.has_key(key)
+            if present and discovering and allow_none is None:
+                allow_none = doc.context.is_allow_none()
+            if present or doc.context.context_from_key(key)[1]:
+                contributors.append(doc)
+            discovering = discovering and not doc.context.is_terminal()
+        if allow_none is None:
+            return None
+        nodes = [doc.node_from_key(key) for doc in contributors]
+        nodes.sort(key=INode.get_sort_key)
+        return nodes, allow_none
+
     def willing_to_drive(self):
         return True
 
 
-@dataclass
+@dataclass(slots=True)
 class ListNode(INode):
     value: List[any]
-    _node_cache: Optional[List[INode]] = None
-    _id_cache: Optional[Dict[str, INode]] = None
-
-    def get_nodes(self):
-        self._ensure_cache()
-        return self._node_cache
+    _ids: Optional[List[any]] = None
+    _id_index: Optional[Dict[any, int]] = None
+
+    def get_nodes(self) -> List[Tuple[any, INode]]:
+        return [(_id, self.node_from_index(index)) for index, _id in enumerate(self.get_element_ids())]
+
+    def get_element_ids(self) -> List[any]:
+        if self._ids is None:
+            get_id = self.context.get_id
+            self._ids = [get_id(element) for element in self.value]
+        return self._ids
+
+    def get_strategy_ids(self, strategy: ListStrategy) -> List[any]:
+        return [strategy.element_id(element) for element in self.value]
+
+    def node_from_index(self, index: int) -> INode:
+        # Elements are only wrapped once a merge actually reaches them
+        _id = self.get_element_ids()[index]
+        return data_to_node(self.context.context_from_id_index(_id, index)[0], self.value[index])
+
+    def get_id_index(self) -> Dict[any, int]:
+        """Position of the first element with each id"""
+        if self._id_index is None:
+            self._id_index = {}
+            for position, element_id in enumerate(self.get_element_ids()):
+                if element_id is not None:
+                    self._id_index.setdefault(element_id, position)
+        return self._id_index
 
     def node_from_id_index(self, _id: any, index: Optional[int]) -> Optional[INode]:
-        self._ensure_cache()
-        if _id in self._id_cache:
-            return self._id_cache[_id]
-        return super().node_from_id_index(_id, index)
+        id_index = self.get_id_index()
+        if _id in id_index:
+            return self.node_from_index(id_index[_id])
+        return INode.node_from_id_index(self, _id, index)
 
     def merge_ordered(self, documents: List[INode]) -> any:
         result = []
-        ids_seen = set()
-        for i, doc in enumerate(documents):
-            for _id, node in doc.get_nodes():
-                if _id is None or _id not in ids_seen:
-                    ids_seen.add(_id)
-                    other = documents[:]
-                    other.pop(i)
-                    value = merge([node] + [doc.node_from_id_index(_id, None) for doc in other])
-                    if value is not None or doc.context.is_allow_none():
-                        result.append(value)
-            if doc.context.is_terminal():
-                break
+        for nodes, allow_none in self.id_plan(documents):
+            value = merge_sorted(nodes)
+            if value is not None or allow_none:
+                result.append(value)
         if len(result) > 0 or self.context.is_allow_empty():
             return result
         return None
 
+    def merge_steps(self, documents: List[INode]) -> Generator[List[INode], any, any]:
+        result = []
+        for nodes, allow_none in self.id_plan(documents):
+            value = yield nodes
+            if value is not None or allow_none:
+                result.append(value)
+        if len(result) > 0 or self.context.is_allow_empty():
+            return result
+        return None
+
+    def id_plan(self, documents: List[INode]) -> Iterator[Tuple[List[INode], bool]]:
+        """Resolves the elements to merge and the nodes contributing to each in a single pass over documents.
+        Elements are taken in document order until a terminal document. Elements without an id stand alone
+        while elements sharing an id are merged with the matching element of every other document.
+        A strategy in the context of self replaces the ids elements are matched by and can order them.
+        Yields (sorted contributing nodes, allow_none of the driving document) for each resulting element."""
+        elements = []
+        by_id = {}
+        defaults = []
+        context_ids = {}
+        discovering = True
+        strategy = self.context.get_strategy()
+        for position, doc in enumerate(documents):
+            ids = doc.get_element_ids() if strategy is None else doc.get_strategy_ids(strategy)
+            for index, _id in enumerate(ids):
+                if _id is None:
+                    if discovering:
+                        elements.append((position, index, None))
+                    continue
+                contributors = by_id.get(_id)
+                if contributors is None:
+                    by_id[_id] = [(position, index)]
+                    if discovering:
+                        elements.append((position, index, _id))
+                elif contributors[-1][0] != position:
+                    contributors.append((position, index))
+            default = doc.node_from_id_index(None, None)
+            if default is not None:
+                defaults.append((position, default))
+            for _id in doc.context.get_ids():
+                context_ids.setdefault(_id, []).append(position)
+            discovering = discovering and not doc.context.is_terminal()
+        if strategy is not None:
+            elements = strategy.arrange(elements)
+
+        for position, index, _id in elements:
+            doc = documents[position]
+            if _id is None:
+                others = [default for other, default in defaults if other != position]
+            else:
+                others = [(other, documents[other].node_from_index(other_index))
+                          for other, other_index in by_id[_id][1:]]
+                if _id in context_ids:
+                    # Documents without the element can still take part through a context for its id
+                    present = {other for other, _ in by_id[_id]}
+                    others += [(other, documents[other].node_from_id_index(_id, None))
+                               for other in context_ids[_id] if other not in present]
+                    others.sort(key=lambda other: other[0])
+                others = [other for _, other in others]
+            nodes = [doc.node_from_index(index)] + others
+            if len(nodes) > 1:
+                nodes.sort(key=INode.get_sort_key)
+            yield nodes, doc.context.is_allow_none()
+
+    def id_nodes(self, documents: List[INode], _id: any) -> Optional[Tuple[List[INode], bool]]:
+        """The (sorted contributing nodes, allow_none) id_plan would yield for the element with _id without planning
+        any other element, None when no such element is merged"""
+        driver = None
+        others = []
+        discovering = True
+        for doc in documents:
+            index = doc.get_id_index().get(_id) if isinstance(doc, ListNode) else None
+            if index is not None:
+                if driver is None and discovering:
+                    driver = doc
+                    node = doc.node_from_index(index)
+                else:
+                    others.append(doc.node_from_index(index))
+            elif doc.context.context_from_id_index(_id, None)[1]:
+                others.append(doc.node_from_id_index(_id, None))
+            discovering = discovering and not doc.context.is_terminal()
+        if driver is None:
+            return None
+        nodes = [node] + others
+        if len(nodes) > 1:
+            nodes.sort(key=INode.get_sort_key)
+        return nodes, driver.context.is_allow_none()
+
     def willing_to_drive(self):
         return True
 
-    def _ensure_cache(self):
-        if self._node_cache is None or self._id_cache is None:
-            self._node_cache = []
-            self._id_cache = {}
-            for index, element in enumerate(self.value):
-                _id = self.context.get_id(element)
-                node = data_to_node(self.context.context_from_id_index(_id, index)[0], element)
-                self._node_cache.append((_id, node))
-                if _id is not None:
-                    self._id_cache[_id] = node
-
 
 def data_to_node(context: MergeContext, value: any) -> INode:
     """Converts an standard json value to its equivalent node"""
@@ -0,0 +1,103 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import List, Optional
+
+from src.nodes import DictNode, INode, ListNode, merge_sorted
+
+
+def _merge_chunk(jobs: List[List[INode]]) -> List[any]:
+    return [merge_sorted(nodes) for nodes in jobs]
+
+
+class _Batcher():
+    """Groups subtree merges into tasks of chunk_size jobs so small subtrees do not each pay the transfer cost"""
+
+    def __init__(self, executor: Executor, chunk_size: int):
+        self.executor = executor
+        self.chunk_size = chunk_size
+        self.pending = []
+        self.slots = []
+
+    def submit(self, nodes: List[INode]) -> list:
+        # A slot is [future, position in its task], filled once the task is submitted
+        slot = [None, len(self.pending)]
+        self.pending.append(nodes)
+        self.slots.append(slot)
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+        return slot
+
+    def flush(self):
+        if self.pending:
+            future = self.executor.submit(_merge_chunk, self.pending)
+            for slot in self.slots:
+                slot[0] = future
+            self.pending = []
+            self.slots = []
+
+
+def _size(driver: INode) -> int:
+    if isinstance(driver, DictNode) or isinstance(driver, ListNode):
+        return len(driver.value)
+    return 0
+
+
+def _split(ordered: List[INode], depth: int, min_size: int, batcher: _Batcher) -> tuple:
+    # Plans the merge of ordered down to depth levels, sending each subtree below that to the executor.
+    # Returns a tree of ('value', value), ('job', slot), ('dict'|'list', driver, [(key, part, allow_none)]).
+    for driver in ordered:
+        if driver.willing_to_drive():
+            break
+    else:
+        return 'value', None
+    if depth <= 0 or _size(driver) < min_size:
+        return 'job', batcher.submit(ordered)
+    if isinstance(driver, DictNode):
+        return 'dict', driver, [(key, _split(nodes, depth - 1, min_size, batcher), allow_none)
+                                for key, nodes, allow_none in driver.key_plan(ordered)]
+    if isinstance(driver, ListNode):
+        return 'list', driver, [(None, _split(nodes, depth - 1, min_size, batcher), allow_none)
+                                for nodes, allow_none in driver.id_plan(ordered)]
+    return 'value', driver.merge_ordered(ordered)
+
+
+def _collect(part: tuple) -> any:
+    # Assembles the results of a planned merge applying the same pruning as DictNode/ListNode.merge_ordered
+    if part[0] == 'value':
+        return part[1]
+    if part[0] == 'job':
+        future, position = part[1]
+        return future.result()[position]
+    kind, driver, children = part
+    result = {} if kind == 'dict' else []
+    for key, child, allow_none in children:
+        value = _collect(child)
+        if value is not None or allow_none:
+            if kind == 'dict':
+                result[key] = value
+            else:
+                result.append(value)
+    if len(result) > 0 or driver.context.is_allow_empty():
+        return result
+    return None
+
+
+def merge_parallel(documents: List[INode], executor: Optional[Executor] = None, depth: int = 1,
+                   min_size: int = 0, chunk_size: int = 1, max_workers: Optional[int] = None) -> any:
+    """Equivalent of merge that sends independent subtree merges to an executor, a process pool by default.
+
+    The top depth levels are planned in this process, every subtree below them is merged by the executor.
+    Levels with fewer than min_size keys or elements are not split any further, and chunk_size subtrees are
+    sent per task. Results are reassembled in the same key and element order as merge, terminal documents
+    cut off discovery exactly as they do there."""
+    ordered = sorted([doc for doc in documents if doc is not None], key=INode.get_sort_key)
+    owned = executor is None
+    if owned:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        batcher = _Batcher(executor, chunk_size)
+        plan = _split(ordered, depth, min_size, batcher)
+        batcher.flush()
+        return _collect(plan)
+    finally:
+        if owned:
+            executor.shutdown()
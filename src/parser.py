@@ -1,8 +1,124 @@
-from dataclasses import dataclass
-from typing import Dict, List, Optional
-from src.context import DictMergeContext, ListMergeContext, MergeContext
+import functools
+import json
+import re
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple
+from src.context import DictMergeContext, ListMergeContext, ListStrategy, MergeContext, intern, overlay
 from src.nodes import INode, data_to_node
 
+# One step of a path: .key, ."quoted key", .*, [*] or [json id]
+_step = re.compile(r'\.(?:(\*)|("(?:[^"\\]|\\.)*")|([^.\[\]"]+))|\[(?:(\*)|([^\]]+))\]')
+_scope_attributes = ('priority', 'terminal', 'allow_none', 'allow_empty', 'strategy')
+
+
+def parse_path(path: str) -> List[Tuple[str, any]]:
+    """Splits a JSONPath like path into steps. A path is an optional leading $ followed by .key or ."key" for a
+    key, .* for every key, [*] for every list element and [id] for the elements whose $id is the json value id.
+    Steps are ('key', key), ('any_key', None), ('any_element', None) and ('id', id)."""
+    position = 1 if path.startswith('$') else 0
+    steps = []
+    while position < len(path):
+        match = _step.match(path, position)
+        if match is None:
+            raise ValueError(f'invalid path {path!r} at character {position}')
+        any_key, quoted, key, any_element, _id = match.groups()
+        if any_key is not None:
+            steps.append(('any_key', None))
+        elif quoted is not None or key is not None:
+            steps.append(('key', json.loads(quoted) if quoted is not None else key))
+        elif any_element is not None:
+            steps.append(('any_element', None))
+        else:
+            try:
+                steps.append(('id', json.loads(_id)))
+            except ValueError:
+                raise ValueError(f'invalid id {_id!r} in path {path!r}')
+        position = match.end()
+    return steps
+
+
+def parse_pointer(pointer: str) -> List[str]:
+    """Splits a JSON Pointer (RFC 6901) into its unescaped tokens"""
+    if pointer == '':
+        return []
+    if not pointer.startswith('/'):
+        raise ValueError(f'invalid json pointer {pointer!r}')
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+
+
+def format_pointer(path: Tuple[any, ...]) -> str:
+    """JSON Pointer (RFC 6901) of a path of keys and list indexes"""
+    return ''.join('/' + str(token).replace('~', '~0').replace('/', '~1') for token in path)
+
+
+def parse_strategy(raw: any) -> Optional[ListStrategy]:
+    """Reads a `$strategy` annotation: "append" or "union", {"key": fields} or {"sorted": fields} with an optional
+    "descending": true, fields being a key or a list of keys"""
+    if raw is None:
+        return None
+    if raw == 'append' or raw == 'union':
+        return ListStrategy(raw)
+    if type(raw) is dict and len(set(raw) & {'key', 'sorted'}) == 1 and set(raw) <= {'key', 'sorted', 'descending'}:
+        kind = 'key' if 'key' in raw else 'sorted'
+        fields = [raw[kind]] if type(raw[kind]) is str else raw[kind]
+        descending = raw.get('descending', False)
+        if (type(fields) is list and len(fields) > 0 and all(type(name) is str for name in fields)
+                and type(descending) is bool and (kind == 'sorted' or 'descending' not in raw)):
+            return ListStrategy(kind, tuple(fields), descending)
+    raise ValueError(f'invalid $strategy {raw!r}')
+
+
+def compile_scopes(scopes: List[Dict]) -> MergeContext:
+    """Compiles a `$merge` list of {"scope": path, attribute: value} rules into a context tree relative to the
+    object holding it. The tree is the path trie, so finding the context of a child stays a lookup per step
+    however many rules there are. Rules for specific keys or ids take precedence over .* and [*], later rules
+    over earlier ones for the same path. Identical rule lists share one compiled, immutable tree."""
+    return _compile_scopes(json.dumps(scopes, sort_keys=True))
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_scopes(encoded: str) -> MergeContext:
+    scopes = json.loads(encoded)
+    if type(scopes) is not list:
+        raise ValueError('$merge must be a list of scopes')
+    root = _trie()
+    for scope in scopes:
+        if type(scope) is not dict or type(scope.get('scope')) is not str:
+            raise ValueError(f'invalid $merge scope {scope!r}')
+        unknown = set(scope) - {'scope', *_scope_attributes}
+        if unknown:
+            raise ValueError(f'unknown $merge attributes {sorted(unknown)}')
+        node = root
+        for kind, value in parse_path(scope['scope']):
+            if kind == 'key' or kind == 'id':
+                node = node[kind].setdefault(value, _trie())
+            else:
+                if node[kind] is None:
+                    node[kind] = _trie()
+                node = node[kind]
+        node['attributes'].update((name, parse_strategy(scope[name]) if name == 'strategy' else scope[name])
+                                  for name in _scope_attributes if name in scope)
+    return _build(root)
+
+
+def _trie() -> Dict:
+    return {'attributes': {}, 'key': {}, 'any_key': None, 'id': {}, 'any_element': None}
+
+
+def _build(node: Dict) -> MergeContext:
+    attributes = node['attributes']
+    if (node['key'] or node['any_key']) and (node['id'] or node['any_element']):
+        raise ValueError('a $merge scope cannot select both keys and list elements of the same value')
+    if node['key'] or node['any_key']:
+        any_key = _build(node['any_key']) if node['any_key'] is not None else None
+        return DictMergeContext(**attributes, any_key=any_key,
+                                nodes={key: overlay(any_key, _build(child)) for key, child in node['key'].items()})
+    if node['id'] or node['any_element']:
+        any_element = _build(node['any_element']) if node['any_element'] is not None else None
+        return ListMergeContext(**attributes, any_element=any_element,
+                                ids={_id: overlay(any_element, _build(child)) for _id, child in node['id'].items()})
+    return MergeContext(**attributes)
+
 
 @dataclass
 class _extractor():
@@ -10,45 +126,70 @@ class _extractor():
     terminal_key = '$terminal'
     allow_none_key = '$allow_none'
     allow_empty_key = '$allow_empty'
+    strategy_key = '$strategy'
+    merge_key = '$merge'
 
     def get_dict_context(self, raw: Dict, nodes: Optional[Dict[str, MergeContext]]) -> MergeContext:
         if ((nodes is not None and len(nodes) > 0) or self.priority_key in raw or self.terminal_key in raw
-                or self.allow_none_key in raw or self.allow_empty_key in raw):
-            return DictMergeContext(
+                or self.allow_none_key in raw or self.allow_empty_key in raw or self.strategy_key in raw
+                or self.merge_key in raw):
+            context = DictMergeContext(
                 priority=raw.get(self.priority_key),
                 terminal=raw.get(self.terminal_key),
                 allow_none=raw.get(self.allow_none_key),
                 allow_empty=raw.get(self.allow_empty_key),
+                strategy=parse_strategy(raw.get(self.strategy_key)),
                 nodes=nodes,
             )
+            if self.merge_key in raw:
+                # Annotations embedded in the data take precedence over the scopes
+                return overlay(compile_scopes(raw[self.merge_key]), context)
+            return context
         return None
 
-    def get_list_context(self, raw: List, index: Optional[List[MergeContext]]) -> MergeContext:
-        return DictMergeContext(index=index)
+    def get_list_context(self, raw: List, index: Optional[Dict[int, MergeContext]]) -> MergeContext:
+        if index is not None and len(index) > 0:
+            return ListMergeContext(index=[index.get(position) for position in range(len(raw))])
+        return None
 
 
 def _extract_embedded_context(raw: any, extractor: _extractor) -> MergeContext:
-    if type(raw) is dict:
-        nodes = {}
-        for key in raw:
-            temp = _extract_embedded_context(raw[key], extractor)
-            if temp is not None:
-                nodes[key] = temp
-        return extractor.get_dict_context(raw, nodes)
-    if type(raw) is list:
-        return ListMergeContext(
-            index=[_extract_embedded_context(item, extractor) for item in raw]
-        )
-    else:
+    """Builds the context tree of the annotated parts of raw in a single post-order walk.
+    Subtrees without annotations produce no context at all and inherit their parent's once merged.
+    The walk keeps its own stack so nesting depth is not bounded by the recursion limit."""
+    if type(raw) is not dict and type(raw) is not list:
         return None
+    # Each frame is [container, remaining children, child contexts, key of the child being walked]
+    stack = [[raw, iter(raw.items()) if type(raw) is dict else enumerate(raw), {}, None]]
+    while True:
+        frame = stack[-1]
+        for key, child in frame[1]:
+            if type(child) is dict or type(child) is list:
+                frame[3] = key
+                stack.append([child, iter(child.items()) if type(child) is dict else enumerate(child), {}, None])
+                break
+        else:
+            stack.pop()
+            container, _, children, _ = frame
+            if type(container) is dict:
+                context = extractor.get_dict_context(container, children)
+            else:
+                context = extractor.get_list_context(container, children)
+            if len(stack) == 0:
+                return context
+            if context is not None:
+                stack[-1][2][stack[-1][3]] = context
 
 
 def _extract(raw: any, extractor=_extractor()) -> MergeContext:
     embedded = _extract_embedded_context(raw, extractor)
     if embedded is not None:
         return embedded
-    return MergeContext()
+    return intern(MergeContext())
 
 
-def parse_context(raw: any) -> INode:
-    return data_to_node(context=_extract(raw), value=raw)
+def parse_context(raw: any, order: Optional[int] = None) -> INode:
+    context = _extract(raw)
+    if order is not None:
+        context = replace(context, order=order)
+    return data_to_node(context=context, value=raw)
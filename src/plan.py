@@ -0,0 +1,269 @@
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.context import ListMergeContext, ListStrategy, MergeContext
+from src.nodes import INode
+
+# Memo keys of the steps shared by every key without a context of its own and by every element without a
+# context for its id or index, the latter also standing in for the id of such elements when resolving it.
+_other_key = object()
+_element = object()
+
+
+@dataclass(slots=True)
+class _Step():
+    # Everything merge derives from the contexts of one path, indexed by document position. Positions without
+    # a context here never contribute to the path.
+    contexts: List[Optional[MergeContext]]
+    sort_keys: List[Optional[Tuple[int, int]]]
+    # Whether the contributors in the order of the parent path need sorting again
+    resort: bool
+    terminal: List[bool]
+    allow_none: List[bool]
+    allow_empty: List[bool]
+    excluded_prefix: List[Optional[str]]
+    get_id: List[Optional[Callable[[any], any]]]
+    strategy: List[Optional[ListStrategy]]
+    context_keys: List[List[str]]
+    context_ids: List[List[any]]
+    defaults: List[bool]
+    important_keys: set
+    # Ids and indexes of elements with a context of their own
+    special_ids: List[set]
+    special_indexes: List[set]
+    uniform_elements: bool
+    children: Dict[any, '_Step'] = field(default_factory=dict)
+
+    def key_step(self, key: str) -> '_Step':
+        memo = key if key in self.important_keys else _other_key
+        child = self.children.get(memo)
+        if child is None:
+            child = self.children.setdefault(memo, _step(
+                [context.context_from_key(key)[0] if context is not None else None for context in self.contexts],
+                self.sort_keys))
+        return child
+
+    def element_step(self, contexts: Optional[List[Optional[MergeContext]]] = None) -> '_Step':
+        if contexts is None:
+            child = self.children.get(_element)
+            if child is None:
+                contexts = [context.context_from_id_index(_element, None)[0] if context is not None else None
+                            for context in self.contexts]
+                child = self.children.setdefault(_element, _step(contexts, self.sort_keys))
+            return child
+        memo = tuple(map(id, contexts))
+        child = self.children.get(memo)
+        if child is None:
+            child = self.children.setdefault(memo, _step(contexts, self.sort_keys))
+        return child
+
+
+def _step(contexts: List[Optional[MergeContext]], parent_keys: List[Optional[Tuple[int, int]]]) -> _Step:
+    sort_keys = [context.get_sort_key() if context is not None else None for context in contexts]
+    context_keys = [context.get_keys() if context is not None else [] for context in contexts]
+    lists = [context if type(context) is ListMergeContext else None for context in contexts]
+    special_ids = [set(context.ids) if context is not None else set() for context in lists]
+    special_indexes = [{index for index, child in enumerate(context.index) if child is not None}
+                       if context is not None else set() for context in lists]
+    defaults = [context is not None and context.context_from_id_index(None, None)[1] for context in contexts]
+    return _Step(
+        contexts=contexts,
+        sort_keys=sort_keys,
+        resort=any(key is not None and key != parent for key, parent in zip(sort_keys, parent_keys)),
+        terminal=[context is not None and context.is_terminal() for context in contexts],
+        allow_none=[context is not None and context.is_allow_none() for context in contexts],
+        allow_empty=[context is not None and context.is_allow_empty() for context in contexts],
+        excluded_prefix=[context.excluded_prefix if context is not None else None for context in contexts],
+        get_id=[context.get_id if context is not None else None for context in contexts],
+        strategy=[context.get_strategy() if context is not None else None for context in contexts],
+        context_keys=context_keys,
+        context_ids=[context.get_ids() if context is not None else [] for context in contexts],
+        defaults=defaults,
+        important_keys={key for keys in context_keys for key in keys},
+        special_ids=special_ids,
+        special_indexes=special_indexes,
+        uniform_elements=not any(special_ids) and not any(special_indexes) and not any(defaults),
+    )
+
+
+def _run(step: _Step, ordered: List[int], values: Dict[int, any]) -> any:
+    # Mirrors merge_sorted over the raw values of the documents at positions ordered
+    allow_none = step.allow_none
+    for driver in ordered:
+        if values[driver] is not None or allow_none[driver]:
+            break
+    else:
+        return None
+    raw = values[driver]
+    if type(raw) is dict:
+        return _run_dict(step, ordered, values, driver)
+    if type(raw) is list:
+        return _run_list(step, ordered, values, driver)
+    return raw
+
+
+def _run_dict(step: _Step, ordered: List[int], values: Dict[int, any], driver: int) -> any:
+    # Mirrors DictNode.key_plan and DictNode.merge_ordered
+    plan = {}
+    contributors = {}
+    discovering = True
+    for position in ordered:
+        value = values[position]
+        if type(value) is dict:
+            prefix = step.excluded_prefix[position]
+            keys = [key for key in value if not key.startswith(prefix)]
+        else:
+            keys = []
+        if discovering:
+            for key in keys:
+                if key not in plan:
+                    plan[key] = step.allow_none[position]
+            discovering = not step.terminal[position]
+        for key in keys:
+            if discovering or key in plan:
+                contributors.setdefault(key, {})[position] = value[key]
+        if step.context_keys[position]:
+            # Keys only known to the context take part as None
+            for key in step.context_keys[position]:
+                if key not in keys and (discovering or key in plan):
+                    child = value.get(key) if type(value) is dict else None
+                    contributors.setdefault(key, {})[position] = child
+    result = {}
+    for key, allow_none in plan.items():
+        members = contributors[key]
+        if len(members) == 1:
+            value = next(iter(members.values()))
+            if type(value) is not dict and type(value) is not list:
+                # A lone value merges to itself
+                if value is not None or allow_none:
+                    result[key] = value
+                continue
+        child = step.key_step(key)
+        order = list(members)
+        if child.resort:
+            order.sort(key=child.sort_keys.__getitem__)
+        value = _run(child, order, members)
+        if value is not None or allow_none:
+            result[key] = value
+    if len(result) > 0 or step.allow_empty[driver]:
+        return result
+    return None
+
+
+def _run_list(step: _Step, ordered: List[int], values: Dict[int, any], driver: int) -> any:
+    # Mirrors ListNode.id_plan and ListNode.merge_ordered, documents being referred to by their rank in ordered
+    elements = []
+    by_id = {}
+    defaults = []
+    context_ids = {}
+    discovering = True
+    strategy = step.strategy[driver]
+    for rank, position in enumerate(ordered):
+        value = values[position]
+        if type(value) is list:
+            get_id = step.get_id[position] if strategy is None else strategy.element_id
+            for index, element in enumerate(value):
+                _id = get_id(element)
+                if _id is None:
+                    if discovering:
+                        elements.append((rank, index, None))
+                    continue
+                contributors = by_id.get(_id)
+                if contributors is None:
+                    by_id[_id] = [(rank, index)]
+                    if discovering:
+                        elements.append((rank, index, _id))
+                elif contributors[-1][0] != rank:
+                    contributors.append((rank, index))
+        if step.defaults[position]:
+            defaults.append(rank)
+        for _id in step.context_ids[position]:
+            context_ids.setdefault(_id, []).append(rank)
+        discovering = discovering and not step.terminal[position]
+    if strategy is not None:
+        elements = strategy.arrange(elements)
+
+    def context_id(position: int, index: Optional[int], _id: any) -> any:
+        # Element contexts are found by the id elements hold even when a strategy matches them by another,
+        # _id being the id the element was matched by
+        if strategy is None or index is None:
+            return _id
+        return step.get_id[position](values[position][index])
+
+    uniform = step.uniform_elements
+    shared = step.element_step()
+    result = []
+    for rank, index, _id in elements:
+        position = ordered[rank]
+        members = {position: values[position][index]}
+        if _id is None:
+            others = [(other, None, None) for other in defaults if other != rank]
+        else:
+            others = [(other, other_index, values[ordered[other]][other_index]) for other, other_index in by_id[_id][1:]]
+            if _id in context_ids:
+                present = {other for other, _ in by_id[_id]}
+                others += [(other, None, None) for other in context_ids[_id] if other not in present]
+                others.sort(key=lambda other: other[0])
+        for other, _, value in others:
+            members[ordered[other]] = value
+        if len(members) == 1 and type(members[position]) is not dict and type(members[position]) is not list:
+            value = members[position]
+            if value is not None or step.allow_none[position]:
+                result.append(value)
+            continue
+        located = [(position, index)] + [(ordered[other], other_index) for other, other_index, _ in others]
+        special = not uniform and (
+            (_id is None and len(others) > 0)
+            or any(context_id(member, member_index, _id) in step.special_ids[member]
+                   or member_index in step.special_indexes[member] for member, member_index in located))
+        order = list(members)
+        if special:
+            # Elements with a context of their own resolve to the context of their id and index in each document
+            contexts = [None] * len(step.contexts)
+            for member, member_index in located:
+                if _id is None and member != position:
+                    contexts[member] = step.contexts[member].context_from_id_index(None, None)[0]
+                else:
+                    contexts[member] = step.contexts[member].context_from_id_index(
+                        context_id(member, member_index, _id), member_index)[0]
+            child = step.element_step(contexts)
+            order.sort(key=child.sort_keys.__getitem__)
+        else:
+            child = shared
+            if child.resort:
+                order.sort(key=child.sort_keys.__getitem__)
+        value = _run(child, order, members)
+        if value is not None or step.allow_none[position]:
+            result.append(value)
+    if len(result) > 0 or step.allow_empty[driver]:
+        return result
+    return None
+
+
+class MergePlan():
+    """Merge of documents whose annotations stay the same from one merge to the next.
+
+    Sort orders, inherited contexts and terminal cut-offs are derived from the contexts of the compiled
+    documents once per path, the first time a merge reaches it, and reused by every later merge of new values
+    for those documents. Values are merged as raw json without building nodes, their annotations are not read
+    again."""
+
+    def __init__(self, documents: List[Optional[INode]]):
+        contexts = [doc.context if doc is not None else None for doc in documents]
+        self._root = _step(contexts, [None] * len(contexts))
+        self._order = sorted((position for position, context in enumerate(contexts) if context is not None),
+                             key=self._root.sort_keys.__getitem__)
+
+    def __len__(self) -> int:
+        return len(self._root.contexts)
+
+    def merge(self, values: List[any]) -> any:
+        """Equivalent of merge over the compiled documents holding values instead, one per document"""
+        if len(values) != len(self):
+            raise ValueError(f'expected {len(self)} values, got {len(values)}')
+        return _run(self._root, self._order, {position: values[position] for position in self._order})
+
+
+def compile_plan(documents: List[Optional[INode]]) -> MergePlan:
+    """Compiles the contexts of documents into a MergePlan for merging later values of the same documents"""
+    return MergePlan(documents)
@@ -0,0 +1,201 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Union
+
+from src.context import MergeContext
+from src.nodes import DictNode, INode, ListNode, merge_sorted
+from src.parser import parse_context, parse_path
+
+_default = MergeContext()
+
+
+@dataclass(slots=True)
+class Selection():
+    """Trie of compiled selectors. A whole selection takes everything below it, otherwise only the listed keys,
+    every key, elements with the listed ids or every element are taken."""
+    whole: bool = False
+    keys: Dict[str, 'Selection'] = field(default_factory=dict)
+    any_key: Optional['Selection'] = None
+    ids: Dict[any, 'Selection'] = field(default_factory=dict)
+    any_element: Optional['Selection'] = None
+
+    def add(self, steps: List[tuple]) -> 'Selection':
+        selection = self
+        for kind, value in steps:
+            if selection.whole:
+                return self
+            if kind == 'key':
+                selection = selection.keys.setdefault(value, Selection())
+            elif kind == 'any_key':
+                if selection.any_key is None:
+                    selection.any_key = Selection()
+                selection = selection.any_key
+            elif kind == 'id':
+                selection = selection.ids.setdefault(value, Selection())
+            else:
+                if selection.any_element is None:
+                    selection.any_element = Selection()
+                selection = selection.any_element
+        selection.whole = True
+        selection.keys, selection.any_key, selection.ids, selection.any_element = {}, None, {}, None
+        return self
+
+    def key(self, key: str) -> Optional['Selection']:
+        """The selection below key, None when key is not selected"""
+        return _union(self.keys.get(key), self.any_key)
+
+    def element(self, _id: any) -> Optional['Selection']:
+        """The selection below the element with _id, None when it is not selected"""
+        return _union(self.ids.get(_id) if _id is not None else None, self.any_element)
+
+
+def _union(first: Optional[Selection], second: Optional[Selection]) -> Optional[Selection]:
+    if first is None or second is None:
+        return first if first is not None else second
+    if first.whole or second.whole:
+        return first if first.whole else second
+    keys = dict(first.keys)
+    for key, selection in second.keys.items():
+        keys[key] = _union(keys.get(key), selection)
+    ids = dict(first.ids)
+    for _id, selection in second.ids.items():
+        ids[_id] = _union(ids.get(_id), selection)
+    return Selection(keys=keys, any_key=_union(first.any_key, second.any_key),
+                     ids=ids, any_element=_union(first.any_element, second.any_element))
+
+
+def compile_selectors(selectors: List[str]) -> Selection:
+    """Compiles JSONPath like selectors, see parse_path, into one Selection, for example $.A[*].B or
+    .A["x"]."B.C". Everything below the last step of a selector is selected."""
+    root = Selection()
+    for selector in selectors:
+        root.add(parse_path(selector))
+    return root
+
+
+def _selection(selectors: Union[Selection, List[str]]) -> Selection:
+    return selectors if isinstance(selectors, Selection) else compile_selectors(selectors)
+
+
+def merge_projected(documents: List[INode], selectors: Union[Selection, List[str]]) -> any:
+    """Equivalent of merge that only resolves the selected paths. Objects and lists along the way only hold their
+    selected children and are pruned as merge would prune them, everything below a selector is merged as a whole.
+    No node is built for a key or element that is not selected."""
+    return _merge_selected(sorted([doc for doc in documents if doc is not None], key=INode.get_sort_key),
+                           _selection(selectors))
+
+
+def _merge_selected(ordered: List[INode], selection: Selection) -> any:
+    if selection.whole:
+        return merge_sorted(ordered)
+    driver = next((doc for doc in ordered if doc.willing_to_drive()), None)
+    if isinstance(driver, DictNode):
+        result = _merge_selected_keys(driver, ordered, selection)
+    elif isinstance(driver, ListNode):
+        result = _merge_selected_elements(driver, ordered, selection)
+    else:
+        # A value has none of the selected children
+        return None
+    if len(result) > 0 or driver.context.is_allow_empty():
+        return result
+    return None
+
+
+def _merge_selected_keys(driver: DictNode, ordered: List[INode], selection: Selection) -> Dict:
+    result = {}
+    if selection.any_key is not None:
+        for key, nodes, allow_none in driver.key_plan(ordered):
+            value = _merge_selected(nodes, selection.key(key))
+            if value is not None or allow_none:
+                result[key] = value
+        return result
+    found = {}
+    for key in selection.keys:
+        entry = driver.key_nodes(ordered, key)
+        if entry is not None:
+            found[key] = entry
+    if len(found) > 1:
+        # Keep the order key_plan discovers them in
+        rank = {}
+        for doc in ordered:
+            for key in doc.get_keys():
+                if key in found:
+                    rank.setdefault(key, len(rank))
+            if len(rank) == len(found) or doc.context.is_terminal():
+                break
+        found = dict(sorted(found.items(), key=lambda item: rank[item[0]]))
+    for key, (nodes, allow_none) in found.items():
+        value = _merge_selected(nodes, selection.keys[key])
+        if value is not None or allow_none:
+            result[key] = value
+    return result
+
+
+def _merge_selected_elements(driver: ListNode, ordered: List[INode], selection: Selection) -> List:
+    result = []
+    if selection.any_element is not None or driver.context.get_strategy() is not None:
+        # Elements matched by a strategy are only known once planned, and are selected by the id they hold
+        for nodes, allow_none in driver.id_plan(ordered):
+            _id = next((_id for _id in (node.get_id() for node in nodes) if _id is not None), None)
+            child = selection.element(_id)
+            if child is None:
+                continue
+            value = _merge_selected(nodes, child)
+            if value is not None or allow_none:
+                result.append(value)
+        return result
+    found = []
+    for _id, child in selection.ids.items():
+        entry = driver.id_nodes(ordered, _id)
+        if entry is not None:
+            found.append((_id, child, entry))
+    if len(found) > 1:
+        # Keep the order id_plan discovers them in
+        rank = {}
+        for position, doc in enumerate(ordered):
+            id_index = doc.get_id_index() if isinstance(doc, ListNode) else {}
+            for _id, _, _ in found:
+                if _id in id_index:
+                    rank.setdefault(_id, (position, id_index[_id]))
+            if doc.context.is_terminal():
+                break
+        found.sort(key=lambda item: rank[item[0]])
+    for _id, child, (nodes, allow_none) in found:
+        value = _merge_selected(nodes, child)
+        if value is not None or allow_none:
+            result.append(value)
+    return result
+
+
+def project(raw: any, selectors: Union[Selection, List[str]]) -> any:
+    """Copy of a raw document holding only the selected paths, along with the annotations of every object and
+    element on the way, so parse_context only extracts the context of what a projected merge will visit.
+    Values where a selector expects an object or list are kept as they still take part in the merge."""
+    return _project(raw, _selection(selectors))
+
+
+def _project(raw: any, selection: Selection) -> any:
+    if selection.whole:
+        return raw
+    if type(raw) is dict:
+        projected = {}
+        for key, value in raw.items():
+            if not _default.is_valid_key(key):
+                projected[key] = value
+            else:
+                child = selection.key(key)
+                if child is not None:
+                    projected[key] = _project(value, child)
+        return projected
+    if type(raw) is list:
+        projected = []
+        for element in raw:
+            child = selection.element(_default.get_id(element))
+            if child is not None:
+                projected.append(_project(element, child))
+        return projected
+    return raw
+
+
+def parse_projected(raw: any, selectors: Union[Selection, List[str]]) -> INode:
+    """parse_context of the projection of raw, to be merged with merge_projected over the same selectors"""
+    return parse_context(project(raw, selectors))
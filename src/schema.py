@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+from dataclasses import dataclass, field, replace
+from typing import Dict, Optional
+
+from src.context import MergeContext, overlay
+from src.nodes import INode, data_to_node
+from src.parser import _extract, _extractor
+
+
+class SchemaRegistry():
+    """Resolves `$meta-merge-doc` references to independent context schemas.
+
+    A schema is a document holding only annotations, such as a control document or a `$merge` list, for
+    example {"$priority": 1, "object": {"$terminal": true}}. Schemas come from the schemas mapping, or from
+    directory where a reference resolves to the json file named after its last path segment, so
+    "https://document.host/merge/schemaV1" is read from schemaV1.json. Every schema is parsed once on first use
+    and its context tree is shared by every document referencing it, contexts being immutable."""
+
+    def __init__(self, schemas: Optional[Dict[str, any]] = None, directory: Optional[str] = None):
+        self.schemas = dict(schemas) if schemas is not None else {}
+        self.directory = directory
+        self.contexts: Dict[str, MergeContext] = {}
+        self.lock = threading.Lock()
+        self.extractor = _schema_extractor(registry=self)
+
+    def __len__(self) -> int:
+        return len(self.contexts)
+
+    def register(self, reference: str, schema: any):
+        """Adds or replaces the schema for reference, either a raw schema document or a context tree"""
+        with self.lock:
+            self.schemas[reference] = schema
+            self.contexts.pop(reference, None)
+
+    def get(self, reference: str) -> MergeContext:
+        """The shared context tree of the schema for reference"""
+        if type(reference) is not str:
+            raise ValueError(f'invalid schema reference {reference!r}')
+        context = self.contexts.get(reference)
+        if context is not None:
+            return context
+        with self.lock:
+            if reference not in self.contexts:
+                self.contexts[reference] = self._compile(self._load(reference))
+            return self.contexts[reference]
+
+    def _load(self, reference: str) -> any:
+        if reference in self.schemas:
+            return self.schemas[reference]
+        if self.directory is not None:
+            name = reference.rstrip('/').rsplit('/', 1)[-1]
+            if name not in ('', '.', '..'):
+                path = os.path.join(self.directory, name if name.endswith('.json') else name + '.json')
+                if os.path.isfile(path):
+                    with open(path, 'rb') as file:
+                        return json.load(file)
+        raise ValueError(f'unknown schema {reference!r}')
+
+    def _compile(self, schema: any) -> MergeContext:
+        if isinstance(schema, MergeContext):
+            return schema
+        # Schemas do not reference other schemas
+        return _extract(schema)
+
+    def parse_context(self, raw: any, order: Optional[int] = None) -> INode:
+        """parse_context of raw resolving `$meta-merge-doc` references, on the root or any nested object.
+        Annotations embedded in raw take precedence over those of the schema it references."""
+        context = _extract(raw, self.extractor)
+        if order is not None:
+            context = replace(context, order=order)
+        return data_to_node(context=context, value=raw)
+
+
+@dataclass
+class _schema_extractor(_extractor):
+    schema_key = '$meta-merge-doc'
+    registry: SchemaRegistry = field(default=None, repr=False, compare=False)
+
+    def get_dict_context(self, raw: Dict, nodes: Optional[Dict[str, MergeContext]]) -> MergeContext:
+        context = _extractor.get_dict_context(self, raw, nodes)
+        if self.schema_key in raw:
+            # Without annotations of its own the document uses the schema tree as is
+            return overlay(self.registry.get(raw[self.schema_key]), context)
+        return context
@@ -0,0 +1,153 @@
+import marshal
+import mmap
+import struct
+import zlib
+from typing import IO, List, Optional, Tuple, Union
+
+from src.context import DictMergeContext, ListMergeContext, ListStrategy, MergeContext, intern
+from src.nodes import DictNode, INode, ListNode, ValueNode, data_to_node
+
+# Layout of a snapshot file, all integers little endian:
+#   header   magic, version, marshal version of the payload, crc32 and length of the payload
+#   payload  marshal of (context table, index of the root context, value). The table holds every distinct
+#            context of the tree once, children before their parents, each as a tuple of its attributes,
+#            its kind and the table index of its child contexts (-1 for none). A list strategy is stored as
+#            its (kind, fields, descending).
+_magic = b'DDSN'
+_version = 2
+_header = struct.Struct('<4sHBIQ')
+_default = MergeContext()
+_plain, _dict, _list = 0, 1, 2
+
+
+def _children(context: MergeContext) -> List[Optional[MergeContext]]:
+    if type(context) is DictMergeContext:
+        return [*context.nodes.values(), context.any_key]
+    if type(context) is ListMergeContext:
+        return [*context.ids.values(), *context.index, context.default, context.any_element]
+    if type(context) is MergeContext:
+        return []
+    raise ValueError(f'cannot snapshot context of type {type(context).__name__}')
+
+
+def _dedupe_key(value: any) -> any:
+    # Equal values of different types, such as 1, 1.0 and True, must not share an entry
+    if type(value) is dict:
+        return tuple((_dedupe_key(key), _dedupe_key(child)) for key, child in value.items())
+    if type(value) is tuple:
+        return tuple(_dedupe_key(part) for part in value)
+    return type(value), value
+
+
+def _encode_contexts(root: MergeContext) -> Tuple[list, int]:
+    # Post-order walk with an explicit stack so the depth of the tree is not bounded by the recursion limit.
+    # Equal contexts, such as those of every element annotated alike, are written once and shared once read.
+    table = []
+    indexes = {}
+    entries = {}
+
+    def index(context: Optional[MergeContext]) -> int:
+        return indexes[id(context)] if context is not None else -1
+
+    stack = [(root, False)]
+    while stack:
+        context, expanded = stack.pop()
+        if id(context) in indexes:
+            continue
+        if not expanded:
+            stack.append((context, True))
+            stack.extend((child, False) for child in _children(context) if child is not None)
+            continue
+        strategy = context.strategy
+        attributes = (context.priority, context.order, context.terminal, context.allow_none, context.allow_empty,
+                      context.excluded_prefix, context.id_key,
+                      (strategy.kind, strategy.fields, strategy.descending) if strategy is not None else None)
+        if type(context) is DictMergeContext:
+            entry = (_dict, attributes, {key: index(child) for key, child in context.nodes.items()},
+                     index(context.any_key))
+        elif type(context) is ListMergeContext:
+            entry = (_list, attributes, {_id: index(child) for _id, child in context.ids.items()},
+                     tuple(index(child) for child in context.index), index(context.default), index(context.any_element))
+        else:
+            entry = (_plain, attributes)
+        key = _dedupe_key(entry)
+        if key not in entries:
+            entries[key] = len(table)
+            table.append(entry)
+        indexes[id(context)] = entries[key]
+    return table, indexes[id(root)]
+
+
+def _decode_contexts(table: list) -> List[MergeContext]:
+    contexts = []
+
+    def child(index: int) -> Optional[MergeContext]:
+        return contexts[index] if index >= 0 else None
+
+    for entry in table:
+        priority, order, terminal, allow_none, allow_empty, excluded_prefix, id_key, strategy = entry[1]
+        attributes = {'priority': priority, 'order': order, 'terminal': terminal, 'allow_none': allow_none,
+                      'allow_empty': allow_empty, 'excluded_prefix': excluded_prefix, 'id_key': id_key,
+                      'strategy': ListStrategy(*strategy) if strategy is not None else None}
+        if entry[0] == _dict:
+            context = DictMergeContext(**attributes, nodes={key: child(index) for key, index in entry[2].items()},
+                                       any_key=child(entry[3]))
+        elif entry[0] == _list:
+            context = ListMergeContext(**attributes, ids={_id: child(index) for _id, index in entry[2].items()},
+                                       index=[child(index) for index in entry[3]], default=child(entry[4]),
+                                       any_element=child(entry[5]))
+        else:
+            context = MergeContext(**attributes)
+            if context == _default:
+                context = intern(context)
+        contexts.append(context)
+    return contexts
+
+
+def write_snapshot(node: INode, target: Union[str, IO]):
+    """Writes a parsed node, its raw value along with its context tree, to a snapshot that read_snapshot and
+    open_snapshot load without parsing the value or extracting its annotations again. target is a path or a
+    binary file object."""
+    if type(node) is not ValueNode and type(node) is not DictNode and type(node) is not ListNode:
+        # Nodes over other storage, such as store nodes, do not hold the raw value
+        raise ValueError(f'cannot snapshot node of type {type(node).__name__}')
+    table, root = _encode_contexts(node.context)
+    payload = marshal.dumps((table, root, node.value))
+    header = _header.pack(_magic, _version, marshal.version, zlib.crc32(payload), len(payload))
+    if isinstance(target, str):
+        with open(target, 'wb') as out:
+            out.write(header)
+            out.write(payload)
+    else:
+        target.write(header)
+        target.write(payload)
+
+
+def read_snapshot(buffer: Union[mmap.mmap, bytes, memoryview]) -> INode:
+    """Node of a snapshot written by write_snapshot. The payload is checked and decoded straight from buffer,
+    without copying it. Snapshots are only portable between interpreters with the same marshal version, and
+    like any marshal data should only be read from trusted sources."""
+    if len(buffer) < _header.size:
+        raise ValueError('truncated merge snapshot')
+    magic, version, marshal_version, checksum, length = _header.unpack_from(buffer, 0)
+    if magic != _magic:
+        raise ValueError('not a merge snapshot')
+    if version != _version:
+        raise ValueError(f'unsupported merge snapshot version {version}')
+    if marshal_version != marshal.version:
+        raise ValueError(f'merge snapshot written with marshal version {marshal_version}, not {marshal.version}')
+    with memoryview(buffer) as view:
+        with view[_header.size:_header.size + length] as payload:
+            if len(payload) != length:
+                raise ValueError('truncated merge snapshot')
+            if zlib.crc32(payload) != checksum:
+                raise ValueError('merge snapshot checksum mismatch')
+            table, root, value = marshal.loads(payload)
+    return data_to_node(_decode_contexts(table)[root], value)
+
+
+def open_snapshot(path: str) -> INode:
+    """Maps a snapshot file read only and returns its node, the mapping is closed once it is decoded"""
+    with open(path, 'rb') as source:
+        with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return read_snapshot(mapped)
@@ -0,0 +1,274 @@
+import json
+import mmap
+import struct
+from dataclasses import dataclass
+from typing import IO, Dict, List, Optional, Union
+
+from src.context import DictMergeContext, ListMergeContext, ListStrategy, MergeContext, intern, overlay
+from src.nodes import DictNode, INode, ListNode, ValueNode
+from src.parser import _extractor, compile_scopes, parse_strategy
+
+# Layout of a store file, all integers little endian:
+#   header   magic, version, root container (-1 for a scalar root), payload offset and length,
+#            entry table offset and container count
+#   payload  the document as compact ascii json
+#   entries  one json blob per container: the payload slice of each key or element, the child container it
+#            opens, element ids, the embedded context annotations of the container and its children and
+#            whether annotations appear anywhere deeper below it
+#   table    (offset, length) of every entry blob, indexed by container
+_magic = b'DDMS'
+_version = 2
+_header = struct.Struct('<4sHqQQQQ')
+_table = struct.Struct('<QI')
+_default = MergeContext()
+
+
+def _annotations(raw: any, extractor: _extractor) -> Dict[str, any]:
+    if type(raw) is not dict:
+        return {}
+    keys = (('priority', extractor.priority_key), ('terminal', extractor.terminal_key),
+            ('allow_none', extractor.allow_none_key), ('allow_empty', extractor.allow_empty_key),
+            ('strategy', extractor.strategy_key), ('scopes', extractor.merge_key))
+    return {name: raw[key] for name, key in keys if key in raw}
+
+
+def _context(annotations: Dict[str, any]) -> Optional[MergeContext]:
+    # Context of an object from its stored annotations, None when it has none. Like parse_context, an object
+    # with annotations always gets a DictMergeContext, whatever shape the scopes above expect
+    if not annotations:
+        return None
+    if 'strategy' in annotations or 'scopes' in annotations:
+        annotations = dict(annotations)
+    if 'strategy' in annotations:
+        annotations['strategy'] = parse_strategy(annotations['strategy'])
+    if 'scopes' in annotations:
+        scopes = compile_scopes(annotations.pop('scopes'))
+        return overlay(scopes, DictMergeContext(**annotations))
+    return DictMergeContext(**annotations)
+
+
+def write_store(raw: any, target: Union[str, IO], extractor: _extractor = _extractor()):
+    """Writes raw to a store file that open_store can map, target being a path or a binary file object"""
+    chunks = []
+    position = 0
+    entries = []
+    # Each frame is [entry, remaining items, record of the value being written]
+    stack = []
+
+    def emit(text: str):
+        nonlocal position
+        chunks.append(text)
+        position += len(text)
+
+    def begin(value: any, record: Optional[list]) -> Optional[list]:
+        # Starts writing value, returning the frame of a container whose items still need writing
+        if type(value) is dict:
+            entry = {'k': {}, 'a': _annotations(value, extractor), 'n': {}}
+            items = iter(value.items())
+            emit('{')
+        elif type(value) is list:
+            entry = {'e': [], 'a': {}}
+            items = enumerate(value)
+            emit('[')
+        else:
+            emit(json.dumps(value))
+            return None
+        if record is not None:
+            record[2] = len(entries)
+        entries.append(entry)
+        return [entry, items, record]
+
+    frame = begin(raw, None)
+    root = -1 if frame is None else 0
+    if frame is not None:
+        stack.append(frame)
+    while stack:
+        entry, items, _ = frame = stack[-1]
+        for key, value in items:
+            if 'k' in entry:
+                emit((',' if entry['k'] else '') + json.dumps(key) + ':')
+                record = entry['k'][key] = [position, None, -1]
+            else:
+                emit(',' if entry['e'] else '')
+                record = [position, None, -1, _default.get_id(value)]
+                entry['e'].append(record)
+            annotations = _annotations(value, extractor)
+            if annotations and 'k' in entry:
+                entry['n'][key] = annotations
+            child = begin(value, record)
+            if child is not None:
+                stack.append(child)
+                break
+            record[1] = position
+        else:
+            stack.pop()
+            emit('}' if 'k' in entry else ']')
+            if frame[2] is not None:
+                frame[2][1] = position
+            if stack and (entry['a'] or 'd' in entry):
+                stack[-1][0]['d'] = True
+
+    payload = ''.join(chunks).encode('ascii')
+    blobs = [json.dumps(_entry_blob(entry), separators=(',', ':')).encode() for entry in entries]
+    payload_offset = _header.size
+    entries_offset = payload_offset + len(payload)
+    table = []
+    offset = entries_offset
+    for blob in blobs:
+        table.append(_table.pack(offset, len(blob)))
+        offset += len(blob)
+
+    def write(out: IO):
+        out.write(_header.pack(_magic, _version, root, payload_offset, len(payload), offset, len(entries)))
+        out.write(payload)
+        for blob in blobs:
+            out.write(blob)
+        for row in table:
+            out.write(row)
+
+    if isinstance(target, str):
+        with open(target, 'wb') as out:
+            write(out)
+    else:
+        write(target)
+
+
+def _entry_blob(entry: Dict) -> Dict:
+    # Object keys are kept as a list of records so the blob preserves key order without relying on the decoder
+    if 'k' in entry:
+        blob = {'k': [[key] + record for key, record in entry['k'].items()], 'a': entry['a'], 'n': entry['n']}
+        if 'd' in entry:
+            blob['d'] = True
+        return blob
+    return entry
+
+
+class Store():
+    """A store file mapped into memory. The OS page cache backs the mapping, so every process opening the same
+    file shares one copy and only the slices a merge touches are ever decoded."""
+
+    def __init__(self, buffer: Union[mmap.mmap, bytes, memoryview], path: Optional[str] = None):
+        self.buffer = buffer
+        self.path = path
+        # Decoded entry of every container visited so far, merges visit the same containers again and again
+        self.entries: Dict[int, Dict] = {}
+        magic, version, self.root, self.payload_offset, self.payload_length, self.table_offset, self.count = \
+            _header.unpack_from(buffer, 0)
+        if magic != _magic:
+            raise ValueError('not a merge store')
+        if version != _version:
+            raise ValueError(f'unsupported merge store version {version}')
+
+    def entry(self, container: int) -> Dict:
+        entry = self.entries.get(container)
+        if entry is None:
+            offset, length = _table.unpack_from(self.buffer, self.table_offset + container * _table.size)
+            entry = json.loads(bytes(self.buffer[offset:offset + length]))
+            if 'k' in entry:
+                entry['k'] = {record[0]: record[1:] for record in entry['k']}
+            self.entries[container] = entry
+        return entry
+
+    def decode(self, start: int, end: int) -> any:
+        return json.loads(bytes(self.buffer[self.payload_offset + start:self.payload_offset + end]))
+
+    def node(self, context: MergeContext, container: int, start: int, end: int) -> INode:
+        """Node for the value at payload slice start:end, container being its entry or -1 for scalars"""
+        if container < 0:
+            return ValueNode(context=context, value=self.decode(start, end))
+        entry = self.entry(container)
+        own = _context(entry['a'])
+        if 'k' in entry and entry['n']:
+            # Children with annotations of their own, so the merge knows their order can differ
+            own = overlay(own, DictMergeContext(
+                nodes={key: _context(annotations) for key, annotations in entry['n'].items()},
+            ))
+        if own is None and 'd' in entry:
+            # Containers above annotated values get a context of their own shape, as parse_context gives them, so
+            # scopes expecting another shape there resolve the same way
+            own = DictMergeContext() if 'k' in entry else ListMergeContext()
+        if own is not None:
+            # Stored annotations take precedence over, without discarding, the contexts scopes resolved for them
+            context = overlay(context, own)
+        if 'k' in entry:
+            return StoreDictNode(context=context, value=entry['k'], store=self)
+        return StoreListNode(context=context, value=entry['e'], store=self)
+
+    def root_node(self, context: Optional[MergeContext] = None) -> INode:
+        context = context if context is not None else intern(MergeContext())
+        return self.node(context, self.root, 0, self.payload_length)
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def __enter__(self) -> 'Store':
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __reduce__(self):
+        # A mapped store is sent to other processes by path, so they map the same file instead of copying it
+        if self.path is not None:
+            return map_store, (self.path,)
+        return Store, (bytes(self.buffer),)
+
+
+def map_store(path: str) -> Store:
+    """Maps a store file written by write_store read only, the mapping is released once the store is closed
+    or leaves a with block"""
+    with open(path, 'rb') as source:
+        return Store(mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ), path)
+
+
+def open_store(path: str, context: Optional[MergeContext] = None) -> INode:
+    """Maps a store file written by write_store read only and returns its root node.
+
+    Contexts are resolved lazily as the merge reaches each value and match parse_context, except where $merge
+    scopes select the same value both as an object and, through a wildcard, as a list. parse_context applies
+    the wildcard after the annotations below it while the store applies it before, so the list scope is lost.
+
+    The file stays mapped until node.store is closed, map_store gives the store to use in a with block instead.
+    A scalar document is decoded and unmapped right away."""
+    store = map_store(path)
+    node = store.root_node(context)
+    if store.root < 0:
+        store.close()
+    return node
+
+
+@dataclass(slots=True)
+class StoreDictNode(DictNode):
+    """DictNode over a store object, value maps each key to its (start, end, container) payload slice"""
+    store: Store = None
+
+    def node_from_key(self, key) -> Optional[INode]:
+        if key in self.value:
+            start, end, container = self.value[key]
+            return self.store.node(self.context.context_from_key(key)[0], container, start, end)
+        return INode.node_from_key(self, key)
+
+    def get_id(self) -> any:
+        if self.context.id_key in self.value:
+            return self.node_from_key(self.context.id_key).value
+        return None
+
+
+@dataclass(slots=True)
+class StoreListNode(ListNode):
+    """ListNode over a store array, value holds the (start, end, container, id) payload slice of each element"""
+    store: Store = None
+
+    def get_element_ids(self) -> List[any]:
+        if self._ids is None:
+            self._ids = [element[3] for element in self.value]
+        return self._ids
+
+    def get_strategy_ids(self, strategy: ListStrategy) -> List[any]:
+        return [strategy.element_id(self.store.decode(start, end)) for start, end, _, _ in self.value]
+
+    def node_from_index(self, index: int) -> INode:
+        start, end, container, _id = self.value[index]
+        context = self.context.context_from_id_index(_id, index)[0]
+        return self.store.node(context, container, start, end)
@@ -0,0 +1,294 @@
+import codecs
+import io
+import json
+import re
+from json.decoder import scanstring
+from typing import IO, Generator, List, Optional, Tuple, Union
+
+from src.context import MergeContext, intern
+from src.nodes import INode, data_to_node
+from src.parser import _extract_embedded_context, _extractor
+
+_token = re.compile(r'[ \t\n\r]*(?:([{}\[\]:,])|(-?(?:0|[1-9]\d*)(\.\d+)?([eE][-+]?\d+)?)|(true|false|null)|("))')
+_number_tail = re.compile(r'[0-9.eE+\-]*')
+_literals = {'true': True, 'false': False, 'null': None}
+_decoder = json.JSONDecoder()
+_default = MergeContext()
+
+Events = Generator[Tuple[str, any], bool, None]
+
+
+class _Reader():
+    """Buffers a text or byte stream, keeping everything from position onwards when more is read"""
+
+    def __init__(self, source: Union[IO, bytes, str], chunk_size: int):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        elif isinstance(source, str):
+            source = io.StringIO(source)
+        self.source = source
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.position = 0
+        self.offset = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Reads the next chunk onto the buffer, returns False once the source was already exhausted"""
+        if self.eof:
+            return False
+        chunk = self.source.read(self.chunk_size)
+        if len(chunk) == 0:
+            self.eof = True
+            chunk = self.decoder.decode(b'', final=True)
+        elif not isinstance(chunk, str):
+            chunk = self.decoder.decode(chunk)
+        self.offset += self.position
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def token(self) -> Tuple[Optional[str], any]:
+        """Reads the next token as ('{', None) style punctuation or ('value', value), (None, None) at the end"""
+        while True:
+            buffer = self.buffer
+            match = _token.match(buffer, self.position)
+            if match is None:
+                position = len(buffer) - len(buffer[self.position:].lstrip(' \t\n\r'))
+                if len(buffer) - position < 6 and self.fill():
+                    continue
+                if position == len(buffer):
+                    return None, None
+                raise self.error('Expecting value', position)
+            punctuation, number, frac, exp, literal, string = match.groups()
+            if punctuation is not None:
+                self.position = match.end()
+                return punctuation, None
+            if number is not None:
+                if _number_tail.fullmatch(buffer, match.end()) and self.fill():
+                    # The number may continue in the next chunk
+                    continue
+                self.position = match.end()
+                return 'value', float(number) if frac or exp else int(number)
+            if literal is not None:
+                self.position = match.end()
+                return 'value', _literals[literal]
+            try:
+                value, end = scanstring(buffer, match.end())
+            except ValueError:
+                if self.fill():
+                    continue
+                raise self.error('Unterminated string', match.end() - 1)
+            self.position = end
+            return 'value', value
+
+    def whole(self) -> Tuple[bool, any]:
+        """Decodes the next value in one go if it is an object or array that is completely buffered"""
+        buffer = self.buffer
+        position = self.position
+        while position < len(buffer) and buffer[position] in ' \t\n\r':
+            position += 1
+        if position < len(buffer) and buffer[position] in '{[':
+            try:
+                value, end = _decoder.raw_decode(buffer, position)
+            except ValueError:
+                # Either not completely buffered yet or invalid, both are left to the tokens
+                return False, None
+            self.position = end
+            return True, value
+        return False, None
+
+    def error(self, message: str, position: int) -> ValueError:
+        return ValueError(f'{message} at character {self.offset + position}')
+
+
+def iter_events(source: Union[IO, bytes, str], chunk_size: int = 65536) -> Events:
+    """Incrementally reads a json document from a file object or buffer as a stream of events.
+    Events are ('start_map', None), ('map_key', key), ('end_map', None), ('start_array', None),
+    ('end_array', None) and ('value', value) for every string, number, boolean and null.
+
+    Sending True into the generator instead of calling next asks for the next value in one event: when it is an
+    object or array already completely buffered it is decoded at native speed and yielded as ('value', value)."""
+    reader = _Reader(source, chunk_size)
+    # Each entry is True for an object and False for an array
+    containers = []
+    # What is allowed next, one of 'value', 'first_value', 'key', 'first_key', 'colon', 'next' and 'done'
+    expecting = 'value'
+    whole = False
+    while True:
+        if whole and (expecting == 'value' or expecting == 'first_value'):
+            decoded, value = reader.whole()
+            if decoded:
+                expecting = 'next' if containers else 'done'
+                whole = yield 'value', value
+                continue
+        token, value = reader.token()
+        if token is None:
+            if expecting != 'done':
+                raise reader.error('Unexpected end of document', reader.position)
+            return
+        if expecting == 'done':
+            raise reader.error('Extra data', reader.position - 1)
+        if expecting == 'key' or expecting == 'first_key':
+            if token == 'value' and type(value) is str:
+                expecting = 'colon'
+                whole = yield 'map_key', value
+                continue
+            if token == '}' and expecting == 'first_key':
+                containers.pop()
+                expecting = 'next' if containers else 'done'
+                whole = yield 'end_map', None
+                continue
+            raise reader.error('Expecting property name enclosed in double quotes', reader.position - 1)
+        if expecting == 'colon':
+            if token != ':':
+                raise reader.error("Expecting ':' delimiter", reader.position - 1)
+            expecting = 'value'
+            continue
+        if expecting == 'next':
+            if token == ',':
+                expecting = 'key' if containers[-1] else 'value'
+                continue
+            if token == ('}' if containers[-1] else ']'):
+                containers.pop()
+                expecting = 'next' if containers else 'done'
+                whole = yield ('end_map' if token == '}' else 'end_array'), None
+                continue
+            raise reader.error("Expecting ',' delimiter", reader.position - 1)
+        # expecting a value
+        if token == ']' and expecting == 'first_value':
+            containers.pop()
+            expecting = 'next' if containers else 'done'
+            whole = yield 'end_array', None
+        elif token == '{':
+            containers.append(True)
+            expecting = 'first_key'
+            whole = yield 'start_map', None
+        elif token == '[':
+            containers.append(False)
+            expecting = 'first_value'
+            whole = yield 'start_array', None
+        elif token == 'value':
+            expecting = 'next' if containers else 'done'
+            whole = yield 'value', value
+        else:
+            raise reader.error('Expecting value', reader.position - 1)
+
+
+def _skip(events: Events):
+    # Consumes the next complete value from events without building it
+    depth = 0
+    for event, _ in events:
+        if event == 'start_map' or event == 'start_array':
+            depth += 1
+        elif event == 'end_map' or event == 'end_array':
+            depth -= 1
+        if depth == 0:
+            return
+
+
+class _Frame():
+    __slots__ = ('container', 'children', 'control', 'terminal', 'allowed', 'key')
+
+    def __init__(self, container, control, terminal):
+        self.container = container
+        self.children = {}
+        self.control = control
+        self.terminal = terminal
+        # Keys or ids a terminal control document will ever visit, None when everything may be visited
+        self.allowed = None
+        if terminal:
+            if type(container) is dict:
+                self.allowed = set(control) if type(control) is dict else set()
+            else:
+                self.allowed = {_default.get_id(item) for item in control} if type(control) is list else set()
+                self.allowed.discard(None)
+        self.key = None
+
+    def is_unrestricted(self) -> bool:
+        # Whether the next value below this frame is built completely, in which case it can be decoded whole
+        control, terminal = _child_control(self, None)
+        return not terminal and type(control) is not dict and type(control) is not list
+
+
+def _child_control(parent: Optional[_Frame], control: any) -> Tuple[any, bool]:
+    # The control document and its inherited terminal for a container starting below parent
+    if parent is None:
+        terminal = False
+    elif type(parent.container) is list:
+        # Elements are matched to the control document by id, which is not known until they are read
+        return None, False
+    elif not _default.is_valid_key(parent.key):
+        # Annotation values such as $merge scopes are not data, they are always built whole
+        return None, False
+    else:
+        control = parent.control.get(parent.key) if type(parent.control) is dict else None
+        terminal = parent.terminal
+    if type(control) is dict and (_extractor.merge_key in control or _extractor.strategy_key in control):
+        # Scopes can change what is terminal anywhere below, and strategies how elements below are matched,
+        # so nothing there is skipped
+        return None, False
+    if type(control) is dict and _extractor.terminal_key in control:
+        terminal = control[_extractor.terminal_key] or False
+    return control, terminal
+
+
+def parse_stream(source: Union[IO, bytes, str], control: any = None, chunk_size: int = 65536,
+                 extractor: _extractor = _extractor()) -> INode:
+    """Equivalent of parse_context that builds the document and its embedded context from a stream of json.
+    Subtrees that fit in the read buffer are decoded whole, everything else is built from iter_events.
+
+    control is the raw control document this document will be merged under. Where it is terminal, keys it does
+    not contain are skipped without being built, and list elements whose `$id` it does not contain are dropped
+    once read. This is only valid when control outranks this document everywhere, as is the case for the
+    highest priority control document."""
+    events = iter_events(source, chunk_size)
+    stack: List[_Frame] = []
+    whole = control is None
+    while True:
+        try:
+            event, value = events.send(whole) if stack else next(events)
+        except StopIteration:
+            raise ValueError('Unexpected end of document')
+        whole = False
+        if event == 'map_key':
+            frame = stack[-1]
+            if frame.allowed is not None and value not in frame.allowed and _default.is_valid_key(value):
+                _skip(events)
+            else:
+                frame.key = value
+                whole = frame.is_unrestricted()
+            continue
+        if event == 'start_map' or event == 'start_array':
+            parent = stack[-1] if stack else None
+            stack.append(_Frame({} if event == 'start_map' else [], *_child_control(parent, control)))
+            whole = event == 'start_array'
+            continue
+        if event == 'end_map':
+            frame = stack.pop()
+            value = frame.container
+            context = extractor.get_dict_context(value, frame.children)
+        elif event == 'end_array':
+            frame = stack.pop()
+            value = frame.container
+            context = extractor.get_list_context(value, frame.children)
+        else:
+            context = _extract_embedded_context(value, extractor)
+        if not stack:
+            # Anything but whitespace after the document is an error raised by the events
+            for _ in events:
+                pass
+            return data_to_node(context=context if context is not None else intern(MergeContext()), value=value)
+        parent = stack[-1]
+        if type(parent.container) is dict:
+            parent.container[parent.key] = value
+            if context is not None:
+                parent.children[parent.key] = context
+        else:
+            whole = True
+            if parent.allowed is not None and _default.get_id(value) not in parent.allowed:
+                continue
+            if context is not None:
+                parent.children[len(parent.container)] = context
+            parent.container.append(value)
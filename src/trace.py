@@ -0,0 +1,104 @@
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.nodes import DictNode, INode, ListNode
+
+
+@dataclass(slots=True)
+class PathTrace():
+    """What resolving one path of a traced merge took.
+
+    seconds includes the children, documents is the number of nodes contributing to the path, nodes the
+    number of child nodes its plan built, driver the (priority, order) of the driving document and terminal
+    the number of documents that did not discover children because a terminal document came before them."""
+    name: str
+    kind: str = 'none'
+    seconds: float = 0.0
+    documents: int = 0
+    nodes: int = 0
+    driver: Optional[Tuple[int, int]] = None
+    terminal: Optional[int] = None
+    children: List['PathTrace'] = field(default_factory=list)
+
+    def self_seconds(self) -> float:
+        return max(self.seconds - sum(child.seconds for child in self.children), 0.0)
+
+    def walk(self, path: Tuple[str, ...] = ()) -> Iterator[Tuple[Tuple[str, ...], 'PathTrace']]:
+        """Every (path, trace) below and including this one, parents first"""
+        stack = [(path + (self.name,), self)]
+        while stack:
+            path, trace = stack.pop()
+            yield path, trace
+            stack.extend((path + (child.name,), child) for child in reversed(trace.children))
+
+    def folded(self) -> str:
+        """Folded stacks of the self time of every path in microseconds, as read by flamegraph.pl and speedscope"""
+        lines = []
+        for path, trace in self.walk():
+            lines.append(f'{";".join(name.replace(";", ",") for name in path)} {round(trace.self_seconds() * 1e6)}')
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self) -> Dict[str, any]:
+        return {'name': self.name, 'kind': self.kind, 'seconds': self.seconds, 'documents': self.documents,
+                'nodes': self.nodes, 'driver': self.driver, 'terminal': self.terminal,
+                'children': [child.to_dict() for child in self.children]}
+
+
+def _element_name(position: int, nodes: List[INode]) -> str:
+    _id = next((_id for _id in (node.get_id() for node in nodes) if _id is not None), None)
+    return f'[{json.dumps(_id)}]' if _id is not None else f'[#{position}]'
+
+
+def _traced(ordered: List[INode], name: str, depth: int, max_depth: Optional[int]) -> Tuple[any, PathTrace]:
+    start = time.perf_counter()
+    trace = PathTrace(name, documents=len(ordered))
+    driver = next((doc for doc in ordered if doc.willing_to_drive()), None)
+    if driver is None:
+        value = None
+    elif (max_depth is not None and depth >= max_depth) or \
+            (not isinstance(driver, DictNode) and not isinstance(driver, ListNode)):
+        trace.kind = 'dict' if isinstance(driver, DictNode) else 'list' if isinstance(driver, ListNode) else 'value'
+        trace.driver = driver.get_sort_key()
+        value = driver.merge_ordered(ordered)
+    else:
+        trace.driver = driver.get_sort_key()
+        for position, doc in enumerate(ordered):
+            if doc.context.is_terminal():
+                if position < len(ordered) - 1:
+                    trace.terminal = len(ordered) - position - 1
+                break
+        # Mirrors DictNode.merge_ordered and ListNode.merge_ordered
+        if isinstance(driver, DictNode):
+            trace.kind = 'dict'
+            value = {}
+            for key, nodes, allow_none in driver.key_plan(ordered):
+                trace.nodes += len(nodes)
+                child, child_trace = _traced(nodes, key, depth + 1, max_depth)
+                trace.children.append(child_trace)
+                if child is not None or allow_none:
+                    value[key] = child
+        else:
+            trace.kind = 'list'
+            value = []
+            for position, (nodes, allow_none) in enumerate(driver.id_plan(ordered)):
+                trace.nodes += len(nodes)
+                child, child_trace = _traced(nodes, _element_name(position, nodes), depth + 1, max_depth)
+                trace.children.append(child_trace)
+                if child is not None or allow_none:
+                    value.append(child)
+        if len(value) == 0 and not driver.context.is_allow_empty():
+            value = None
+    trace.seconds = time.perf_counter() - start
+    return value, trace
+
+
+def merge_traced(documents: List[INode], max_depth: Optional[int] = None) -> Tuple[any, PathTrace]:
+    """Equivalent of merge returning a PathTrace of the merge along with its result. Paths are named by key,
+    list elements by [json id] as in parse_path, or by [#position] in the plan when they have no id. Below
+    max_depth levels subtrees are merged as a whole and only accounted to their path. The regular merge carries
+    no instrumentation, so tracing costs nothing unless this is called, both resolving through the same
+    key_plan and id_plan."""
+    ordered = sorted([doc for doc in documents if doc is not None], key=INode.get_sort_key)
+    return _traced(ordered, '$', 0, max_depth)
@@ -0,0 +1,154 @@
+import json
+import math
+from dataclasses import dataclass
+from typing import IO, Iterator, List, Optional
+
+from src.nodes import DictNode, INode, ListNode, ValueNode
+
+# Marks the end of a level's plan
+_end = object()
+
+
+class _Output():
+    """Buffers written text into chunks of about buffer_size characters, encoded when targeting a binary writer"""
+
+    def __init__(self, target: IO, encoding: Optional[str], buffer_size: int):
+        self.target = target
+        self.encoding = encoding
+        self.buffer_size = buffer_size
+        self.parts = []
+        self.size = 0
+
+    def write(self, text: str):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            text = ''.join(self.parts)
+            self.target.write(text.encode(self.encoding) if self.encoding is not None else text)
+            self.parts = []
+            self.size = 0
+
+
+@dataclass(slots=True)
+class _Frame():
+    # An object or list being written. Its opening, along with its key in the parent, is only written once
+    # its first member is, as until then it may still resolve empty and be pruned.
+    kind: str
+    driver: INode
+    plan: Iterator
+    key: Optional[str]
+    allow_none: bool
+    opened: bool = False
+    count: int = 0
+
+
+def _start(ordered: List[INode], key: Optional[str], allow_none: bool, stack: List[_Frame]) -> Optional[tuple]:
+    # Pushes a frame for an object or list driver, otherwise returns (value,) of the resolved value
+    for driver in ordered:
+        if driver.willing_to_drive():
+            break
+    else:
+        return None,
+    if type(driver) is ValueNode:
+        return driver.value,
+    if isinstance(driver, DictNode):
+        stack.append(_Frame('dict', driver, driver.key_plan(ordered), key, allow_none))
+        return None
+    if isinstance(driver, ListNode):
+        stack.append(_Frame('list', driver, driver.id_plan(ordered), key, allow_none))
+        return None
+    return driver.merge_ordered(ordered),
+
+
+class _Encoder():
+    """json.dumps with default separators, skipping its per call setup for the scalars most values are"""
+
+    def __init__(self, ensure_ascii: bool):
+        self.ensure_ascii = ensure_ascii
+        self.string = json.encoder.encode_basestring_ascii if ensure_ascii else json.encoder.encode_basestring
+
+    def encode(self, value: any) -> str:
+        kind = type(value)
+        if kind is str:
+            return self.string(value)
+        if kind is int:
+            return int.__repr__(value)
+        if kind is float and math.isfinite(value):
+            return float.__repr__(value)
+        if value is None:
+            return 'null'
+        if value is True:
+            return 'true'
+        if value is False:
+            return 'false'
+        return json.dumps(value, ensure_ascii=self.ensure_ascii)
+
+    def member(self, parent: _Frame, key: Optional[str]) -> str:
+        # The separator and key of a new member of parent
+        parent.count += 1
+        if parent.kind == 'dict':
+            return (', ' if parent.count > 1 else '') + self.string(key) + ': '
+        return ', ' if parent.count > 1 else ''
+
+
+def _open(stack: List[_Frame], output: _Output, encoder: _Encoder):
+    # Writes the openings of every frame not opened yet, opened frames always being the bottom of the stack
+    first = len(stack)
+    while first > 0 and not stack[first - 1].opened:
+        first -= 1
+    for position in range(first, len(stack)):
+        frame = stack[position]
+        prefix = encoder.member(stack[position - 1], frame.key) if position > 0 else ''
+        output.write(prefix + ('{' if frame.kind == 'dict' else '['))
+        frame.opened = True
+
+
+def _emit(stack: List[_Frame], key: Optional[str], allow_none: bool, value: any, output: _Output, encoder: _Encoder):
+    if value is None and not allow_none:
+        return
+    if not stack:
+        output.write(encoder.encode(value))
+        return
+    if not stack[-1].opened:
+        _open(stack, output, encoder)
+    output.write(encoder.member(stack[-1], key) + encoder.encode(value))
+
+
+def write_merged(documents: List[INode], target: IO, encoding: Optional[str] = None, buffer_size: int = 65536,
+                 ensure_ascii: bool = True):
+    """Writes the json of merge(documents) to target as every key and element resolves, the same text as
+    json.dump(merge(documents), target) without building the merged document.
+
+    Keys and elements are written in merge order with the same allow_none and allow_empty pruning, an object
+    or list only being written once it is known not to resolve empty. Memory is bounded by the depth of the
+    documents rather than the size of the result. Text is written in chunks of about buffer_size characters,
+    encoded with encoding when target takes bytes."""
+    output = _Output(target, encoding, buffer_size)
+    encoder = _Encoder(ensure_ascii)
+    stack = []
+    resolved = _start(sorted([doc for doc in documents if doc is not None], key=INode.get_sort_key), None, True, stack)
+    if resolved is not None:
+        _emit(stack, None, True, resolved[0], output, encoder)
+    while stack:
+        frame = stack[-1]
+        entry = next(frame.plan, _end)
+        if entry is _end:
+            stack.pop()
+            if frame.opened:
+                output.write('}' if frame.kind == 'dict' else ']')
+            else:
+                empty = ({} if frame.kind == 'dict' else []) if frame.driver.context.is_allow_empty() else None
+                _emit(stack, frame.key, frame.allow_none, empty, output, encoder)
+            continue
+        if frame.kind == 'dict':
+            key, nodes, allow_none = entry
+        else:
+            key, (nodes, allow_none) = None, entry
+        resolved = _start(nodes, key, allow_none, stack)
+        if resolved is not None:
+            _emit(stack, key, allow_none, resolved[0], output, encoder)
+    output.flush()
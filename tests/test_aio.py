@@ -0,0 +1,108 @@
+import asyncio
+import unittest
+from dataclasses import dataclass
+from typing import List, Optional
+
+from src.aio import merge_async
+from src.nodes import merge
+from src.parser import parse_context
+
+
+async def _document(raw: any, delay: float = 0) -> any:
+    await asyncio.sleep(delay)
+    return raw
+
+
+async def _documents(raws: List[any], delay: float = 0):
+    for raw in raws:
+        await asyncio.sleep(delay)
+        yield raw
+
+
+async def _never(started: List[bool]):
+    started.append(True)
+    await asyncio.Future()
+
+
+class TestMergeAsync(unittest.TestCase):
+
+    def test_merge_async(self):
+        @dataclass
+        class TestCase:
+            name: str
+            _input: List[any]
+            priorities: List[Optional[int]]
+
+        control = {'$priority': 2, '$terminal': True, 'A': {'B': None}, 'C': [{'$id': 1, 'D': None}]}
+        cases = [
+            TestCase(name='empty', _input=[], priorities=[]),
+            TestCase(name='values', _input=[None, 'A', 1.5], priorities=[None, None, None]),
+            TestCase(name='dicts', _input=[{'A': {'B': 1}, 'F': 1}, {'A': {'B': 2, 'C': 'A'}, 'D': None, 'E': {}}],
+                     priorities=[0, 0]),
+            TestCase(name='lists', _input=[[1, {'$id': 'x', 'A': 1}], [{'$id': 'x', 'A': 2, 'B': 2}, [[]]]],
+                     priorities=[0, 0]),
+            TestCase(name='priority', _input=[
+                {'A': {'B': 'Failure', 'C': 'Success'}, 'D': [{'$id': 1, 'E': 'Failure'}]},
+                {'A': {'$priority': 1, 'B': 'Success'}, 'D': [{'$id': 1, '$priority': 1, 'E': 'Success'}]},
+            ], priorities=[0, 1]),
+            TestCase(name='control_document', _input=[
+                {'A': {'B': 'Success', 'E': 'Failure'}, 'C': [{'$id': 2, 'D': 'Failure'}, {'$id': 1, 'D': 'Success'}]},
+                control,
+                {'$priority': 1, 'A': {'B': 'Failure'}, 'C': [{'$id': 1, 'D': 'Failure'}]},
+            ], priorities=[0, 2, 1]),
+            TestCase(name='terminal_without_bounds', _input=[
+                control, {'$priority': 1, 'A': {'B': 'Success'}}, {'A': {'B': 'Failure', 'E': 'Failure'}},
+            ], priorities=[None, None, None]),
+            TestCase(name='allow_none_and_empty', _input=[
+                {'$allow_empty': True, 'A': {'$allow_none': True, 'B': None}, 'C': {}},
+                {'A': {'C': None}, '$allow_none': True, 'F': None},
+            ], priorities=[0, 0]),
+        ]
+
+        for case in cases:
+            expected = merge([parse_context(raw) for raw in case._input])
+            # Every arrival order, from the first source arriving first to the last one arriving first
+            for reverse in (False, True):
+                with self.subTest(case.name, reverse=reverse):
+                    delays = [(len(case._input) - position if reverse else position) * 0.001
+                              for position in range(len(case._input))]
+                    sources = [_document(raw, delay) for raw, delay in zip(case._input, delays)]
+                    result = asyncio.run(merge_async(sources, case.priorities))
+                    self.assertEqual(expected, result)
+                    self.assertEqual(list(expected or []), list(result or []))
+
+    def test_async_iterables(self):
+        raws = [[{'A': 1}, {'B': 2}], [{'A': 3, 'C': 4}], [{'$priority': 1, 'B': 5}, {'D': 6}]]
+        expected = merge([parse_context(raw) for group in raws for raw in group])
+        result = asyncio.run(merge_async([_documents(group, 0.001) for group in raws]))
+        self.assertEqual(expected, result)
+        self.assertEqual(list(expected), list(result))
+
+    def test_terminal_stops_waiting(self):
+        control = {'$priority': 2, '$terminal': True, 'A': {'B': None}, 'C': 'Success'}
+        primary = {'$priority': 1, 'A': {'B': 'Success'}}
+        started = []
+
+        result = asyncio.run(asyncio.wait_for(merge_async(
+            [_document(control), _document(primary, 0.001), _never(started)], priorities=[2, 1, 0]), timeout=5))
+
+        self.assertEqual({'A': {'B': 'Success'}, 'C': 'Success'}, result)
+        self.assertEqual([True], started)
+
+    def test_lower_sources_are_awaited_when_needed(self):
+        control = {'$priority': 2, '$terminal': True, 'A': {'B': None}}
+        result = asyncio.run(merge_async([_document(control), _document({'A': {'B': 'Success'}}, 0.001)], priorities=[2, 0]))
+        self.assertEqual({'A': {'B': 'Success'}}, result)
+
+    def test_errors(self):
+        async def failing():
+            raise KeyError('missing')
+
+        with self.assertRaises(KeyError):
+            asyncio.run(merge_async([_document({'A': 1}), failing()]))
+        with self.assertRaises(ValueError):
+            asyncio.run(merge_async([], priorities=[None]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import itertools
+import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from src.batch import merge_batch
+from src.nodes import merge
+from src.parser import parse_context
+
+control = {'$priority': 1, '$terminal': True, 'A': {'B': None}, 'C': [{'$id': 1, 'D': None}]}
+groups = [
+    [],
+    [None, 'A', 1.5],
+    [{'A': {'B': 1}, 'F': 1}, {'A': {'B': 2, 'C': 'A'}, 'D': None, 'E': {}}],
+    [[1, {'$id': 'x', 'A': 1}], [{'$id': 'x', 'A': 2, 'B': 2}, [[]]]],
+    [{'A': {'B': 'Failure', 'C': 'Success'}}, {'A': {'$priority': 1, 'B': 'Success'}}],
+    [control, {'A': {'B': 'Success', 'E': 'Failure'}, 'C': [{'$id': 2, 'D': 'Failure'}, {'$id': 1, 'D': 'Success'}]}],
+    [control, {'A': {'B': 'Other'}, 'C': [{'$id': 1, 'D': 'Other', 'E': 'Failure'}]}],
+    ({'$allow_empty': True, 'A': {'$allow_none': True, 'B': None}, 'C': {}}, {'A': {'C': None}, '$allow_none': True}),
+]
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_merge_batch(self):
+        expected = [merge([parse_context(raw) for raw in group]) for group in groups]
+
+        for chunk_size in (1, 3, 64):
+            with self.subTest(executor=None, chunk_size=chunk_size):
+                self.assertEqual(expected, list(merge_batch(groups, chunk_size=chunk_size)))
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            for chunk_size, max_pending in ((1, 1), (2, 3), (64, 16)):
+                with self.subTest(executor='threads', chunk_size=chunk_size, max_pending=max_pending):
+                    result = list(merge_batch(iter(groups), executor, chunk_size=chunk_size, max_pending=max_pending))
+                    self.assertEqual(expected, result)
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(expected, list(merge_batch(groups, executor, chunk_size=3)))
+
+    def test_pending_work_is_bounded(self):
+        consumed = itertools.count()
+
+        def stream():
+            for key in itertools.count():
+                next(consumed)
+                yield [{'A': key}, {'A': -key, 'B': key}]
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = merge_batch(stream(), executor, chunk_size=4, max_pending=2)
+            self.assertEqual([{'A': key, 'B': key} for key in range(10)], list(itertools.islice(results, 10)))
+            results.close()
+        # The chunk being consumed plus at most max_pending chunks ahead of it
+        self.assertLessEqual(next(consumed), 4 * 3 + 4)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            merge_batch(groups, chunk_size=0)
+        with self.assertRaises(ValueError):
+            merge_batch(groups, max_pending=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
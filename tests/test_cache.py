@@ -0,0 +1,105 @@
+import unittest
+from dataclasses import dataclass
+from typing import List
+
+from src.cache import MergeCache, fingerprint
+from src.nodes import merge
+from src.parser import parse_context
+
+
+class TestMergeCache(unittest.TestCase):
+
+    def test_merge(self):
+        @dataclass
+        class TestCase:
+            name: str
+            _input: List[any]
+
+        cases = [
+            TestCase(name='empty', _input=[]),
+            TestCase(name='values', _input=[None, 'A', 1.5]),
+            TestCase(name='dicts', _input=[{'A': {'B': 1}, 'F': 1}, {'A': {'B': 2, 'C': 'A'}, 'D': None, 'E': {}}]),
+            TestCase(name='lists', _input=[[1, {'$id': 'x', 'A': 1}], [{'$id': 'x', 'A': 2, 'B': 2}, [[]]]]),
+            TestCase(name='priority', _input=[
+                {'A': {'B': 'Failure', 'C': 'Success'}, 'D': [{'$id': 1, 'E': 'Failure'}]},
+                {'A': {'$priority': 1, 'B': 'Success'}, 'D': [{'$id': 1, '$priority': 1, 'E': 'Success'}]},
+            ]),
+            TestCase(name='control_document', _input=[
+                {'$priority': 1, '$terminal': True, 'A': {'B': None}, 'C': [{'$id': 1, 'D': None}]},
+                {'A': {'B': 'Success', 'E': 'Failure'}, 'C': [{'$id': 2, 'D': 'Failure'}, {'$id': 1, 'D': 'Success'}]},
+            ]),
+            TestCase(name='allow_none_and_empty', _input=[
+                {'$allow_empty': True, 'A': {'$allow_none': True, 'B': None}, 'C': {}},
+                {'A': {'C': None}, '$allow_none': True, 'F': None},
+            ]),
+        ]
+
+        cache = MergeCache()
+        for case in cases:
+            expected = merge([parse_context(raw) for raw in case._input])
+            for attempt in ('miss', 'hit'):
+                with self.subTest(case.name, attempt=attempt):
+                    actual = cache.merge(case._input)
+                    self.assertEqual(expected, actual)
+                    self.assertEqual(list(expected or []), list(actual or []))
+
+    def test_subtrees_are_reused(self):
+        cache = MergeCache()
+        low = {'A': {'B': 1}, 'C': {'D': 1}}
+        self.assertEqual({'A': {'B': 2}, 'C': {'D': 1}}, cache.merge([{'A': {'B': 2}}, low]))
+
+        cache.hits = cache.misses = 0
+        result = cache.merge([{'A': {'B': 3}}, low])
+        self.assertEqual({'A': {'B': 3}, 'C': {'D': 1}}, result)
+        # low is parsed and its C subtree merged already, the new document and its A subtree are not
+        self.assertEqual(2, cache.hits)
+        self.assertEqual(2, cache.misses)
+
+        # The same subtree merged under a different priority is a different entry
+        self.assertEqual({'A': {'B': 1}, 'C': {'D': 1}}, cache.merge([{'A': {'B': 3}}, dict(low, **{'$priority': 1})]))
+
+    def test_root_scopes(self):
+        # Only a root scope changes between the merges, the subtree it targets is merged again
+        cache = MergeCache()
+        low = {'A': {'B': 'Low'}}
+        self.assertEqual({'A': {'B': 'High'}}, cache.merge([{'A': {'B': 'High'}}, low]))
+        scoped = dict(low, **{'$merge': [{'scope': '$.A', 'priority': 1}]})
+        self.assertEqual({'A': {'B': 'Low'}}, cache.merge([{'A': {'B': 'High'}}, scoped]))
+        nested = dict(low, **{'$merge': [{'scope': '$.A.B', 'priority': 1}]})
+        self.assertEqual({'A': {'B': 'Low'}}, cache.merge([{'A': {'B': 'High'}}, nested]))
+
+    def test_root_strategy(self):
+        cache = MergeCache()
+        self.assertEqual({'A': [1, 2, 2, 3]}, cache.merge([{'A': [1, 2]}, {'A': [2, 3]}]))
+        self.assertEqual({'A': [1, 2, 3]}, cache.merge([{'A': [1, 2], '$strategy': 'union'}, {'A': [2, 3]}]))
+
+    def test_versions(self):
+        cache = MergeCache()
+        self.assertEqual({'A': 1}, cache.merge([{'A': 1}], versions=['v1']))
+        # A known version is not hashed again, so its content is trusted to be unchanged
+        self.assertEqual({'A': 1}, cache.merge([{'A': 2}], versions=['v1']))
+        self.assertEqual({'A': 2}, cache.merge([{'A': 2}], versions=['v2']))
+
+    def test_eviction(self):
+        cache = MergeCache(max_entries=3)
+        for value in range(5):
+            cache.merge([{'A': value}])
+        self.assertEqual(3, len(cache))
+        self.assertEqual({'hits': 0, 'misses': 10, 'evictions': 7},
+                         {name: count for name, count in cache.stats().items() if name in ('hits', 'misses', 'evictions')})
+
+        document = {'A': 'xxxxxxxxxx'}
+        cache = MergeCache(max_bytes=2 * fingerprint(document)[2])
+        cache.merge([document])
+        self.assertEqual(2, len(cache))
+        cache.merge([{'A': 'yyyyyyyyyy'}])
+        self.assertEqual(2, cache.evictions)
+        self.assertLessEqual(cache.bytes, cache.max_bytes)
+
+    def test_fingerprint(self):
+        digest, subtrees, size = fingerprint({'A': [1, 2], 'B': None})
+        self.assertEqual(['A', 'B'], list(subtrees))
+        self.assertGreater(size, 0)
+        self.assertEqual(digest, fingerprint({'A': [1, 2], 'B': None})[0])
+        self.assertNotEqual(digest, fingerprint({'B': None, 'A': [1, 2]})[0])
+        self.assertEqual(subtrees['A'], fingerprint({'C': [1, 2]})[1]['C'])
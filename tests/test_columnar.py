@@ -0,0 +1,71 @@
+import unittest
+from dataclasses import dataclass
+from typing import List
+from unittest import mock
+
+from src.columnar import merge_columnar, numpy
+from src.nodes import ListNode, merge
+from src.parser import parse_context
+
+
+class TestColumnar(unittest.TestCase):
+
+    def test_merge_columnar(self):
+        @dataclass
+        class TestCase:
+            name: str
+            _input: List[any]
+
+        cases = [
+            TestCase(name='empty', _input=[]),
+            TestCase(name='values', _input=[None, 'A', [1, 2]]),
+            TestCase(name='records', _input=[
+                {'A': [{'$id': 1, 'B': 1, 'C': None}, {'$id': 2, 'B': 2, 'C': 'A'}]},
+                {'A': [{'$id': 2, 'C': 'B', 'D': True}, {'$id': 3, 'C': 'C', 'D': False}]},
+            ]),
+            TestCase(name='field_order', _input=[
+                [{'$id': 1, 'B': 1}, {'$id': 2, 'B': 2}],
+                [{'$id': 3, 'C': 3, 'A': 3}, {'$id': 1, 'C': 1, 'A': 1}],
+                [{'$id': 1, 'D': 1}],
+            ]),
+            TestCase(name='priority', _input=[
+                {'A': [{'$id': 1, 'B': 'Failure', 'C': 'Success'}, {'$id': 2, 'B': 'Success'}]},
+                {'$priority': 1, 'A': [{'$id': 1, 'B': 'Success', 'C': None}]},
+            ]),
+            TestCase(name='terminal', _input=[
+                {'$terminal': True, 'A': [{'$id': 1, 'B': 'Success'}, {'$id': 2, 'B': None}]},
+                {'A': [{'$id': 3, 'B': 'Failure'}, {'$id': 2, 'B': 'Success', 'C': 'Failure'}]},
+                {'$terminal': True, 'A': []},
+            ]),
+            TestCase(name='allow_none_and_empty', _input=[
+                {'$allow_none': True, 'A': [{'$id': 1, 'B': None}, {'$id': 2}]},
+                {'$allow_empty': True, 'A': [{'$id': 2, 'B': None}, {'$id': 3, 'B': None}]},
+                {'A': [{'$id': 4, 'B': None}]},
+            ]),
+            TestCase(name='not_records', _input=[
+                {'A': [{'$id': 1, 'B': {'C': 1}}], 'D': [{'B': 1}], 'E': [{'$id': 1, '$priority': 1, 'B': 1}]},
+                {'A': [{'$id': 1, 'B': {'D': 2}}], 'D': [{'B': 2}], 'E': [{'$id': 1, 'B': 2}, 1]},
+                {'F': [{'$id': 1, 'B': 1}, {'$id': 1, 'B': 2}], 'G': [{'$id': 1, 'B': 1, 'C': 1}, {'$id': 2, 'C': 2, 'B': 2}]},
+            ]),
+        ]
+
+        for case in cases:
+            expected = merge([parse_context(raw) for raw in case._input])
+            result = merge_columnar([parse_context(raw) for raw in case._input], min_rows=0)
+            self.assertEqual(repr(expected), repr(result), f'failed test {case.name}')
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_vectorized(self):
+        documents = [
+            {'A': [{'$id': _id, 'B': _id, 'C': None} for _id in range(100)]},
+            {'$priority': 1, 'A': [{'$id': _id, 'B': None, 'C': -_id} for _id in range(50, 150)]},
+        ]
+        expected = merge([parse_context(raw) for raw in documents])
+        with mock.patch.object(ListNode, 'id_plan', side_effect=AssertionError('merged element by element')):
+            self.assertEqual(expected, merge_columnar([parse_context(raw) for raw in documents], min_rows=200))
+            with self.assertRaises(AssertionError):
+                merge_columnar([parse_context(raw) for raw in documents], min_rows=201)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,10 @@
 import unittest
-from dataclasses import dataclass
+from dataclasses import FrozenInstanceError, dataclass
 from typing import List
+from unittest import mock
 
-from src.context import MergeContext
+from src import context
+from src.context import DictMergeContext, ListMergeContext, MergeContext, intern, overlay
 
 
 class TestMergeContext(unittest.TestCase):
@@ -118,12 +120,59 @@ class TestMergeContext(unittest.TestCase):
         ]
 
         for case in cases:
+            actual = case.original.update(case.merge)
             self.assertEqual(
                 case.expected,
-                case.original.update(case.merge),
-                f"failed test {case.name} expected {case.expected}, actual {case.original}",
+                actual,
+                f"failed test {case.name} expected {case.expected}, actual {actual}",
             )
 
+    def test_contexts_are_immutable(self):
+        child = MergeContext(allow_none=True)
+        parent = DictMergeContext(priority=1, nodes={'A': child})
+
+        resolved, _ = parent.context_from_key('A')
+
+        self.assertEqual(MergeContext(priority=1, allow_none=True), resolved)
+        self.assertEqual(MergeContext(allow_none=True), child)
+        with self.assertRaises(FrozenInstanceError):
+            child.priority = 2
+
+    def test_resolved_contexts_are_shared(self):
+        parent = DictMergeContext(priority=1, nodes={'A': MergeContext(allow_none=True)})
+        other = DictMergeContext(priority=1)
+        lists = ListMergeContext(priority=1, ids={'A': MergeContext(allow_none=True)})
+
+        self.assertIs(parent.context_from_key('A')[0], parent.context_from_key('A')[0])
+        self.assertIs(lists.context_from_id_index('A', None)[0], lists.context_from_id_index('A', 0)[0])
+        self.assertIs(parent.context_from_key('B')[0], other.context_from_key('C')[0])
+        self.assertIs(parent.context_from_key('B')[0], lists.context_from_id_index(None, 0)[0])
+        self.assertEqual((MergeContext(priority=1), False), other.context_from_key('B'))
+
+    def test_intern(self):
+        shared = intern(MergeContext(priority=-7))
+        self.assertIs(shared, intern(MergeContext(priority=-7)))
+        with mock.patch.object(context, '_interned_limit', 3):
+            for order in range(10):
+                intern(MergeContext(priority=-7, order=order))
+                self.assertLessEqual(len(context._interned), 3)
+            # Recently interned contexts are still shared, older ones are let go
+            self.assertIs(intern(MergeContext(priority=-7, order=9)), intern(MergeContext(priority=-7, order=9)))
+            self.assertIsNot(shared, intern(MergeContext(priority=-7)))
+
+    def test_overlay(self):
+        base = DictMergeContext(priority=1, terminal=True, any_key=MergeContext(allow_none=True),
+                                nodes={'A': MergeContext(priority=1), 'B': MergeContext(priority=2)})
+        top = DictMergeContext(priority=3, nodes={'A': MergeContext(priority=4)})
+
+        combined = overlay(base, top)
+
+        self.assertEqual((MergeContext(priority=4, terminal=True, allow_none=True), True), combined.context_from_key('A'))
+        self.assertEqual((MergeContext(priority=2, terminal=True, allow_none=True), True), combined.context_from_key('B'))
+        self.assertEqual((MergeContext(priority=3, terminal=True, allow_none=True), False), combined.context_from_key('C'))
+        self.assertIs(base, overlay(base, None))
+        self.assertIs(top, overlay(None, top))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,145 @@
+import marshal
+import os
+import tempfile
+import threading
+import unittest
+from dataclasses import dataclass
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Client, Listener
+from typing import List
+
+from src.context import ListStrategy, MergeContext
+from src.distributed import merge_distributed, serve_merge
+from src.nodes import data_to_node, merge
+from src.parser import parse_context
+from src.store import open_store, write_store
+
+
+class _Workers():
+    """Workers serving merges on threads over pipes"""
+
+    def __init__(self, count: int):
+        self.connections = []
+        self.threads = []
+        for _ in range(count):
+            local, remote = Pipe()
+            thread = threading.Thread(target=serve_merge, args=(remote,), daemon=True)
+            thread.start()
+            self.connections.append(local)
+            self.threads.append(thread)
+
+    def __enter__(self) -> list:
+        return self.connections
+
+    def __exit__(self, *_):
+        for connection in self.connections:
+            connection.close()
+        for thread in self.threads:
+            thread.join()
+
+
+class TestDistributed(unittest.TestCase):
+
+    def test_merge_distributed(self):
+        @dataclass
+        class TestCase:
+            name: str
+            _input: List[any]
+
+        cases = [
+            TestCase(name='empty', _input=[]),
+            TestCase(name='values', _input=[None, 'A', 1.5]),
+            TestCase(name='dicts', _input=[{'A': {'B': 1}, 'F': 1}, {'A': {'B': 2, 'C': 'A'}, 'D': None, 'E': {}}]),
+            TestCase(name='lists', _input=[[1, {'$id': 'x', 'A': 1}, None], [{'$id': 'x', 'A': 2, 'B': 2}, [[]]]]),
+            TestCase(name='priority', _input=[
+                {'A': {'B': 'Failure', 'C': 'Success'}, 'D': [{'$id': 1, 'E': 'Failure'}]},
+                {'A': {'$priority': 1, 'B': 'Success'}, 'D': [{'$id': 1, '$priority': 1, 'E': 'Success'}]},
+            ]),
+            TestCase(name='control_document', _input=[
+                {'$priority': 1, '$terminal': True, 'A': {'B': None}, 'C': [{'$id': 1, 'D': None}]},
+                {'A': {'B': 'Success', 'E': 'Failure'}, 'C': [{'$id': 2, 'D': 'Failure'}, {'$id': 1, 'D': 'Success'}],
+                 'F': 'Failure'},
+            ]),
+            TestCase(name='terminal_list', _input=[
+                [{'$id': 1, 'A': 'Success'}, {'$id': 2, '$terminal': True, 'B': 'Success'}, 3],
+                {'$terminal': True, '$priority': 1, '$merge': [{'scope': '$[*]', 'terminal': False}],
+                 '$value': [{'$id': 2, 'C': 'Success'}, {'$id': 1, 'B': None}]},
+                [{'$id': 4}, {'$id': 2, 'B': 'Failure', 'D': 'Failure'}],
+            ]),
+            TestCase(name='allow_none_and_empty', _input=[
+                {'$allow_empty': True, 'A': {'$allow_none': True, 'B': None}, 'C': {}, 'D': {'E': {}}},
+                {'A': {'C': None}, 'F': [None, {}]},
+            ]),
+            TestCase(name='many_keys', _input=[
+                {str(key): {'A': key, 'B': [key, {'$id': key}]} for key in range(40)},
+                {'1': {'$priority': 1, 'A': 0}, '2': None, '\ud800': {'C': '\ud800'}},
+            ]),
+        ]
+
+        with _Workers(3) as connections:
+            for case in cases:
+                for count in (1, 2, 3):
+                    with self.subTest(case.name, count=count):
+                        expected = merge([parse_context(raw) for raw in case._input])
+                        result = merge_distributed([parse_context(raw) for raw in case._input], connections[:count])
+                        self.assertEqual(repr(expected), repr(result))
+
+    def test_strategy(self):
+        documents = [
+            data_to_node(MergeContext(strategy=ListStrategy('key', ('A',))), [{'A': 1, 'B': 1}, {'A': 2}]),
+            data_to_node(MergeContext(), [{'A': 2, 'B': 2}, {'A': 3}]),
+        ]
+        with _Workers(2) as connections:
+            self.assertEqual([{'A': 1, 'B': 1}, {'A': 2, 'B': 2}, {'A': 3}], merge_distributed(documents, connections))
+
+    def test_sockets(self):
+        # Workers in other processes reached over local sockets
+        raws = [{str(key): {'A': key} for key in range(20)}, {'3': {'$priority': 1, 'A': 'Success'}}]
+        expected = merge([parse_context(raw) for raw in raws])
+        workers = []
+        connections = []
+        try:
+            for _ in range(2):
+                with Listener(('127.0.0.1', 0)) as listener:
+                    worker = Process(target=_serve_socket, args=(listener.address,), daemon=True)
+                    worker.start()
+                    workers.append(worker)
+                    connections.append(listener.accept())
+            self.assertEqual(expected, merge_distributed([parse_context(raw) for raw in raws], connections))
+            self.assertEqual(expected, merge_distributed([parse_context(raw) for raw in raws], connections))
+        finally:
+            for connection in connections:
+                connection.close()
+            for worker in workers:
+                worker.join()
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            merge_distributed([parse_context({'A': 1})], [])
+        with _Workers(2) as connections:
+            connections[0].send_bytes(marshal.dumps((0, [])))
+            self.assertEqual((1, (False, 'unsupported shard message version 0')), marshal.loads(connections[0].recv_bytes()))
+            # Malformed requests are answered with an error and the worker keeps serving
+            for message in (marshal.dumps((1, 5)), marshal.dumps((1, [[b'DDSN']])), b'', marshal.dumps(1)):
+                with self.subTest(message=message):
+                    connections[0].send_bytes(message)
+                    self.assertFalse(marshal.loads(connections[0].recv_bytes())[1][0])
+            self.assertEqual({'A': 1}, merge_distributed([parse_context({'A': 1})], connections[:1]))
+            # Store nodes do not hold their raw value and cannot be sent, the connections stay usable afterwards
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'document.store')
+                write_store({'A': {'B': 1}, 'C': 2}, path)
+                node = open_store(path)
+                with self.assertRaises(ValueError):
+                    merge_distributed([node], connections)
+                node.store.close()
+            self.assertEqual({'A': 1}, merge_distributed([parse_context({'A': 1})], connections))
+
+
+def _serve_socket(address):
+    with Client(address) as connection:
+        serve_merge(connection)
+
+
+if __name__ == '__main__':
+    unittest.main()
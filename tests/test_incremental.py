@@ -0,0 +1,187 @@
+import copy
+import unittest
+from dataclasses import dataclass
+from typing import Dict, List
+
+from src.incremental import IncrementalMerge
+from src.nodes import DictNode, merge
+from src.parser import parse_context
+
+
+class TestIncrementalMerge(unittest.TestCase):
+
+    def test_patch(self):
+        @dataclass
+        class TestCase:
+            name: str
+            operations: List[Dict]
+            expected: any
+            diff: List[Dict]
+
+        sources = {
+            'low': {'A': {'B': 'Low', 'C': 'Low'}, 'D': [{'$id': 1, 'E': 'Low'}], 'F': 'Low'},
+            'high': {'$priority': 1, 'A': {'B': 'High'}, 'D': [{'$id': 1, 'G': 'High'}]},
+        }
+        cases = [
+            TestCase(name='replace_value', operations=[
+                {'op': 'replace', 'path': '/A/B', 'value': 'Changed'},
+            ], expected={'A': {'B': 'Changed', 'C': 'Low'}, 'D': [{'G': 'High', 'E': 'Low'}], 'F': 'Low'}, diff=[
+                {'op': 'replace', 'path': '/A/B', 'value': 'Changed'},
+            ]),
+            TestCase(name='remove_value_falls_back', operations=[
+                {'op': 'remove', 'path': '/A/B'},
+            ], expected={'A': {'B': 'Low', 'C': 'Low'}, 'D': [{'G': 'High', 'E': 'Low'}], 'F': 'Low'}, diff=[
+                {'op': 'replace', 'path': '/A/B', 'value': 'Low'},
+            ]),
+            TestCase(name='add_key_keeps_key_order', operations=[
+                {'op': 'add', 'path': '/F', 'value': 'High'},
+                {'op': 'add', 'path': '/H', 'value': 'High'},
+            ], expected={'A': {'B': 'High', 'C': 'Low'}, 'D': [{'G': 'High', 'E': 'Low'}], 'F': 'High', 'H': 'High'},
+                diff=[
+                {'op': 'replace', 'path': '/F', 'value': 'High'},
+                {'op': 'add', 'path': '/H', 'value': 'High'},
+            ]),
+            TestCase(name='list_element', operations=[
+                {'op': 'add', 'path': '/D/0/E', 'value': 'High'},
+            ], expected={'A': {'B': 'High', 'C': 'Low'}, 'D': [{'G': 'High', 'E': 'High'}], 'F': 'Low'}, diff=[
+                {'op': 'replace', 'path': '/D', 'value': [{'G': 'High', 'E': 'High'}]},
+            ]),
+            TestCase(name='priority_change', operations=[
+                {'op': 'replace', 'path': '/$priority', 'value': -1},
+            ], expected={'A': {'B': 'Low', 'C': 'Low'}, 'D': [{'E': 'Low', 'G': 'High'}], 'F': 'Low'}, diff=[
+                {'op': 'replace', 'path': '/A/B', 'value': 'Low'},
+            ]),
+            TestCase(name='terminal_change', operations=[
+                {'op': 'add', 'path': '/$terminal', 'value': True},
+            ], expected={'A': {'B': 'High'}, 'D': [{'G': 'High'}]}, diff=[
+                {'op': 'remove', 'path': '/A/C'},
+                {'op': 'replace', 'path': '/D', 'value': [{'G': 'High'}]},
+                {'op': 'remove', 'path': '/F'},
+            ]),
+            TestCase(name='annotation_in_list', operations=[
+                {'op': 'add', 'path': '/D/0/$priority', 'value': -1},
+                {'op': 'add', 'path': '/D/0/E', 'value': 'High'},
+            ], expected={'A': {'B': 'High', 'C': 'Low'}, 'D': [{'E': 'Low', 'G': 'High'}], 'F': 'Low'}, diff=[]),
+            TestCase(name='move_and_copy', operations=[
+                {'op': 'copy', 'from': '/A', 'path': '/H'},
+                {'op': 'move', 'from': '/A/B', 'path': '/A/C'},
+                {'op': 'test', 'path': '/H/B', 'value': 'High'},
+            ], expected={'A': {'C': 'High', 'B': 'Low'}, 'D': [{'G': 'High', 'E': 'Low'}], 'H': {'B': 'High'}, 'F': 'Low'},
+                diff=[
+                {'op': 'replace', 'path': '/A/B', 'value': 'Low'},
+                {'op': 'replace', 'path': '/A/C', 'value': 'High'},
+                {'op': 'add', 'path': '/H', 'value': {'B': 'High'}},
+            ]),
+            TestCase(name='pruned_parent', operations=[
+                {'op': 'add', 'path': '/I', 'value': {'J': {'K': None}}},
+                {'op': 'replace', 'path': '/I/J/K', 'value': 1},
+            ], expected={'A': {'B': 'High', 'C': 'Low'}, 'D': [{'G': 'High', 'E': 'Low'}], 'I': {'J': {'K': 1}}, 'F': 'Low'},
+                diff=[
+                {'op': 'add', 'path': '/I', 'value': {'J': {'K': 1}}},
+            ]),
+        ]
+
+        for case in cases:
+            with self.subTest(case.name):
+                incremental = IncrementalMerge(copy.deepcopy(sources))
+                result, diff = incremental.patch('high', case.operations)
+                self.assertEqual(case.expected, result)
+                self.assertEqual(list(case.expected), list(result))
+                self.assertEqual(sorted(case.diff, key=str), sorted(diff, key=str))
+
+    def test_update_and_remove(self):
+        incremental = IncrementalMerge({'first': {'A': 1, 'B': {'C': 1}}, 'second': {'A': 2, 'D': 2}})
+        self.assertEqual({'A': 1, 'B': {'C': 1}, 'D': 2}, incremental.result)
+
+        result, diff = incremental.update('first', {'B': {'C': 1}})
+        self.assertEqual({'A': 2, 'B': {'C': 1}, 'D': 2}, result)
+        self.assertEqual([{'op': 'replace', 'path': '/A', 'value': 2}], diff)
+
+        result, diff = incremental.update('third', {'A': 3, '$priority': 1})
+        self.assertEqual({'A': 3, 'B': {'C': 1}, 'D': 2}, result)
+
+        result, diff = incremental.update('second', {'A': 2, 'D': 2}, order=-1)
+        self.assertEqual(['third', 'second'], incremental.contributors(('A',)))
+
+        result, diff = incremental.remove('third')
+        self.assertEqual({'A': 2, 'B': {'C': 1}, 'D': 2}, result)
+        self.assertEqual([{'op': 'replace', 'path': '/A', 'value': 2}], diff)
+        self.assertEqual(['first'], incremental.contributors(('B', 'C')))
+        self.assertEqual([], incremental.contributors(('E',)))
+
+    def test_only_dirty_subtrees_are_merged(self):
+        incremental = IncrementalMerge({'first': {'A': {'B': 1}, 'C': {'D': 1}}, 'second': {'A': {'B': 2}}})
+        previous = incremental.result
+        merged = []
+        key_plan = DictNode.key_plan
+
+        def recording(self, documents):
+            merged.append(self.value)
+            return key_plan(self, documents)
+
+        DictNode.key_plan = recording
+        try:
+            result, _ = incremental.patch('second', [{'op': 'add', 'path': '/A/E', 'value': 2}])
+        finally:
+            DictNode.key_plan = key_plan
+        self.assertEqual({'A': {'B': 1, 'E': 2}, 'C': {'D': 1}}, result)
+        # Only the added value is merged, the objects above it are rebuilt from the previous result
+        self.assertIs(previous['C'], result['C'])
+        self.assertEqual([], merged)
+
+    def test_patch_scopes(self):
+        # Scopes compiled from the previous $merge are dropped along with it
+        sources = {0: {'$merge': [{'scope': '.A', 'priority': 1}, {'scope': '.B', 'priority': 1}], 'A': 'Low', 'B': 'Low',
+                       'C': {'D': 'Low'}},
+                   1: {'A': 'High', 'B': 'High', 'C': {'D': 'High'}}}
+        for operations in ([{'op': 'replace', 'path': '/$merge/0/priority', 'value': -1}],
+                           [{'op': 'remove', 'path': '/$merge/1'},
+                            {'op': 'add', 'path': '/$merge/-', 'value': {'scope': '.C.D', 'priority': 1}}],
+                           [{'op': 'move', 'from': '/$merge', 'path': '/C/$merge'}],
+                           [{'op': 'remove', 'path': '/$merge'}]):
+            with self.subTest(operations=operations):
+                incremental = IncrementalMerge(copy.deepcopy(sources))
+                result, _ = incremental.patch(0, operations)
+                self.assertEqual(merge([parse_context(incremental.raws[source], source) for source in sources]), result)
+
+    def test_invalid_patch(self):
+        document = {'A': 1, 'D': {'E': [1]}}
+        incremental = IncrementalMerge({'first': document})
+        for operations in ([{'op': 'add', 'path': '/B', 'value': 2}, {'op': 'remove', 'path': '/C'}],
+                           [{'op': 'add', 'path': '/D/E/-', 'value': 2}, {'op': 'test', 'path': '/A', 'value': 2}],
+                           [{'op': 'replace', 'path': '/D', 'value': 2}, {'op': 'add', 'path': '/D/F', 'value': 2}]):
+            with self.subTest(operations=operations), self.assertRaises(ValueError):
+                incremental.patch('first', operations)
+            # Operations before the failing one are rolled back with it
+            self.assertEqual({'A': 1, 'D': {'E': [1]}}, incremental.result)
+            self.assertEqual({'A': 1, 'D': {'E': [1]}}, incremental.raws['first'])
+        # A value cannot be moved into itself
+        lists = IncrementalMerge({'first': {'A': [{'B': 1}, {'C': 2}]}})
+        with self.assertRaises(ValueError):
+            lists.patch('first', [{'op': 'move', 'from': '/A/0', 'path': '/A/0/D'}])
+        self.assertEqual({'A': [{'B': 1}, {'C': 2}]}, lists.result)
+        # So are patches the merge itself fails on
+        with self.assertRaises(TypeError):
+            incremental.patch('first', [{'op': 'add', 'path': '/A', 'value': 2},
+                                        {'op': 'add', 'path': '/D/E/0', 'value': {'$id': {'F': 1}}}])
+        self.assertEqual({'A': 1, 'D': {'E': [1]}}, incremental.raws['first'])
+        self.assertEqual({'A': 1, 'D': {'E': [1]}}, incremental.result)
+        self.assertEqual({'A': 1, 'D': {'E': [1], 'F': 2}},
+                         incremental.patch('first', [{'op': 'add', 'path': '/D/F', 'value': 2}])[0])
+        self.assertEqual({'A': 1, 'D': {'E': [1]}}, document)
+
+    def test_documents_are_copied(self):
+        # Modifying a document and passing the same object again is seen as a change
+        document = {'A': {'B': 1}, 'C': [1]}
+        incremental = IncrementalMerge({'first': document})
+        document['A']['B'] = 2
+        document['C'].append(2)
+        result, diff = incremental.update('first', document)
+        self.assertEqual({'A': {'B': 2}, 'C': [1, 2]}, result)
+        self.assertEqual(sorted([{'op': 'replace', 'path': '/A/B', 'value': 2},
+                                 {'op': 'replace', 'path': '/C', 'value': [1, 2]}], key=str), sorted(diff, key=str))
+        value = {'E': 1}
+        result, _ = incremental.patch('first', [{'op': 'add', 'path': '/D', 'value': value}])
+        value['E'] = 2
+        self.assertEqual({'A': {'B': 2}, 'C': [1, 2], 'D': {'E': 1}}, incremental.raws['first'])
+        self.assertEqual({'A': {'B': 2}, 'C': [1, 2], 'D': {'E': 1}}, result)
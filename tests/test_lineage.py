@@ -0,0 +1,61 @@
+import unittest
+from dataclasses import dataclass
+from typing import List
+
+from src.lineage import lineage_paths, merge_lineage
+from src.nodes import merge
+from src.parser import parse_context
+
+
+class TestLineage(unittest.TestCase):
+
+    def test_merge_lineage(self):
+        @dataclass
+        class TestCase:
+            name: str
+            _input: List[any]
+            lineage: any
+
+        cases = [
+            TestCase(name='empty', _input=[], lineage=None),
+            TestCase(name='values', _input=[None, 'A', 1.5], lineage=1),
+            TestCase(name='dicts', _input=[
+                {'A': {'B': 1}, 'F': 1},
+                {'A': {'B': 2, 'C': 'A'}, 'D': None, 'E': {}},
+            ], lineage={'A': {'B': 0, 'C': 1}, 'F': 0}),
+            TestCase(name='lists', _input=[
+                [1, {'$id': 'x', 'A': 1}],
+                [{'$id': 'x', 'A': 2, 'B': 2}, [[]]],
+            ], lineage=[0, {'A': 0, 'B': 1}]),
+            TestCase(name='priority', _input=[
+                {'A': {'B': 'Failure', 'C': 'Success'}, 'D': [{'$id': 1, 'E': 'Failure'}]},
+                {'A': {'$priority': 1, 'B': 'Success'}, 'D': [{'$id': 1, '$priority': 1, 'E': 'Success'}]},
+            ], lineage={'A': {'B': 1, 'C': 0}, 'D': [{'E': 1}]}),
+            TestCase(name='control_document', _input=[
+                {'A': {'B': 'Success', 'E': 'Failure'}, 'C': [{'$id': 2, 'D': 'Failure'}, {'$id': 1, 'D': 'Success'}]},
+                {'$priority': 1, '$terminal': True, 'A': {'B': None}, 'C': [{'$id': 1, 'D': None}], 'F': 'Success'},
+            ], lineage={'A': {'B': 0}, 'C': [{'D': 0}], 'F': 1}),
+            TestCase(name='allow_none_and_empty', _input=[
+                {'$allow_empty': True, 'A': {'$allow_none': True, 'B': None}, 'C': {}},
+                {'A': {'C': None}, '$allow_none': True, 'F': None},
+            ], lineage={'A': {'B': 0, 'C': 1}, 'C': {}, 'F': 1}),
+        ]
+
+        for case in cases:
+            expected = merge([parse_context(raw) for raw in case._input])
+            result, lineage = merge_lineage([parse_context(raw, order) for order, raw in enumerate(case._input)])
+            self.assertEqual(expected, result, f'failed test {case.name}')
+            self.assertEqual(list(expected or []), list(result or []), f'failed test {case.name}')
+            self.assertEqual(case.lineage, lineage, f'failed test {case.name}')
+
+    def test_lineage_paths(self):
+        self.assertEqual({'': 3}, lineage_paths(3))
+        self.assertEqual({}, lineage_paths(None))
+        self.assertEqual({'/A/B': 0, '/A/C~1D': 1, '/E/0': 1, '/E/1/F~0': 0},
+                         lineage_paths({'A': {'B': 0, 'C/D': 1, 'G': None}, 'E': [1, {'F~': 0}], 'H': {}}))
+        self.assertEqual(['/A/B', '/A/C~1D', '/E/0', '/E/1/F~0'],
+                         list(lineage_paths({'A': {'B': 0, 'C/D': 1}, 'E': [1, {'F~': 0}]})))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,8 +2,8 @@ import unittest
 from dataclasses import dataclass
 from typing import Dict, List
 
-from src.context import DictMergeContext, ListMergeContext, MergeContext
-from src.nodes import INode, data_to_node, merge
+from src.context import DictMergeContext, ListMergeContext, ListStrategy, MergeContext
+from src.nodes import INode, ListNode, data_to_node, merge, merge_iterative
 
 
 class TestMerge(unittest.TestCase):
@@ -117,6 +117,33 @@ class TestMerge(unittest.TestCase):
                 data_to_node(MergeContext(), {'song': {'author': 'dire straits', 'title': 'unknown'}}),
             ], expected={'song': {'title': 'walk of life', 'author': 'dire straits'}}),
 
+            TestCase(name='child_priority_overrides_document_priority', input=[
+                data_to_node(MergeContext(priority=1), {'A': 'Failure', 'B': 'Success'}),
+                data_to_node(DictMergeContext(nodes={'A': MergeContext(priority=2)}), {'A': 'Success', 'B': 'Failure'}),
+            ], expected={'A': 'Success', 'B': 'Success'}),
+            TestCase(name='context_only_keys_take_part_in_merge', input=[
+                data_to_node(DictMergeContext(priority=1, nodes={'A': MergeContext(allow_none=True)}), {'B': 'Success'}),
+                data_to_node(MergeContext(), {'A': 'Failure', 'B': 'Failure'}),
+            ], expected={'B': 'Success'}),
+
+            TestCase(name='merge_lists_appends_elements_without_id', input=[
+                data_to_node(MergeContext(priority=1), ['A', 'B']),
+                data_to_node(MergeContext(), ['B', 'C']),
+            ], expected=['A', 'B', 'B', 'C']),
+            TestCase(name='merge_lists_by_id_in_first_seen_order', input=[
+                data_to_node(MergeContext(order=0), [{'$id': 1, 'A': 'a'}, {'$id': 2, 'B': 'b'}]),
+                data_to_node(MergeContext(order=1), [{'$id': 3, 'C': 'c'}, {'$id': 1, 'A': 'Failure', 'D': 'd'}]),
+                data_to_node(MergeContext(order=2), [{'$id': 2, 'B': 'Failure', 'E': 'e'}]),
+            ], expected=[{'A': 'a', 'D': 'd'}, {'B': 'b', 'E': 'e'}, {'C': 'c'}]),
+            TestCase(name='merge_lists_by_id_stops_at_terminal', input=[
+                data_to_node(MergeContext(priority=1, terminal=True), [{'$id': 1, 'A': None}]),
+                data_to_node(MergeContext(), [{'$id': 2, 'A': 'Failure'}, {'$id': 1, 'A': 'Success'}]),
+            ], expected=[{'A': 'Success'}]),
+            TestCase(name='list_context_ids_take_part_in_merge', input=[
+                data_to_node(ListMergeContext(priority=1, ids={1: MergeContext(allow_none=True)}), []),
+                data_to_node(MergeContext(allow_none=True), [{'$id': 1, 'A': 'Failure'}, {'$id': 2, 'A': 'Success'}]),
+            ], expected=[None, {'A': 'Success'}]),
+
             # Advanced Merge Cases
             TestCase(name='control_document', input=[
                 data_to_node(MergeContext(priority=1, terminal=True), {
@@ -178,15 +205,102 @@ class TestMerge(unittest.TestCase):
                     'danger_zones': ['swallow falls'],
                 }),
             ], expected={'privileged': {}, 'weather': {'overview': 'sunny'}, 'danger_zones': []}),
+
+            # List Strategy Cases
+            TestCase(name='union_keeps_one_of_each_value', input=[
+                data_to_node(MergeContext(strategy=ListStrategy('union')), [1, 2, 1, True, {'A': 1}, None]),
+                data_to_node(MergeContext(), [3, 2, {'A': 1}, {'A': 2}]),
+            ], expected=[1, 2, True, {'A': 1}, 3, {'A': 2}]),
+            TestCase(name='key_merges_elements_with_the_same_fields', input=[
+                data_to_node(MergeContext(priority=1, strategy=ListStrategy('key', ('A', 'B'))), [
+                    {'A': 1, 'B': 1, 'C': 'Success'}, {'A': 1, 'B': 2, 'C': 'Success'}, {'C': 'Alone'},
+                ]),
+                data_to_node(MergeContext(), [{'A': 1, 'B': 2, 'C': 'Failure', 'D': 'Success'}, {'A': 2, 'B': 1}]),
+            ], expected=[{'A': 1, 'B': 1, 'C': 'Success'}, {'A': 1, 'B': 2, 'C': 'Success', 'D': 'Success'},
+                         {'C': 'Alone'}, {'A': 2, 'B': 1}]),
+            TestCase(name='sorted_merges_sorted_lists', input=[
+                data_to_node(MergeContext(strategy=ListStrategy('sorted', ('A',))), [{'A': 1}, {'A': 4, 'B': 1}, {'A': 7}]),
+                data_to_node(MergeContext(), [{'B': 'Alone'}, {'A': 2}, {'A': 4, 'B': 2, 'C': 2}, {'A': 9}]),
+            ], expected=[{'A': 1}, {'A': 2}, {'A': 4, 'B': 1, 'C': 2}, {'A': 7}, {'A': 9}, {'B': 'Alone'}]),
+            TestCase(name='sorted_descending_stops_at_terminal', input=[
+                data_to_node(MergeContext(terminal=True, strategy=ListStrategy('sorted', ('A',), True)), [{'A': 7}, {'A': 1}]),
+                data_to_node(MergeContext(), [{'A': 9}, {'A': 7, 'B': 1}]),
+            ], expected=[{'A': 7}, {'A': 1}]),
+            TestCase(name='strategy_is_inherited_until_append', input=[
+                data_to_node(DictMergeContext(strategy=ListStrategy('union'), nodes={
+                    'A': MergeContext(strategy=ListStrategy('append')),
+                }), {'A': [1, 1], 'B': [1, 1]}),
+            ], expected={'A': [1, 1], 'B': [1]}),
         ]
 
         for case in cases:
-            actual = merge(case.input)
-            self.assertEqual(
-                case.expected,
-                actual,
-                f'failed test {case.name} expected {case.expected}, actual {actual}',
-            )
+            for merger in [merge, merge_iterative]:
+                actual = merger(case.input)
+                self.assertEqual(
+                    case.expected,
+                    actual,
+                    f'failed test {case.name} with {merger.__name__} expected {case.expected}, actual {actual}',
+                )
+
+    def test_key_plan(self):
+        documents = [
+            data_to_node(MergeContext(priority=2), {'A': 1, '$priority': 2}),
+            data_to_node(MergeContext(priority=1, terminal=True, allow_none=True), {'B': 2, 'A': 3}),
+            data_to_node(MergeContext(), {'C': 4, 'B': 5}),
+        ]
+
+        plan = list(documents[0].key_plan(documents))
+
+        self.assertEqual(
+            [('A', [1, 3], False), ('B', [2, 5], True)],
+            [(key, [node.value for node in nodes], allow_none) for key, nodes, allow_none in plan],
+        )
+        for key, nodes, allow_none in plan:
+            self.assertEqual((nodes, allow_none), documents[0].key_nodes(documents, key))
+        self.assertIsNone(documents[0].key_nodes(documents, 'C'))
+
+    def test_id_nodes(self):
+        documents = [
+            data_to_node(MergeContext(priority=1, terminal=True), [{'$id': 2, 'A': 1}, {'$id': 1, 'A': 2}]),
+            data_to_node(MergeContext(allow_none=True), [{'$id': 3, 'A': 3}, {'$id': 1, 'A': 4}]),
+        ]
+
+        for nodes, allow_none in documents[0].id_plan(documents):
+            self.assertEqual((nodes, allow_none), documents[0].id_nodes(documents, nodes[0].get_id()))
+        self.assertIsNone(documents[0].id_nodes(documents, 3))
+
+    def test_list_elements_are_only_wrapped_when_visited(self):
+        visited = []
+
+        class RecordingListNode(ListNode):
+            def node_from_index(self, index):
+                visited.append(index)
+                return ListNode.node_from_index(self, index)
+
+        actual = merge([
+            data_to_node(MergeContext(priority=1, terminal=True), [{'$id': 3, 'A': None}]),
+            RecordingListNode(context=MergeContext(), value=[{'$id': i, 'A': i} for i in range(10)]),
+        ])
+
+        self.assertEqual([{'A': 3}], actual)
+        self.assertEqual([3], visited)
+
+    def test_merge_iterative_deep(self):
+        depth = 5000
+        high, low = {'value': 'high'}, {'value': 'low', 'other': 'low'}
+        for _ in range(depth):
+            high, low = {'child': high}, {'child': low}
+
+        actual = merge_iterative([
+            data_to_node(MergeContext(priority=1), high),
+            data_to_node(MergeContext(), low),
+        ])
+
+        for _ in range(depth):
+            actual = actual['child']
+        self.assertEqual({'value': 'high', 'other': 'low'}, actual)
+        with self.assertRaises(RecursionError):
+            merge([data_to_node(MergeContext(), high)])
 
 
 if __name__ == '__main__':
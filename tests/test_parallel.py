@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List
+
+from src.nodes import merge
+from src.parallel import merge_parallel
+from src.parser import parse_context
+from src.store import open_store, write_store
+
+
+class TestParallel(unittest.TestCase):
+
+    def test_merge_parallel(self):
+        @dataclass
+        class TestCase:
+            name: str
+            _input: List[any]
+
+        cases = [
+            TestCase(name='empty', _input=[]),
+            TestCase(name='values', _input=[None, 'A', 1.5]),
+            TestCase(name='dicts', _input=[{'A': {'B': 1}, 'F': 1}, {'A': {'B': 2, 'C': 'A'}, 'D': None, 'E': {}}]),
+            TestCase(name='lists', _input=[[1, {'$id': 'x', 'A': 1}], [{'$id': 'x', 'A': 2, 'B': 2}, [[]]]]),
+            TestCase(name='priority', _input=[
+                {'A': {'B': 'Failure', 'C': 'Success'}, 'D': [{'$id': 1, 'E': 'Failure'}]},
+                {'A': {'$priority': 1, 'B': 'Success'}, 'D': [{'$id': 1, '$priority': 1, 'E': 'Success'}]},
+            ]),
+            TestCase(name='control_document', _input=[
+                {'$priority': 1, '$terminal': True, 'A': {'B': None}, 'C': [{'$id': 1, 'D': None}]},
+                {'A': {'B': 'Success', 'E': 'Failure'}, 'C': [{'$id': 2, 'D': 'Failure'}, {'$id': 1, 'D': 'Success'}]},
+            ]),
+            TestCase(name='allow_none_and_empty', _input=[
+                {'$allow_empty': True, 'A': {'$allow_none': True, 'B': None}, 'C': {}, 'D': {'E': {}}},
+                {'A': {'C': None}, 'F': [None, {}]},
+            ]),
+        ]
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            for case in cases:
+                for depth in (0, 1, 2, 3):
+                    for chunk_size in (1, 3):
+                        with self.subTest(case.name, depth=depth, chunk_size=chunk_size):
+                            expected = merge([parse_context(raw) for raw in case._input])
+                            result = merge_parallel([parse_context(raw) for raw in case._input], executor=executor,
+                                                    depth=depth, chunk_size=chunk_size)
+                            self.assertEqual(expected, result)
+                            self.assertEqual(list(expected or []), list(result or []))
+
+    def test_merge_parallel_processes(self):
+        raws = [{str(key): {'A': key, 'B': [key, {'$id': key}]} for key in range(50)}, {'1': {'$priority': 1, 'A': 0}}]
+        expected = merge([parse_context(raw) for raw in raws])
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            result = merge_parallel([parse_context(raw) for raw in raws], executor=executor, chunk_size=8)
+        self.assertEqual(expected, result)
+        self.assertEqual(list(expected), list(result))
+
+    def test_merge_parallel_stores(self):
+        # Mapped stores reach the workers by path rather than by copying the document
+        raws = [{'A': {'B': 1}, 'C': [{'$id': 1, 'D': 1}]}, {'A': {'E': 2}, 'C': [{'$id': 1, 'F': 2}, 3]}]
+        with tempfile.TemporaryDirectory() as directory, ProcessPoolExecutor(max_workers=1) as executor:
+            nodes = []
+            for position, raw in enumerate(raws):
+                path = os.path.join(directory, f'{position}.store')
+                write_store(raw, path)
+                nodes.append(open_store(path))
+            result = merge_parallel(nodes, executor=executor)
+            for node in nodes:
+                node.store.close()
+        self.assertEqual(merge([parse_context(raw) for raw in raws]), result)
+
+    def test_min_size(self):
+        # Levels below min_size are merged as one job instead of being split
+        raws = [{'A': {'B': 1}}, {'A': {'C': 2}}]
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            submitted = []
+            submit = executor.submit
+            executor.submit = lambda fn, jobs: submitted.append(len(jobs)) or submit(fn, jobs)
+            result = merge_parallel([parse_context(raw) for raw in raws], executor=executor, depth=2, min_size=2)
+        self.assertEqual({'A': {'B': 1, 'C': 2}}, result)
+        self.assertEqual([1], submitted)
@@ -2,8 +2,9 @@ import unittest
 from dataclasses import dataclass
 from typing import List
 
+from src.context import DictMergeContext, ListMergeContext, ListStrategy, MergeContext
 from src.nodes import merge
-from src.parser import parse_context
+from src.parser import _extract, compile_scopes, format_pointer, parse_context, parse_path, parse_pointer, parse_strategy
 
 
 class TestMerge(unittest.TestCase):
@@ -21,6 +22,67 @@ class TestMerge(unittest.TestCase):
             TestCase(name='empty_dicts_are_not_removed_when_allow_empty', _input=[{'$allow_empty': True}], expected={}),
             TestCase(name='empty_dicts_are_still_removed_when_lower_priority_is_allow_empty',
                      _input=[{'$priority': 1}, {'$allow_empty': True}], expected=None),
+
+            # Embedded Context Cases
+            TestCase(name='priority_applies_to_children', _input=[
+                {'A': {'B': 'Failure', 'C': 'Success'}},
+                {'A': {'$priority': 1, 'B': 'Success'}},
+            ], expected={'A': {'B': 'Success', 'C': 'Success'}}),
+            TestCase(name='terminal_stops_discovery', _input=[
+                {'$priority': 1, '$terminal': True, 'A': None},
+                {'A': 'Success', 'B': 'Failure'},
+            ], expected={'A': 'Success'}),
+            TestCase(name='lists_without_annotations', _input=[
+                {'A': [1, {'$id': 'x', 'B': 'Success'}]},
+                {'A': [{'$id': 'x', 'B': 'Failure', 'C': 'Success'}, 2]},
+            ], expected={'A': [1, {'B': 'Success', 'C': 'Success'}, 2]}),
+            TestCase(name='annotated_list_elements', _input=[
+                {'A': [{'$id': 'x', 'B': 'Failure'}]},
+                {'A': [{'$id': 'x', '$priority': 1, 'B': 'Success'}]},
+            ], expected={'A': [{'B': 'Success'}]}),
+
+            # Metadata-Path Context Cases
+            TestCase(name='scope_priority', _input=[
+                {'A': {'B': 'Failure', 'C': 'Success'}},
+                {'$merge': [{'scope': '$.A', 'priority': 1}], 'A': {'B': 'Success'}},
+            ], expected={'A': {'B': 'Success', 'C': 'Success'}}),
+            TestCase(name='scope_terminal_on_every_element', _input=[
+                {'$priority': 1, '$merge': [{'scope': '$.A[*]', 'terminal': True}], 'A': [{'$id': 1, 'B': None}]},
+                {'A': [{'$id': 1, 'B': 'Success', 'C': 'Failure'}]},
+            ], expected={'A': [{'B': 'Success'}]}),
+            TestCase(name='scope_on_element_id', _input=[
+                {'A': [{'$id': 1, 'B': 'Failure'}, {'$id': 2, 'B': 'Success'}]},
+                {'$merge': [{'scope': '$.A[1]', 'priority': 1}],
+                 'A': [{'$id': 1, 'B': 'Success'}, {'$id': 2, 'B': 'Failure'}]},
+            ], expected={'A': [{'B': 'Success'}, {'B': 'Success'}]}),
+            TestCase(name='scope_on_every_key', _input=[
+                {'A': 'Failure', 'B': {'C': 'Failure'}},
+                {'$merge': [{'scope': '$.*', 'priority': 1}], 'A': 'Success', 'B': {'C': 'Success'}},
+            ], expected={'A': 'Success', 'B': {'C': 'Success'}}),
+            TestCase(name='specific_scopes_override_wildcards', _input=[
+                {'A': 'Success', 'B': 'Failure'},
+                {'$merge': [{'scope': '$.A', 'priority': -1}, {'scope': '$.*', 'priority': 1}],
+                 'A': 'Failure', 'B': 'Success'},
+            ], expected={'A': 'Success', 'B': 'Success'}),
+            TestCase(name='embedded_annotations_override_scopes', _input=[
+                {'A': {'B': 'Success'}},
+                {'$merge': [{'scope': '$.A', 'priority': 1}], 'A': {'$priority': -1, 'B': 'Failure'}},
+            ], expected={'A': {'B': 'Success'}}),
+            TestCase(name='strategy_applies_to_lists_below', _input=[
+                {'$strategy': {'sorted': 'A', 'descending': True}, 'B': [{'A': 3}, {'A': 1}],
+                 'C': {'$strategy': 'union', 'D': [{'A': 2}, {'A': 4}]}, 'E': [{'A': 1}]},
+                {'B': [{'A': 2}], 'C': {'D': [{'A': 4}, {'A': 3}]}, 'E': [{'A': 2}], '$strategy': 'append'},
+            ], expected={'B': [{'A': 3}, {'A': 2}, {'A': 1}], 'C': {'D': [{'A': 2}, {'A': 4}, {'A': 3}]},
+                         'E': [{'A': 2}, {'A': 1}]}),
+            TestCase(name='strategy_in_scopes', _input=[
+                {'$merge': [{'scope': '$.A', 'strategy': 'union'}, {'scope': '$.B', 'strategy': {'key': ['C', 'D']}}],
+                 'A': ['x', 'y'], 'B': [{'C': 1, 'D': 1, 'E': 'Success'}]},
+                {'A': ['y', 'z'], 'B': [{'C': 1, 'D': 1, 'F': 'Success'}, {'C': 1, 'D': 2}]},
+            ], expected={'A': ['x', 'y', 'z'], 'B': [{'C': 1, 'D': 1, 'E': 'Success', 'F': 'Success'}, {'C': 1, 'D': 2}]}),
+            TestCase(name='nested_scopes_are_relative', _input=[
+                {'A': {'B': {'C': 'Failure'}}},
+                {'A': {'$merge': [{'scope': '$.B.C', 'priority': 1}], 'B': {'C': 'Success'}}},
+            ], expected={'A': {'B': {'C': 'Success'}}}),
         ]
 
         for case in cases:
@@ -31,6 +93,86 @@ class TestMerge(unittest.TestCase):
                 f'failed test {case.name} expected {case.expected}, actual {actual}',
             )
 
+    def test_extract(self):
+        @dataclass
+        class TestCase:
+            name: str
+            _input: any
+            expected: MergeContext
+
+        cases = [
+            TestCase(name='values_have_default_context', _input='A', expected=MergeContext()),
+            TestCase(name='unannotated_documents_have_default_context', _input={
+                'A': [{'$id': 1, 'B': [1, 2]}], 'C': {'D': None},
+            }, expected=MergeContext()),
+            TestCase(name='only_annotated_subtrees_have_context', _input={
+                'A': [{'B': 1}, {'$terminal': True}], 'C': {'D': {}}, '$priority': 1,
+            }, expected=DictMergeContext(priority=1, nodes={
+                'A': ListMergeContext(index=[None, DictMergeContext(terminal=True)]),
+            })),
+        ]
+
+        for case in cases:
+            actual = _extract(case._input)
+            self.assertEqual(
+                case.expected,
+                actual,
+                f'failed test {case.name} expected {case.expected}, actual {actual}',
+            )
+        self.assertIs(_extract({}), _extract([]))
+
+    def test_compile_scopes(self):
+        scopes = [{'scope': '$.A', 'priority': 1}, {'scope': '$.B[*]', 'terminal': True}, {'scope': '$.B["x"]'}]
+        self.assertEqual(DictMergeContext(nodes={
+            'A': MergeContext(priority=1),
+            'B': ListMergeContext(ids={'x': MergeContext(terminal=True)}, any_element=MergeContext(terminal=True)),
+        }), compile_scopes(scopes))
+        # Identical scopes share one compiled tree
+        self.assertIs(compile_scopes(scopes), compile_scopes([dict(scope) for scope in scopes]))
+        for invalid in [{}, [{'priority': 1}], [{'scope': '$.A', 'order': 1}], [{'scope': '$.A[*]'}, {'scope': '$.A.B'}]]:
+            with self.subTest(invalid), self.assertRaises(ValueError):
+                compile_scopes(invalid)
+
+    def test_parse_strategy(self):
+        self.assertIsNone(parse_strategy(None))
+        self.assertEqual(ListStrategy('union'), parse_strategy('union'))
+        self.assertEqual(ListStrategy('key', ('A', 'B')), parse_strategy({'key': ['A', 'B']}))
+        self.assertEqual(ListStrategy('sorted', ('A',), True), parse_strategy({'sorted': 'A', 'descending': True}))
+        for invalid in ['merge', 1, {}, {'key': []}, {'key': 'A', 'sorted': 'B'}, {'key': 'A', 'descending': True},
+                        {'sorted': [1]}, {'sorted': 'A', 'descending': 1}, {'sorted': 'A', 'order': 'A'}]:
+            with self.subTest(invalid), self.assertRaises(ValueError):
+                parse_strategy(invalid)
+        with self.assertRaises(ValueError):
+            parse_context({'$strategy': 'merge'})
+
+    def test_parse_path(self):
+        self.assertEqual([('key', 'A'), ('any_element', None), ('key', 'B.C'), ('id', 1), ('any_key', None)],
+                         parse_path('$.A[*]."B.C"[1].*'))
+        self.assertEqual([], parse_path('$'))
+        for invalid in ['A', '$.A[', '.A[x]', '$..A']:
+            with self.subTest(invalid), self.assertRaises(ValueError):
+                parse_path(invalid)
+
+    def test_pointers(self):
+        self.assertEqual(['A', 'B/C', '~', '', '0'], parse_pointer('/A/B~1C/~0//0'))
+        self.assertEqual('/A/B~1C/~0//0', format_pointer(('A', 'B/C', '~', '', 0)))
+        self.assertEqual([], parse_pointer(''))
+        self.assertEqual('', format_pointer(()))
+        with self.assertRaises(ValueError):
+            parse_pointer('A/B')
+
+    def test_parse_deep(self):
+        depth = 5000
+        raw = {'$priority': 1, 'value': 'Success'}
+        for _ in range(depth):
+            raw = {'child': raw}
+
+        context = _extract(raw)
+
+        for _ in range(depth):
+            context = context.nodes['child']
+        self.assertEqual(DictMergeContext(priority=1), context)
+
 
 if __name__ == '__main__':
     unittest.main()
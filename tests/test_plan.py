@@ -0,0 +1,93 @@
+import unittest
+from dataclasses import dataclass
+from typing import List
+from unittest import mock
+
+from src.context import DictMergeContext, ListMergeContext
+from src.nodes import data_to_node, merge
+from src.parser import parse_context
+from src.plan import compile_plan
+
+
+class TestPlan(unittest.TestCase):
+
+    def test_merge(self):
+        @dataclass
+        class TestCase:
+            name: str
+            _input: List[any]
+            values: List[List[any]]
+
+        cases = [
+            TestCase(name='values', _input=[None, 'A', 1.5], values=[[1, None, 2], [None, None, None]]),
+            TestCase(name='dicts', _input=[
+                {'A': {'B': 1}, 'F': 1},
+                {'A': {'B': 2, 'C': 'A'}, 'D': None, 'E': {}},
+            ], values=[[{'A': 1, 'F': {'G': 1}}, {'A': {'B': 2}, 'H': [1]}], [None, {'E': {}}]]),
+            TestCase(name='priority', _input=[
+                {'A': {'B': 'Failure', 'C': 'Success'}, 'D': [{'$id': 1, 'E': 'Failure'}]},
+                {'A': {'$priority': 1, 'B': 'Success'}, 'D': [{'$id': 1, '$priority': 1, 'E': 'Success'}]},
+            ], values=[
+                [{'A': {'B': 1, 'C': 1}, 'D': [{'$id': 1, 'E': 1}, {'$id': 2, 'E': 1}]},
+                 {'A': {'B': 2, 'C': 2}, 'D': [{'$id': 1, 'E': 2}, {'$id': 2, 'E': 2}]}],
+                [{'A': {'C': 1}, 'D': [{'$id': 2, 'E': 1}, {'$id': 1}]}, {'A': {}, 'D': [{'$id': 2, 'E': 2}]}],
+            ]),
+            TestCase(name='control_document', _input=[
+                {'A': {'B': 'Success', 'E': 'Failure'}, 'C': [{'$id': 2, 'D': 'Failure'}, {'$id': 1, 'D': 'Success'}]},
+                {'$priority': 1, '$terminal': True, 'A': {'B': None}, 'C': [{'$id': 1, 'D': None}], 'F': 'Success'},
+            ], values=[
+                [{'A': {'B': 1, 'E': 1, 'G': 1}, 'C': [{'$id': 3, 'D': 1}, {'$id': 1, 'D': 1}], 'F': 1},
+                 {'A': {'E': 2}, 'C': [{'$id': 1, 'E': 2}, {'$id': 3, 'E': 2}]}],
+            ]),
+            TestCase(name='scopes', _input=[
+                {'A': {'B': 1}, 'C': [{'$id': 1, 'D': 1}, {'$id': 2, 'D': 1}]},
+                {'$merge': [{'scope': '.A', 'priority': 1, 'allow_none': True}, {'scope': '.C[2]', 'terminal': True},
+                            {'scope': '.C[*]', 'allow_empty': True}], 'A': None, 'C': []},
+            ], values=[
+                [{'A': {'B': 1}, 'C': [{'$id': 1, 'D': 1}, {'$id': 2, 'D': 1}, {'$id': 3}]}, {'C': [{'$id': 2}, {}]}],
+            ]),
+            TestCase(name='allow_none_and_empty', _input=[
+                {'$allow_empty': True, 'A': {'$allow_none': True, 'B': None}, 'C': {}},
+                {'A': {'C': None}, '$allow_none': True, 'F': None},
+            ], values=[[{'A': {'B': None, 'D': None}, 'C': {}, 'E': {}}, {'A': {}, 'F': [None]}]]),
+            TestCase(name='strategies', _input=[
+                {'$merge': [{'scope': '.A', 'strategy': {'sorted': 'B'}}, {'scope': '.C', 'strategy': 'union'}],
+                 'A': [{'$id': 1, 'B': 2}, {'B': 4}], 'C': [1, 1, 2]},
+                {'A': [{'B': 1}, {'$id': 1, '$priority': 1, 'B': 4, 'C': 'Success'}], 'C': [2, 3]},
+            ], values=[[{'A': [{'$id': 2, 'B': 3}], 'C': [{'D': 1}, {'D': 1}]}, {'A': [{'B': 3, 'C': 1}], 'C': None}]]),
+        ]
+
+        for case in cases:
+            documents = [parse_context(raw) for raw in case._input]
+            plan = compile_plan(documents)
+            for values in [case._input] + case.values:
+                with self.subTest(case.name, values=values):
+                    expected = merge([data_to_node(doc.context, value) for doc, value in zip(documents, values)])
+                    self.assertEqual(repr(expected), repr(plan.merge(values)))
+
+    def test_reuse(self):
+        raws = [
+            {'A': {'B': 1}, 'C': [{'$id': 1, 'D': {'E': 1}}, {'$id': 2, 'D': {'E': 1}}]},
+            {'$priority': 1, '$merge': [{'scope': '.C[*]', 'terminal': True, 'priority': -1}], 'A': {'B': 2}, 'C': []},
+        ]
+        plan = compile_plan([parse_context(raw) for raw in raws])
+        values = [
+            {'A': {'B': 3, 'F': {'G': 3}}, 'C': [{'$id': 1, 'D': {'E': 3}}, {'$id': 2, 'D': {'E': 3}}]},
+            {'A': {'F': {'G': 4}}, 'C': [{'$id': 2, 'D': {'H': 4}}], 'I': 4},
+        ]
+        plan.merge(values)
+        with mock.patch.object(DictMergeContext, 'context_from_key', side_effect=AssertionError('resolved key')), \
+                mock.patch.object(ListMergeContext, 'context_from_id_index', side_effect=AssertionError('resolved id')):
+            plan.merge(raws)
+            self.assertEqual({'A': {'F': {'G': 4}, 'B': 3}, 'C': [{'D': {'E': 3, 'H': 4}}, {'D': {'E': 3}}], 'I': 4},
+                             plan.merge(values))
+
+    def test_errors(self):
+        plan = compile_plan([parse_context({}), None])
+        self.assertEqual({'A': 1}, plan.merge([{'A': 1}, {'A': 2}]))
+        with self.assertRaises(ValueError):
+            plan.merge([{}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import io
+import unittest
+from dataclasses import dataclass
+from typing import List
+from unittest import mock
+
+from src.nodes import merge
+from src.parser import parse_context
+from src.projection import Selection, compile_selectors, merge_projected, parse_projected, project
+from src.store import Store, write_store
+
+
+class TestProjection(unittest.TestCase):
+
+    def test_merge_projected(self):
+        @dataclass
+        class TestCase:
+            name: str
+            _input: List[any]
+            selectors: List[str]
+            expected: any
+
+        documents = [
+            {'A': {'B': 'High', 'C': [{'$id': 1, 'D': 'High'}, {'$id': 'x', 'D': 'High'}]}, 'E': 'High'},
+            {'$priority': -1, 'A': {'B': 'Low', 'F': 'Low', 'C': [{'$id': 1, 'G': 'Low'}, 'Low']}, 'H': {'I': 'Low'}},
+        ]
+        cases = [
+            TestCase(name='root', _input=documents, selectors=['$'],
+                     expected=merge([parse_context(raw) for raw in documents])),
+            TestCase(name='single_value', _input=documents, selectors=['$.A.F'], expected={'A': {'F': 'Low'}}),
+            TestCase(name='keys_keep_merge_order', _input=documents, selectors=['.H', '.A.F', '.A.B'],
+                     expected={'A': {'B': 'High', 'F': 'Low'}, 'H': {'I': 'Low'}}),
+            TestCase(name='whole_subtree', _input=documents, selectors=['.H', '.H.I.J'], expected={'H': {'I': 'Low'}}),
+            TestCase(name='any_key', _input=documents, selectors=['.*.I'], expected={'H': {'I': 'Low'}}),
+            TestCase(name='any_element', _input=documents, selectors=['.A.C[*].D'],
+                     expected={'A': {'C': [{'D': 'High'}, {'D': 'High'}]}}),
+            TestCase(name='element_ids', _input=documents, selectors=['.A.C["x"]', '.A.C[1]'],
+                     expected={'A': {'C': [{'D': 'High', 'G': 'Low'}, {'D': 'High'}]}}),
+            TestCase(name='missing_paths_are_pruned', _input=documents, selectors=['.A.Z', '.E.Z', '.A.C[2]'],
+                     expected=None),
+            TestCase(name='allow_empty', _input=[{'$allow_empty': True, 'A': 1}], selectors=['.B'], expected={}),
+            TestCase(name='terminal', _input=[
+                {'$priority': 1, '$terminal': True, 'A': {'B': None}},
+                {'A': {'B': 'Success', 'C': 'Failure'}},
+            ], selectors=['.A.C', '.A.B'], expected={'A': {'B': 'Success'}}),
+            TestCase(name='quoted_keys', _input=[{'A.B': {'C': 1, 'D': 2}}], selectors=['."A.B".C'],
+                     expected={'A.B': {'C': 1}}),
+        ]
+
+        for case in cases:
+            with self.subTest(case.name):
+                actual = merge_projected([parse_context(raw) for raw in case._input], case.selectors)
+                self.assertEqual(case.expected, actual)
+                projected = merge_projected([parse_projected(raw, case.selectors) for raw in case._input],
+                                            case.selectors)
+                self.assertEqual(case.expected, projected)
+
+    def test_compile_selectors(self):
+        self.assertEqual(Selection(whole=True), compile_selectors(['$.A', '$']))
+        self.assertEqual(
+            Selection(keys={'A': Selection(whole=True), 'B': Selection(ids={1: Selection(whole=True)})}),
+            compile_selectors(['.A.C', '.A', '.B[1]']),
+        )
+        for invalid in ['A', '$.A[', '.A[x]', '$..A']:
+            with self.subTest(invalid), self.assertRaises(ValueError):
+                compile_selectors([invalid])
+
+    def test_project(self):
+        raw = {'$priority': 1, 'A': {'B': 1, 'C': 2}, 'D': [{'$id': 1, 'E': 1}, {'$id': 2}, 3], 'F': 4}
+        self.assertEqual({'$priority': 1, 'A': {'C': 2}, 'D': [{'$id': 1, 'E': 1}], 'F': 4},
+                         project(raw, ['.A.C', '.D[1]', '.F']))
+
+    def test_only_selected_slices_are_decoded(self):
+        buffer = io.BytesIO()
+        write_store({'A': {'B': 1, 'C': {'D': 2}}, 'E': [{'$id': i, 'F': i} for i in range(100)]}, buffer)
+        store = Store(buffer.getvalue())
+
+        with mock.patch.object(Store, 'decode', autospec=True, side_effect=Store.decode) as decode:
+            actual = merge_projected([store.root_node()], ['.A.B', '.E[5].F'])
+
+        self.assertEqual({'A': {'B': 1}, 'E': [{'F': 5}]}, actual)
+        self.assertEqual(2, decode.call_count)
@@ -0,0 +1,108 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from dataclasses import dataclass
+from typing import List
+
+from src.context import DictMergeContext
+from src.nodes import merge
+from src.parser import parse_context
+from src.schema import SchemaRegistry
+from src.stream import parse_stream
+
+primary = 'https://document.host/merge/primary'
+schemas = {
+    primary: {'$priority': 1, 'A': {'$terminal': True}},
+    'https://document.host/merge/scoped': {'$merge': [{'scope': '$.B[*]', 'priority': 2}]},
+}
+
+
+class TestSchemaRegistry(unittest.TestCase):
+
+    def test_parse_context(self):
+        @dataclass
+        class TestCase:
+            name: str
+            _input: List[any]
+            embedded: List[any]
+
+        cases = [
+            TestCase(
+                name='root_schema',
+                _input=[{'A': {'C': 'Failure'}}, {'$meta-merge-doc': primary, 'A': {'C': 'Success'}}],
+                embedded=[{'A': {'C': 'Failure'}}, {'$priority': 1, 'A': {'$terminal': True, 'C': 'Success'}}],
+            ),
+            TestCase(
+                name='nested_schema',
+                _input=[{'B': [{'$id': 1, 'C': 'Failure'}]}, {'B': [{'$id': 1, 'C': 'Success'}], 'D': {
+                    '$meta-merge-doc': 'https://document.host/merge/scoped', 'B': [{'$id': 1, 'C': 'Success'}]}}],
+                embedded=[{'B': [{'$id': 1, 'C': 'Failure'}]}, {'B': [{'$id': 1, 'C': 'Success'}], 'D': {
+                    'B': [{'$id': 1, '$priority': 2, 'C': 'Success'}]}}],
+            ),
+            TestCase(
+                name='embedded_annotations_override_schema',
+                _input=[{'A': 'Success'}, {'$meta-merge-doc': primary, '$priority': -1, 'A': 'Failure'}],
+                embedded=[{'A': 'Success'}, {'$priority': -1, 'A': 'Failure'}],
+            ),
+        ]
+
+        registry = SchemaRegistry(schemas)
+        for case in cases:
+            expected = merge([parse_context(raw) for raw in case.embedded])
+            actual = merge([registry.parse_context(raw) for raw in case._input])
+            self.assertEqual(expected, actual, f'failed test {case.name} expected {expected}, actual {actual}')
+
+    def test_schemas_are_shared(self):
+        registry = SchemaRegistry(schemas)
+        first = registry.parse_context({'$meta-merge-doc': primary, 'A': 1})
+        second = registry.parse_context({'$meta-merge-doc': primary, 'B': [2]})
+        streamed = parse_stream(io.BytesIO(b'{"$meta-merge-doc": "https://document.host/merge/primary"}'),
+                                extractor=registry.extractor)
+
+        self.assertIs(registry.get(primary), first.context)
+        self.assertIs(first.context, second.context)
+        self.assertIs(first.context, streamed.context)
+        self.assertEqual(1, len(registry))
+
+    def test_order(self):
+        registry = SchemaRegistry(schemas)
+        raws = [{'$meta-merge-doc': primary, 'A': {'B': 'Failure'}}, {'$meta-merge-doc': primary, 'A': {'B': 'Success'}}]
+        nodes = [registry.parse_context(raw, order) for order, raw in zip((1, 0), raws)]
+
+        self.assertEqual([1, 0], [node.context.order for node in nodes])
+        self.assertEqual({'A': {'B': 'Success'}}, merge(nodes))
+        # The shared schema context itself is left untouched
+        self.assertIsNone(registry.get(primary).order)
+
+    def test_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'schemaV1.json'), 'w') as file:
+                json.dump({'$priority': 3}, file)
+            registry = SchemaRegistry(directory=directory)
+            context = registry.get('https://document.host/merge/schemaV1')
+            os.remove(os.path.join(directory, 'schemaV1.json'))
+
+            self.assertEqual(DictMergeContext(priority=3), context)
+            self.assertIs(context, registry.get('https://document.host/merge/schemaV1'))
+            with self.assertRaises(ValueError):
+                registry.get('https://document.host/merge/schemaV2')
+            with self.assertRaises(ValueError):
+                registry.get('../schemaV1')
+
+    def test_register(self):
+        registry = SchemaRegistry()
+        with self.assertRaises(ValueError):
+            registry.get('missing')
+        with self.assertRaises(ValueError):
+            registry.get(['missing'])
+
+        registry.register('context', DictMergeContext(priority=1))
+        self.assertEqual(DictMergeContext(priority=1), registry.get('context'))
+        registry.register('context', {'$priority': 2})
+        self.assertEqual(DictMergeContext(priority=2), registry.get('context'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import io
+import os
+import tempfile
+import unittest
+from dataclasses import dataclass
+from typing import List
+
+from src.context import MergeContext, intern
+from src.nodes import merge
+from src.parser import parse_context
+from src.snapshot import open_snapshot, read_snapshot, write_snapshot
+from src.store import open_store, write_store
+
+
+def _snapshot(raw: any, order: int = None) -> bytes:
+    buffer = io.BytesIO()
+    write_snapshot(parse_context(raw, order), buffer)
+    return buffer.getvalue()
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def test_snapshot_merge(self):
+        @dataclass
+        class TestCase:
+            name: str
+            _input: List[any]
+
+        cases = [
+            TestCase(name='values', _input=[None, 'A', 1.5, 2 ** 70, True]),
+            TestCase(name='dicts', _input=[{'A': {'B': 1}}, {'A': {'B': 2, 'C': 'é'}, 'D': None}]),
+            TestCase(name='lists', _input=[[1, {'$id': 'x', 'A': 1}], [{'$id': 'x', 'A': 2, 'B': 2}, [[]]]]),
+            TestCase(name='annotations', _input=[
+                {'A': {'B': 'Failure', 'C': 'Success'}, 'D': [{'$id': 1, 'E': 'Failure'}]},
+                {'A': {'$priority': 1, 'B': 'Success'}, 'D': [{'$id': 1, '$priority': 1, 'E': 'Success'}]},
+            ]),
+            TestCase(name='control_document', _input=[
+                {'$priority': 1, '$terminal': True, 'A': {'B': None}, 'C': [{'$id': 1, 'D': None}]},
+                {'A': {'B': 'Success', 'E': 'Failure'}, 'C': [{'$id': 2, 'D': 'Failure'}, {'$id': 1, 'D': 'Success'}]},
+            ]),
+            TestCase(name='scopes', _input=[
+                {'A': {'B': 'Failure', 'C': 'Success'}, 'D': [{'$id': 1, 'E': 'Failure'}]},
+                {'$merge': [{'scope': '$.A', 'priority': 1}, {'scope': '$.D[*]', 'priority': 1},
+                            {'scope': '$.D[2].F', 'allow_none': True}, {'scope': '$.*.G', 'terminal': True}],
+                 'A': {'B': 'Success'}, 'D': [{'$id': 1, 'E': 'Success'}]},
+            ]),
+            TestCase(name='equal_values_of_other_types', _input=[
+                {'A': {'$priority': 1, 'B': 1}, 'C': {'$priority': True, 'B': 1}, 'D': {'$priority': 1.0, 'B': 1},
+                 'E': [{'$id': 0, '$terminal': False}], 'F': [{'$id': False, '$terminal': 0}]},
+            ]),
+        ]
+
+        for case in cases:
+            expected = merge([parse_context(raw, order) for order, raw in enumerate(case._input)])
+            nodes = [read_snapshot(_snapshot(raw, order)) for order, raw in enumerate(case._input)]
+            for order, (node, raw) in enumerate(zip(nodes, case._input)):
+                self.assertEqual(repr(parse_context(raw, order).context), repr(node.context), f'failed test {case.name}')
+            self.assertEqual(repr(expected), repr(merge(nodes)), f'failed test {case.name}')
+
+    def test_open_snapshot(self):
+        raw = {'A': [1, 2, {'B': None}], '$priority': 2}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'document.snapshot')
+            write_snapshot(parse_context(raw, 3), path)
+            node = open_snapshot(path)
+            with open(path, 'r+b') as snapshot:
+                snapshot.truncate(os.path.getsize(path) - 1)
+            with self.assertRaises(ValueError):
+                open_snapshot(path)
+
+        self.assertEqual(parse_context(raw, 3).context, node.context)
+        self.assertEqual({'A': [1, 2]}, merge([node]))
+        self.assertIs(intern(MergeContext()), read_snapshot(_snapshot([1])).context)
+
+    def test_invalid_snapshot(self):
+        snapshot = _snapshot({'A': 1})
+        corrupted = bytearray(snapshot)
+        corrupted[-2] ^= 1
+        for buffer in [b'', b'\0' * 64, snapshot[:-1], bytes(corrupted), b'DDSN\3\0' + snapshot[6:]]:
+            with self.subTest(buffer=buffer):
+                with self.assertRaises(ValueError):
+                    read_snapshot(buffer)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'document.store')
+            write_store({'A': 1}, path)
+            node = open_store(path)
+            with self.assertRaises(ValueError):
+                write_snapshot(node, io.BytesIO())
+            node.store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import io
+import os
+import tempfile
+import unittest
+from dataclasses import dataclass
+from typing import List
+from unittest import mock
+
+from src.context import MergeContext
+from src.nodes import merge
+from src.parser import parse_context
+from src.store import Store, map_store, open_store, write_store
+
+
+def _store(raw: any) -> Store:
+    buffer = io.BytesIO()
+    write_store(raw, buffer)
+    return Store(buffer.getvalue())
+
+
+class TestStore(unittest.TestCase):
+
+    def test_store_merge(self):
+        @dataclass
+        class TestCase:
+            name: str
+            _input: List[any]
+
+        cases = [
+            TestCase(name='values', _input=[None, 'A', 1.5]),
+            TestCase(name='dicts', _input=[{'A': {'B': 1}}, {'A': {'B': 2, 'C': 'é'}, 'D': None}]),
+            TestCase(name='lists', _input=[[1, {'$id': 'x', 'A': 1}], [{'$id': 'x', 'A': 2, 'B': 2}, [[]]]]),
+            TestCase(name='annotations', _input=[
+                {'A': {'B': 'Failure', 'C': 'Success'}, 'D': [{'$id': 1, 'E': 'Failure'}]},
+                {'A': {'$priority': 1, 'B': 'Success'}, 'D': [{'$id': 1, '$priority': 1, 'E': 'Success'}]},
+            ]),
+            TestCase(name='control_document', _input=[
+                {'$priority': 1, '$terminal': True, 'A': {'B': None}, 'C': [{'$id': 1, 'D': None}]},
+                {'A': {'B': 'Success', 'E': 'Failure'}, 'C': [{'$id': 2, 'D': 'Failure'}, {'$id': 1, 'D': 'Success'}]},
+            ]),
+            TestCase(name='scopes', _input=[
+                {'A': {'B': 'Failure', 'C': 'Success'}, 'D': [{'$id': 1, 'E': 'Failure'}]},
+                {'$merge': [{'scope': '$.A', 'priority': 1}, {'scope': '$.D[*]', 'priority': 1}],
+                 'A': {'B': 'Success'}, 'D': [{'$id': 1, 'E': 'Success'}]},
+            ]),
+            TestCase(name='scopes_below_annotations', _input=[
+                {'$merge': [{'scope': '$.A.B', 'priority': 5}], 'A': {'$terminal': True, 'B': 'Success'}},
+                {'$priority': 1, 'A': {'B': 'Failure', 'C': 'Failure'}},
+            ]),
+            TestCase(name='scopes_above_annotations', _input=[
+                {'$merge': [{'scope': '.A[*]', 'allow_empty': True}], 'A': {'B': [{'$id': 1, '$priority': 1}]}},
+            ]),
+            TestCase(name='scopes_above_annotated_elements', _input=[
+                {'$merge': [{'scope': '.A.B', 'allow_none': True}], 'A': [[{'$priority': 1}, None]]},
+            ]),
+        ]
+
+        for case in cases:
+            expected = merge([parse_context(raw) for raw in case._input])
+            actual = merge([_store(raw).root_node() for raw in case._input])
+            self.assertEqual(expected, actual, f'failed test {case.name} expected {expected}, actual {actual}')
+
+    def test_open_store(self):
+        raw = {'A': [1, 2, {'B': None}], '$priority': 2}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'document.store')
+            write_store(raw, path)
+            node = open_store(path, MergeContext(order=3))
+
+            self.assertEqual(parse_context(raw, 3).context, node.context)
+            self.assertEqual({'A': [1, 2]}, merge([node]))
+            node.store.close()
+
+    def test_map_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'document.store')
+            write_store({'A': {'B': [1, {'$id': 2, 'C': 3}]}}, path)
+            with map_store(path) as store:
+                self.assertEqual({'A': {'B': [1, {'C': 3}]}}, merge([store.root_node()]))
+                self.assertEqual({'A': {'B': [1, {'C': 3}]}}, merge([store.root_node()]))
+                # Entries are decoded once however often the merge visits them
+                self.assertIs(store.entry(1), store.entry(1))
+                self.assertEqual(4, len(store.entries))
+            self.assertTrue(store.buffer.closed)
+
+            write_store('A', path)
+            node = open_store(path)
+            self.assertEqual('A', merge([node]))
+
+    def test_only_visited_slices_are_decoded(self):
+        store = _store({'A': {'B': 1, 'C': {'D': [2, 3]}}, 'E': [{'$id': i, 'F': i} for i in range(100)]})
+        control = parse_context({'$priority': 1, '$terminal': True, 'A': {'B': None}, 'E': [{'$id': 5, 'F': None}]})
+
+        with mock.patch.object(Store, 'decode', autospec=True, side_effect=Store.decode) as decode:
+            actual = merge([control, store.root_node()])
+
+        self.assertEqual({'A': {'B': 1}, 'E': [{'F': 5}]}, actual)
+        self.assertEqual(2, decode.call_count)
+
+    def test_invalid_store(self):
+        with self.assertRaises(ValueError):
+            Store(b'\0' * 64)
+
+
+if __name__ == '__main__':
+    unittest.main()
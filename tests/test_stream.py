@@ -0,0 +1,131 @@
+import io
+import json
+import unittest
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from src.nodes import merge
+from src.parser import parse_context
+from src.stream import iter_events, parse_stream
+
+
+class TestStream(unittest.TestCase):
+
+    def test_iter_events(self):
+        @dataclass
+        class TestCase:
+            name: str
+            _input: str
+            expected: List[Tuple[str, any]]
+
+        cases = [
+            TestCase(name='value', _input=' "A" ', expected=[('value', 'A')]),
+            TestCase(name='numbers', _input='[0, -1, 2.5, 1e3, -0.5E-2]', expected=[
+                ('start_array', None), ('value', 0), ('value', -1), ('value', 2.5), ('value', 1000.0),
+                ('value', -0.005), ('end_array', None),
+            ]),
+            TestCase(name='literals', _input='[true,false,null]', expected=[
+                ('start_array', None), ('value', True), ('value', False), ('value', None), ('end_array', None),
+            ]),
+            TestCase(name='strings', _input='["\\"\\u00e9\\n", "é"]', expected=[
+                ('start_array', None), ('value', '"é\n'), ('value', 'é'), ('end_array', None),
+            ]),
+            TestCase(name='nested', _input='{"A": {}, "B": [[], {"C": 1}]}', expected=[
+                ('start_map', None), ('map_key', 'A'), ('start_map', None), ('end_map', None),
+                ('map_key', 'B'), ('start_array', None), ('start_array', None), ('end_array', None),
+                ('start_map', None), ('map_key', 'C'), ('value', 1), ('end_map', None), ('end_array', None),
+                ('end_map', None),
+            ]),
+        ]
+
+        for case in cases:
+            for source in [case._input, case._input.encode()]:
+                for chunk_size in [1, 3, 65536]:
+                    actual = list(iter_events(source, chunk_size=chunk_size))
+                    self.assertEqual(
+                        case.expected,
+                        actual,
+                        f'failed test {case.name} with chunk_size {chunk_size} expected {case.expected}, actual {actual}',
+                    )
+
+    def test_iter_events_errors(self):
+        for _input in ['', '{', '[1,]', '{"A" 1}', '{1: 2}', '[1 2]', '"A', 'nope', '{} {}', '[1}', '[[1 2]]']:
+            for chunk_size in [2, 65536]:
+                with self.assertRaises(ValueError, msg=f'expected {_input!r} to fail'):
+                    parse_stream(_input, chunk_size=chunk_size)
+
+    def test_parse_stream(self):
+        documents = [
+            None,
+            {},
+            {'$priority': 1, 'A': [1, {'$id': 'x', '$terminal': True, 'B': 'b'}], 'C': {'D': {'$allow_none': True}}},
+            [{'$id': 1, 'A': 'Snow ☃'}, [[{'$allow_empty': True}]], -1.5e10],
+        ]
+
+        for raw in documents:
+            for chunk_size in [1, 7, 65536]:
+                expected = parse_context(raw)
+                actual = parse_stream(io.BytesIO(json.dumps(raw, ensure_ascii=False).encode()), chunk_size=chunk_size)
+                self.assertEqual(expected, actual, f'failed to stream {raw} with chunk_size {chunk_size}')
+
+    def test_parse_stream_with_control(self):
+        @dataclass
+        class TestCase:
+            name: str
+            control: any
+            _input: any
+            expected: any
+
+        cases = [
+            TestCase(
+                name='no_control_keeps_everything',
+                control=None,
+                _input={'A': 1, 'B': {'C': 2}},
+                expected={'A': 1, 'B': {'C': 2}},
+            ),
+            TestCase(
+                name='terminal_control_skips_unvisited_keys',
+                control={'$priority': 1, '$terminal': True, 'A': None, 'B': {'C': None}},
+                _input={'$priority': 0, 'A': {'E': 1}, 'B': {'C': 2, 'D': [3]}, 'F': {'G': 4}},
+                expected={'$priority': 0, 'A': {}, 'B': {'C': 2}},
+            ),
+            TestCase(
+                name='terminal_can_be_disabled_below',
+                control={'$terminal': True, 'A': {'$terminal': False}},
+                _input={'A': {'B': 1}, 'C': 2},
+                expected={'A': {'B': 1}},
+            ),
+            TestCase(
+                name='terminal_control_drops_unvisited_elements',
+                control={'$terminal': True, 'A': [{'$id': 1, 'B': None}, 'C']},
+                _input={'A': [{'$id': 2, 'B': 2}, 'D', {'$id': 1, 'B': 1, 'E': 1}]},
+                expected={'A': [{'$id': 1, 'B': 1, 'E': 1}]},
+            ),
+            TestCase(
+                name='terminal_control_keeps_scopes',
+                control={'$priority': 10, '$terminal': True, 'A': None, 'B': []},
+                _input={'A': 2, 'C': {'D': 1}, '$merge': [{'scope': '.A', 'priority': 1, 'terminal': True}]},
+                expected={'A': 2, '$merge': [{'scope': '.A', 'priority': 1, 'terminal': True}]},
+            ),
+            TestCase(
+                name='terminal_control_keeps_strategies',
+                control={'$terminal': True, 'A': {}, 'B': {}},
+                _input={'A': {'$strategy': {'key': 'K'}, 'L': [{'K': 1}]},
+                        'B': {'$strategy': {'sorted': ['K'], 'descending': True}, 'L': [{'K': 2}]}, 'C': 1},
+                expected={'A': {'$strategy': {'key': 'K'}}, 'B': {'$strategy': {'sorted': ['K'], 'descending': True}}},
+            ),
+        ]
+
+        for case in cases:
+            actual = parse_stream(json.dumps(case._input), control=case.control, chunk_size=5)
+            self.assertEqual(case.expected, actual.value, f'failed test {case.name}')
+            if case.control is not None:
+                self.assertEqual(
+                    merge([parse_context(case.control), parse_context(case._input)]),
+                    merge([parse_context(case.control), actual]),
+                    f'failed test {case.name} merge result changed',
+                )
+
+
+if __name__ == '__main__':
+    unittest.main()
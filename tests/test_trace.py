@@ -0,0 +1,75 @@
+import unittest
+from dataclasses import dataclass
+from typing import List
+
+from src.nodes import merge
+from src.parser import parse_context
+from src.trace import merge_traced
+
+
+class TestTrace(unittest.TestCase):
+
+    def test_merge_traced(self):
+        @dataclass
+        class TestCase:
+            name: str
+            _input: List[any]
+
+        cases = [
+            TestCase(name='empty', _input=[]),
+            TestCase(name='values', _input=[None, 'A', 1.5]),
+            TestCase(name='dicts', _input=[{'A': {'B': 1}, 'F': 1}, {'A': {'B': 2, 'C': 'A'}, 'D': None, 'E': {}}]),
+            TestCase(name='lists', _input=[[1, {'$id': 'x', 'A': 1}], [{'$id': 'x', 'A': 2, 'B': 2}, [[]]]]),
+            TestCase(name='control_document', _input=[
+                {'$priority': 1, '$terminal': True, 'A': {'B': None}, 'C': [{'$id': 1, 'D': None}]},
+                {'A': {'B': 'Success', 'E': 'Failure'}, 'C': [{'$id': 2, 'D': 'Failure'}, {'$id': 1, 'D': 'Success'}]},
+            ]),
+            TestCase(name='allow_none_and_empty', _input=[
+                {'$allow_empty': True, 'A': {'$allow_none': True, 'B': None}, 'C': {}},
+                {'A': {'C': None}, '$allow_none': True, 'F': None},
+            ]),
+        ]
+
+        for case in cases:
+            expected = merge([parse_context(raw) for raw in case._input])
+            for max_depth in (None, 0, 1):
+                with self.subTest(case.name, max_depth=max_depth):
+                    result, _ = merge_traced([parse_context(raw) for raw in case._input], max_depth=max_depth)
+                    self.assertEqual(expected, result)
+                    self.assertEqual(list(expected or []), list(result or []))
+
+    def test_trace(self):
+        control = {'$priority': 1, '$terminal': True, 'A': {'B': None}, 'C': [{'$id': 1, 'D': None}, 'E']}
+        source = {'A': {'B': 'Success', 'E': 'Failure'}, 'C': [{'$id': 2, 'D': 'Failure'}, {'$id': 1, 'D': 'Success'}]}
+
+        _, trace = merge_traced([parse_context(source), parse_context(control)])
+
+        self.assertEqual(['$', 'A', 'B', 'C', '[1]', 'D', '[#1]'], [path[-1] for path, _ in trace.walk()])
+        found = {path: node for path, node in trace.walk()}
+        self.assertEqual(('dict', 2, 4, (-1, 0), 1), (trace.kind, trace.documents, trace.nodes, trace.driver, trace.terminal))
+        self.assertEqual(('dict', 2, 2, 1), (found['$', 'A'].kind, found['$', 'A'].documents, found['$', 'A'].nodes,
+                                             found['$', 'A'].terminal))
+        self.assertEqual(('value', 2, (0, 0)), (found['$', 'A', 'B'].kind, found['$', 'A', 'B'].documents,
+                                                found['$', 'A', 'B'].driver))
+        self.assertEqual(('list', 3, 1), (found['$', 'C'].kind, found['$', 'C'].nodes, found['$', 'C'].terminal))
+        self.assertEqual(2, found['$', 'C', '[1]'].documents)
+        for path, node in trace.walk():
+            self.assertGreaterEqual(node.seconds, sum(child.seconds for child in node.children))
+
+        _, shallow = merge_traced([parse_context(source), parse_context(control)], max_depth=1)
+        self.assertEqual([('$',), ('$', 'A'), ('$', 'C')], [path for path, _ in shallow.walk()])
+        self.assertEqual('list', shallow.children[1].kind)
+
+    def test_reports(self):
+        _, trace = merge_traced([parse_context({'A': {'B;C': 1}, 'D': [1]})])
+
+        lines = trace.folded().splitlines()
+        self.assertEqual(['$', '$;A', '$;A;B,C', '$;D', '$;D;[#0]'], [line.rsplit(' ', 1)[0] for line in lines])
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+        report = trace.to_dict()
+        self.assertEqual(['A', 'D'], [child['name'] for child in report['children']])
+        self.assertEqual({'name', 'kind', 'seconds', 'documents', 'nodes', 'driver', 'terminal', 'children'}, set(report))
+
+
+if __name__ == '__main__':
+    unittest.main()
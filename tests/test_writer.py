@@ -0,0 +1,79 @@
+import io
+import json
+import unittest
+from dataclasses import dataclass
+from typing import List
+
+from src.nodes import merge
+from src.parser import parse_context
+from src.writer import write_merged
+
+
+class TestWriter(unittest.TestCase):
+
+    def test_write_merged(self):
+        @dataclass
+        class TestCase:
+            name: str
+            _input: List[any]
+
+        cases = [
+            TestCase(name='empty', _input=[]),
+            TestCase(name='values', _input=[None, 'A', 1.5]),
+            TestCase(name='scalars', _input=[{'A': 1, 'B': -2.5, 'C': True, 'D': False, 'E': 'é\n"', 'F': float('nan')}]),
+            TestCase(name='dicts', _input=[{'A': {'B': 1}, 'F': 1}, {'A': {'B': 2, 'C': 'A'}, 'D': None, 'E': {}}]),
+            TestCase(name='lists', _input=[[1, {'$id': 'x', 'A': 1}], [{'$id': 'x', 'A': 2, 'B': 2}, [[]]]]),
+            TestCase(name='priority', _input=[
+                {'A': {'B': 'Failure', 'C': 'Success'}, 'D': [{'$id': 1, 'E': 'Failure'}]},
+                {'A': {'$priority': 1, 'B': 'Success'}, 'D': [{'$id': 1, '$priority': 1, 'E': 'Success'}]},
+            ]),
+            TestCase(name='control_document', _input=[
+                {'$priority': 1, '$terminal': True, 'A': {'B': None}, 'C': [{'$id': 1, 'D': None}]},
+                {'A': {'B': 'Success', 'E': 'Failure'}, 'C': [{'$id': 2, 'D': 'Failure'}, {'$id': 1, 'D': 'Success'}]},
+            ]),
+            TestCase(name='pruned_empty', _input=[{'A': {'B': {}, 'C': [None, {}]}, 'D': [[]]}]),
+            TestCase(name='allow_none_and_empty', _input=[
+                {'$allow_empty': True, 'A': {'$allow_none': True, 'B': None, 'C': {}}, 'C': {}, 'D': {'E': {}}},
+                {'A': {'C': None}, 'F': [None, {}], '$allow_none': True, 'G': {'H': None}},
+            ]),
+        ]
+
+        for case in cases:
+            expected = json.dumps(merge([parse_context(raw) for raw in case._input]))
+            for buffer_size in (1, 65536):
+                with self.subTest(case.name, buffer_size=buffer_size):
+                    output = io.StringIO()
+                    write_merged([parse_context(raw) for raw in case._input], output, buffer_size=buffer_size)
+                    self.assertEqual(expected, output.getvalue())
+
+    def test_binary_target(self):
+        raws = [{'A': 'é', 'B': [1, 2]}, {'A': 'è', 'C': None}]
+        output = io.BytesIO()
+        write_merged([parse_context(raw) for raw in raws], output, encoding='utf-8', ensure_ascii=False)
+        self.assertEqual(json.dumps(merge([parse_context(raw) for raw in raws]), ensure_ascii=False).encode(),
+                         output.getvalue())
+
+    def test_deep_documents(self):
+        depth = 5000
+        raw = 1
+        for _ in range(depth):
+            raw = {'A': raw}
+        output = io.StringIO()
+        write_merged([parse_context(raw), parse_context({'B': None})], output)
+        self.assertEqual('{"A": ' * depth + '1' + '}' * depth, output.getvalue())
+
+    def test_writes_are_chunked(self):
+        writes = []
+
+        class Target():
+            def write(self, text):
+                writes.append(text)
+
+        write_merged([parse_context({str(key): key for key in range(1000)})], Target(), buffer_size=1024)
+        self.assertEqual(json.dumps({str(key): key for key in range(1000)}), ''.join(writes))
+        self.assertTrue(all(len(text) < 1100 for text in writes))
+        self.assertLess(len(writes), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()